@@ -1,26 +1,36 @@
 import asyncio
+from typing import TYPE_CHECKING
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import deadline
 from config import get_settings
-from supabase import create_client, Client
-from supabase_auth.errors import AuthApiError
+from executors import run_db
+from metrics import supabase_latency, timed
+
+# supabase pulls in a large dependency tree; import it on first use so it
+# stays off the cold-start path
+if TYPE_CHECKING:
+    from supabase import Client
 
 security = HTTPBearer(auto_error=False)
 
-def get_supabase() -> Client:
+def get_supabase() -> "Client":
     settings = get_settings()
     if not settings.supabase_url or not settings.supabase_anon_key:
         print("Warning: Supabase credentials missing during init")
         return None
+    from supabase import create_client
     return create_client(settings.supabase_url, settings.supabase_anon_key)
 
-def get_supabase_admin() -> Client:
+def get_supabase_admin() -> "Client":
     settings = get_settings()
     if not settings.supabase_url or not settings.supabase_service_role_key:
         print("Warning: Supabase Service Role Key missing")
         return None
+    from supabase import create_client
     return create_client(settings.supabase_url, settings.supabase_service_role_key)
 
+@timed(supabase_latency, "verify_token")
 async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """Verify the Supabase JWT token."""
     if credentials is None:
@@ -33,16 +43,23 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
 
     try:
         # Verify token by getting the user
-        user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+        user_response = await deadline.within(
+            "auth", run_db(supabase.auth.get_user, token), get_settings().auth_timeout
+        )
         if not user_response or not user_response.user:
             raise HTTPException(status_code=401, detail="Invalid token")
 
         return {"user": user_response.user, "token": token}
         
-    except AuthApiError as e:
-        print(f"Auth API Error: {e}")
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {e.message}")
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Authentication timed out")
     except Exception as e:
+        from supabase_auth.errors import AuthApiError
+        if isinstance(e, AuthApiError):
+            print(f"Auth API Error: {e}")
+            raise HTTPException(status_code=401, detail=f"Authentication failed: {e.message}")
         print(f"Auth Validation Error: {e}")
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
 
@@ -70,7 +87,7 @@ async def ensure_user_exists(user):
                 "avatar_url": user.user_metadata.get("avatar_url")
             }).execute()
         
-        await asyncio.to_thread(_upsert)
+        await run_db(_upsert)
     except Exception as e:
         print(f"Failed to ensure user exists: {e}")
 
@@ -82,7 +99,7 @@ async def check_is_pro(user_id: str) -> bool:
         
     try:
         # Use simple select, admin client bypasses RLS so we can read any user
-        response = await asyncio.to_thread(
+        response = await run_db(
             supabase.table("users").select("is_pro").eq("id", user_id).single().execute
         )
         return response.data.get("is_pro", False) if response.data else False
@@ -0,0 +1,115 @@
+"""Middleware stack requests/sec benchmark.
+
+Compares the former BaseHTTPMiddleware pair + stdlib JSONResponse ("before",
+reproduced below) with the pure-ASGI RequestContextMiddleware + orjson
+responses used by ``main.app`` ("after"). Requests are driven in-process
+through httpx's ASGI transport, with Redis replaced by an in-memory
+stand-in so ``/api/query`` is a cache hit. Run from the ``api`` directory:
+
+    python -m benchmarks.asgi_stack [--requests N]
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+import structlog
+from fastapi import Depends, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+import main
+import services.cache
+from logging_config import logger
+from middleware import CONTENT_SECURITY_POLICY
+from mocks.redis import FakeRedis
+from routers import pinned, query
+from utils import topic_cache_key
+
+TOPIC = "Photosynthesis"
+
+
+def build_before_app() -> FastAPI:
+    """The previous stack: two @app.middleware("http") functions on BaseHTTPMiddleware."""
+    app = FastAPI(default_response_class=JSONResponse)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["content-type", "authorization"],
+        max_age=3600,
+    )
+
+    @app.middleware("http")
+    async def security_headers(request: Request, call_next):
+        response = await call_next(request)
+        response.headers["Content-Security-Policy"] = CONTENT_SECURITY_POLICY
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-XSS-Protection"] = "0"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
+        response.headers["Strict-Transport-Security"] = "max-age=63072000; includeSubDomains; preload"
+        return response
+
+    @app.middleware("http")
+    async def structlog_middleware(request: Request, call_next):
+        structlog.contextvars.clear_contextvars()
+        structlog.contextvars.bind_contextvars(
+            path=request.url.path,
+            method=request.method,
+            client_ip=request.client.host if request.client else None,
+        )
+        response = await call_next(request)
+        structlog.contextvars.bind_contextvars(status_code=response.status_code)
+        logger.info("http_request_success")
+        return response
+
+    app.include_router(pinned.router, prefix="/api")
+    app.include_router(query.router, prefix="/api", dependencies=[Depends(main.conditional_rate_limit)])
+    return app
+
+
+async def measure(app, method: str, path: str, requests: int, **kwargs) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(50):
+            await client.request(method, path, **kwargs)
+        start = time.perf_counter()
+        for _ in range(requests):
+            r = await client.request(method, path, **kwargs)
+        elapsed = time.perf_counter() - start
+        assert r.status_code == 200, r.status_code
+    return requests / elapsed
+
+
+async def run(requests: int) -> None:
+    fake = FakeRedis()
+    await fake.set(topic_cache_key(TOPIC, "eli5", "fast"), b'{"text": "Plants turn sunlight into sugar."}')
+    services.cache._client = fake
+    # Keep logging out of the measurement; both stacks log the same lines
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL))
+
+    before, after = build_before_app(), main.app
+    cases = [
+        ("GET /api/pinned", "GET", "/api/pinned", {}),
+        ("POST /api/query (cached)", "POST", "/api/query", {"json": {"topic": TOPIC, "levels": ["eli5"]}}),
+    ]
+    for label, method, path, kwargs in cases:
+        b = await measure(before, method, path, requests, **kwargs)
+        a = await measure(after, method, path, requests, **kwargs)
+        print(f"{label:<26} before {b:>8,.0f} req/s   after {a:>8,.0f} req/s   ({a / b:.2f}x)")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,313 @@
+"""Load generation and traffic replay against the full app with mock upstreams.
+
+Starts ``main.app`` under uvicorn on a local port, with the model provider,
+Supabase (auth and tables) and Redis replaced by the in-process stand-ins
+in ``mocks/``, then drives it over real HTTP so streamed responses can be
+timed to their first chunk. Requests come from a synthetic mix (topic
+popularity, level mix, stream vs non-stream, share of signed-in users) or
+are replayed from a recorded JSONL file, one request per line:
+
+    {"topic": "Black holes", "level": "eli5", "stream": true, "user": "u42"}
+
+(``user`` null or missing means anonymous). Reports throughput, latency
+percentiles and time-to-first-chunk. Run from the ``api`` directory:
+
+    python -m benchmarks.load --requests 2000 --concurrency 50
+    python -m benchmarks.load --mix mix.json --duration 60 --ttft 0.4 --tps 80
+    python -m benchmarks.load --replay recorded.jsonl --rate 100 --json report.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import socket
+import sys
+import time
+from typing import Any, Iterator
+
+import httpx
+import orjson
+import structlog
+import uvicorn
+
+import auth
+import main
+import routers.export
+import routers.history
+import routers.query
+import services.cache
+import services.variants
+from config import get_settings
+from mocks.provider import MockProvider
+from mocks.redis import FakeRedis
+from mocks.supabase import FakeSupabase, user_token
+
+DEFAULT_MIX: dict[str, Any] = {
+    "topics": 500,  # Synthetic topics with Zipf popularity, or {"topic": weight, ...}
+    "zipf_s": 1.1,  # Popularity skew for synthetic topics
+    "levels": {"eli5": 0.5, "eli10": 0.25, "eli15": 0.15, "meme": 0.1},
+    "stream_ratio": 0.7,  # Share of requests using /api/query/stream
+    "auth_ratio": 0.3,  # Share of requests from signed-in users
+    "users": 200,  # Distinct signed-in users
+    "pro_ratio": 0.1,  # Share of those users with pro status
+}
+
+Spec = dict[str, Any]
+
+
+def _weighted(weights: dict[str, float], rng: random.Random) -> Iterator[str]:
+    names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+    while True:
+        yield rng.choices(names, cum_weights=cumulative)[0]
+
+
+def synthesize(mix: dict[str, Any], seed: int = 0) -> Iterator[Spec]:
+    """Endless request specs drawn from ``mix``."""
+    rng = random.Random(seed)
+    topics = mix["topics"]
+    if isinstance(topics, int):
+        topics = {f"Topic {rank}": 1 / rank ** mix["zipf_s"] for rank in range(1, topics + 1)}
+    topic_iter, level_iter = _weighted(topics, rng), _weighted(mix["levels"], rng)
+    while True:
+        yield {
+            "topic": next(topic_iter),
+            "level": next(level_iter),
+            "stream": rng.random() < mix["stream_ratio"],
+            "user": f"u{rng.randrange(mix['users'])}" if rng.random() < mix["auth_ratio"] else None,
+        }
+
+
+def load_replay(path: str) -> list[Spec]:
+    with open(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def install_mocks(args: argparse.Namespace, mix: dict[str, Any]) -> tuple[MockProvider, FakeSupabase]:
+    """Swap every upstream for an in-process stand-in."""
+    provider = MockProvider(ttft=args.ttft, tokens_per_second=args.tps, tokens=args.tokens)
+    pro_users = {f"u{i}" for i in range(int(mix["users"] * mix["pro_ratio"]))}
+    supabase = FakeSupabase(latency=args.db_latency, pro_users=pro_users)
+
+    routers.query.ensemble_generate = provider.generate
+    routers.export.ensemble_generate = provider.generate
+    routers.query.generate_stream_explanation = provider.stream
+    services.variants.generate_stream_explanation = provider.stream
+    for module in (auth, routers.query, routers.history, routers.export):
+        module.get_supabase_admin = lambda: supabase
+    auth.get_supabase = lambda: supabase
+    services.cache._client = FakeRedis(latency=args.redis_latency)
+
+    settings = get_settings()
+    settings.rate_limit_per_user = 10**9  # Measure the app, not the limiter
+    settings.disk_cache_path = ""  # Keep runs independent of the working tree's cache
+    settings.request_deadline = args.deadline
+    # Keep logging out of the measurement
+    main.setup_logging = lambda: structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.CRITICAL)
+    )
+    return provider, supabase
+
+
+class Results:
+    def __init__(self):
+        self.latency: dict[str, list[float]] = {"query": [], "stream": []}
+        self.ttfc: list[float] = []
+        self.errors: dict[str, int] = {}
+        self.started = self.finished = 0.0
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self) -> dict[str, Any]:
+        elapsed = self.finished - self.started
+        done = sum(len(v) for v in self.latency.values())
+        out: dict[str, Any] = {
+            "elapsed": round(elapsed, 3),
+            "requests": done,
+            "errors": self.errors,
+            "throughput": round(done / elapsed, 1) if elapsed else 0.0,
+        }
+        for kind, values in [*self.latency.items(), ("all", [*self.latency["query"], *self.latency["stream"]])]:
+            out[f"latency_{kind}"] = percentiles(values)
+        out["ttfc"] = percentiles(self.ttfc)
+        return out
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    """Nearest-rank p50/p95/p99 in milliseconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, max(0, int(p / 100 * len(ordered) + 0.5) - 1))] * 1000, 2)
+
+    return {"count": len(ordered), "p50": rank(50), "p95": rank(95), "p99": rank(99), "max": rank(100)}
+
+
+async def fire(client: httpx.AsyncClient, spec: Spec, results: Results) -> None:
+    headers = {"Authorization": f"Bearer {user_token(spec['user'])}"} if spec.get("user") else {}
+    kind = "stream" if spec.get("stream") else "query"
+    body = {"topic": spec["topic"], "levels": [spec["level"]], "mode": spec.get("mode", "fast")}
+    start = time.perf_counter()
+    try:
+        if kind == "query":
+            r = await client.post("/api/query", json=body, headers=headers)
+            ok = r.status_code == 200
+            status = r.status_code
+        else:
+            async with client.stream("POST", "/api/query/stream", json=body, headers=headers) as r:
+                status, ok, first = r.status_code, r.status_code == 200, None
+                async for line in r.aiter_lines():
+                    if first is None and line.startswith("data:") and '"chunk"' in line:
+                        first = time.perf_counter() - start
+                    elif line.startswith("data:") and '"error"' in line:
+                        ok, status = False, "stream_error"
+                if first is not None:
+                    results.ttfc.append(first)
+    except httpx.HTTPError as e:
+        results.error(type(e).__name__)
+        return
+    if ok:
+        results.latency[kind].append(time.perf_counter() - start)
+    else:
+        results.error(str(status))
+
+
+async def drive(
+    base_url: str,
+    specs: Iterator[Spec],
+    results: Results,
+    concurrency: int,
+    requests: int | None,
+    duration: float | None,
+    rate: float | None,
+) -> None:
+    """
+    Closed loop (``concurrency`` workers back to back) by default; with
+    ``rate``, open loop at that many arrivals per second, capped at
+    ``concurrency`` in flight, so a slow server is charged for the queueing
+    it causes.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    stop_at = time.perf_counter() + duration if duration else float("inf")
+    budget = itertools.islice(specs, requests) if requests else specs
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        results.started = time.perf_counter()
+        if rate:
+            gate = asyncio.Semaphore(concurrency)
+            tasks = set()
+
+            async def one(spec: Spec) -> None:
+                async with gate:
+                    await fire(client, spec, results)
+
+            for n, spec in enumerate(budget):
+                due = results.started + n / rate
+                if due >= stop_at:
+                    break
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                task = asyncio.create_task(one(spec))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+        else:
+            async def worker() -> None:
+                for spec in budget:
+                    await fire(client, spec, results)
+                    if time.perf_counter() >= stop_at:
+                        return
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        results.finished = time.perf_counter()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    mix = dict(DEFAULT_MIX)
+    if args.mix:
+        with open(args.mix, "rb") as f:
+            mix.update(orjson.loads(f.read()))
+    provider, supabase = install_mocks(args, mix)
+
+    if args.replay:
+        recorded = load_replay(args.replay)
+        specs: Iterator[Spec] = itertools.cycle(recorded) if args.duration else iter(recorded)
+    else:
+        specs = synthesize(mix, args.seed)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()  # Surface startup errors
+        await asyncio.sleep(0.01)
+
+    results = Results()
+    try:
+        # Default: 1000 synthetic requests, or the whole recording once
+        requests = args.requests or (None if args.duration or args.replay else 1000)
+        await drive(f"http://127.0.0.1:{port}", specs, results, args.concurrency, requests, args.duration, args.rate)
+    finally:
+        server.should_exit = True
+        await serving
+
+    report = results.report()
+    report["model_calls"] = provider.calls
+    report["supabase_calls"] = supabase.calls
+    return report
+
+
+def print_report(report: dict[str, Any], stream=sys.stdout) -> None:
+    print(
+        f"{report['requests']} requests in {report['elapsed']:.1f}s "
+        f"-> {report['throughput']:.1f} req/s "
+        f"({report['model_calls']} model calls, {report['supabase_calls']} Supabase calls)",
+        file=stream,
+    )
+    if report["errors"]:
+        print(f"errors: {report['errors']}", file=stream)
+    print(f"{'':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=stream)
+    for label, key in (("query", "latency_query"), ("stream", "latency_stream"), ("all", "latency_all"), ("first chunk", "ttfc")):
+        p = report[key]
+        if p:
+            print(f"{label:<16}{p['count']:>8}{p['p50']:>10.1f}{p['p95']:>10.1f}{p['p99']:>10.1f}{p['max']:>10.1f}", file=stream)
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--mix", help="JSON file overriding DEFAULT_MIX fields")
+    source.add_argument("--replay", help="Recorded requests, one JSON object per line")
+    parser.add_argument("--requests", type=int, default=0, help="Total requests (default 1000 unless --duration)")
+    parser.add_argument("--duration", type=float, default=0.0, help="Run for this many seconds")
+    parser.add_argument("--concurrency", type=int, default=50, help="Workers, or in-flight cap with --rate")
+    parser.add_argument("--rate", type=float, default=0.0, help="Open-loop arrivals per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ttft", type=float, default=0.3, help="Mock model time to first token (s)")
+    parser.add_argument("--tps", type=float, default=80.0, help="Mock model tokens per second")
+    parser.add_argument("--tokens", type=int, default=120, help="Tokens per mock answer")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Mock Supabase latency per call (s)")
+    parser.add_argument("--redis-latency", type=float, default=0.0005, help="Mock Redis latency per call (s)")
+    parser.add_argument("--deadline", type=float, default=30.0, help="request_deadline for the run (s)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,59 @@
+"""Logging throughput benchmark.
+
+Measures log calls/sec on the calling thread with the default pipeline and
+with ``LOG_ASYNC`` (orjson + background writer). Output goes to /dev/null.
+Run from the ``api`` directory:
+
+    python -m benchmarks.logging_throughput [--calls N]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import structlog
+
+from config import get_settings
+import logging_config
+
+
+def run(log_async: bool, calls: int) -> tuple[float, float]:
+    """Return (calls/sec at the call site, calls/sec including the final flush)."""
+    settings = get_settings()
+    settings.log_async = log_async
+    logging_config.setup_logging()
+    log = structlog.get_logger("bench")
+    structlog.contextvars.bind_contextvars(path="/api/query", method="POST", client_ip="127.0.0.1")
+
+    start = time.perf_counter()
+    for i in range(calls):
+        log.info("http_request_success", status_code=200, i=i)
+    emitted = time.perf_counter() - start
+    logging_config.shutdown_logging()
+    flushed = time.perf_counter() - start
+    structlog.contextvars.clear_contextvars()
+    return calls / emitted, calls / flushed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50_000)
+    args = parser.parse_args()
+
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        sync_rate, _ = run(False, args.calls)
+        async_rate, async_flushed = run(True, args.calls)
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    print(f"default pipeline : {sync_rate:>10,.0f} calls/sec")
+    print(f"log_async        : {async_rate:>10,.0f} calls/sec at call site ({async_rate / sync_rate:.2f}x), "
+          f"{async_flushed:,.0f} calls/sec including drain")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""SSE frame encoding micro-benchmark.
+
+Compares the old stdlib ``json.dumps`` + f-string framing with SSEEncoder and
+reports frames/sec. Run from the ``api`` directory:
+
+    python -m benchmarks.sse_encoding [--frames N]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from sse import SSEEncoder, coalesce_chunks
+
+TOKEN = "photosynthesis "
+STREAM_ID = "0" * 32
+
+
+def bench_stdlib(frames: int) -> float:
+    start = time.perf_counter()
+    for seq in range(frames):
+        f"id: {STREAM_ID}:{seq}\ndata: {json.dumps({'chunk': TOKEN})}\n\n".encode()
+    return frames / (time.perf_counter() - start)
+
+
+def bench_encoder(frames: int) -> float:
+    encoder = SSEEncoder()
+    start = time.perf_counter()
+    for seq in range(frames):
+        encoder.frame({"chunk": TOKEN}, f"{STREAM_ID}:{seq}")
+    return frames / (time.perf_counter() - start)
+
+
+async def _events(n: int):
+    for seq in range(1, n + 1):
+        yield seq, {"chunk": TOKEN}
+
+
+def bench_coalesced(tokens: int, window: float, max_bytes: int) -> tuple[float, int]:
+    """Tokens/sec through coalescing + encoding, and the number of frames emitted."""
+    encoder = SSEEncoder()
+
+    async def run() -> int:
+        emitted = 0
+        async for seq, event in coalesce_chunks(_events(tokens), window, max_bytes):
+            encoder.frame(event, f"{STREAM_ID}:{seq}")
+            emitted += 1
+        return emitted
+
+    start = time.perf_counter()
+    emitted = asyncio.run(run())
+    return tokens / (time.perf_counter() - start), emitted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200_000)
+    args = parser.parse_args()
+
+    stdlib = bench_stdlib(args.frames)
+    encoder = bench_encoder(args.frames)
+    print(f"stdlib json + f-string : {stdlib:>12,.0f} frames/sec")
+    print(f"SSEEncoder (orjson)    : {encoder:>12,.0f} frames/sec  ({encoder / stdlib:.2f}x)")
+
+    tokens = args.frames // 10
+    rate, emitted = bench_coalesced(tokens, 0.02, 256)
+    print(f"coalesced 20ms/256B    : {rate:>12,.0f} tokens/sec  ({tokens} tokens -> {emitted} frames)")
+
+
+if __name__ == "__main__":
+    main()
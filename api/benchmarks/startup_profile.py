@@ -0,0 +1,90 @@
+"""Cold-start profile.
+
+Imports ``main`` in a fresh interpreter under ``-X importtime`` and reports
+the most expensive modules by cumulative and self time, plus the wall time
+of ``import main`` (median of several runs) and, optionally, of the app
+lifespan startup. Run from the ``api`` directory:
+
+    python -m benchmarks.startup_profile [--top N] [--runs N] [--lifespan]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+import orjson
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Timed in a child process so nothing is already imported
+_WALL_SCRIPT = """
+import time, orjson
+t = time.perf_counter()
+import main
+result = {"import": time.perf_counter() - t}
+if LIFESPAN:
+    import asyncio
+    async def startup():
+        t = time.perf_counter()
+        async with main.app.router.lifespan_context(main.app):
+            result["startup"] = time.perf_counter() - t
+    asyncio.run(startup())
+print(orjson.dumps(result).decode())
+"""
+
+
+def _run(args: list[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=API_DIR, capture_output=True, text=True, check=True
+    )
+
+
+def import_times() -> list[tuple[str, int, int]]:
+    """``(module, self_us, cumulative_us)`` for every module ``import main`` loads."""
+    proc = _run(["-X", "importtime", "-c", "import main"])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def wall_times(runs: int, lifespan: bool) -> list[dict[str, float]]:
+    script = _WALL_SCRIPT.replace("LIFESPAN", repr(lifespan))
+    return [orjson.loads(_run(["-c", script]).stdout.splitlines()[-1]) for _ in range(runs)]
+
+
+def report(rows: list[tuple[str, int, int]], top: int) -> None:
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>10.1f}ms {self_us / 1000:>8.1f}ms  {name}")
+    print()
+    print(f"{'self':>12}  module")
+    for name, self_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"{self_us / 1000:>10.1f}ms  {name}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="Modules to list per table")
+    parser.add_argument("--runs", type=int, default=5, help="Wall-time samples of import main")
+    parser.add_argument(
+        "--lifespan", action="store_true", help="Also time lifespan startup (connects to Redis)"
+    )
+    args = parser.parse_args()
+
+    report(import_times(), args.top)
+    samples = wall_times(args.runs, args.lifespan)
+    print()
+    print(f"import main: median {statistics.median(s['import'] for s in samples) * 1000:.0f}ms "
+          f"over {len(samples)} runs")
+    if args.lifespan:
+        print(f"lifespan startup: median {statistics.median(s['startup'] for s in samples) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main_cli()
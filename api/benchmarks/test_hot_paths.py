@@ -0,0 +1,131 @@
+"""pytest-benchmark suite for the API hot paths.
+
+Not part of the regular test run (``pytest.ini`` limits that to
+``tests/``). Run from the ``api`` directory:
+
+    python -m pytest benchmarks --benchmark-only
+
+Save a baseline, then compare a change against it. CI does the same with
+the base branch as the baseline and fails when any benchmark's best
+round is more than 25% slower (the minimum is far steadier than the mean
+or median on shared runners):
+
+    python -m pytest benchmarks --benchmark-only --benchmark-save=base
+    python -m pytest benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=min:25%
+
+Baselines live in ``.benchmarks/`` and are machine-specific, so only
+compare runs from the same host.
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+# Warm up so the first benchmarks aren't measured on a cold CPU and cold caches
+pytestmark = pytest.mark.benchmark(warmup=True, warmup_iterations=10_000)
+
+import services.cache
+from mocks.redis import FakeRedis
+from routers.export import render_json, render_markdown, render_text
+from services.cache import cache_get, cache_set
+from services.disk_cache import content_key
+from services.suggest import TopicIndex
+from sse import SSEEncoder
+from utils import sanitize_topic, topic_cache_key
+
+TOPIC = '  How does "Photosynthesis" work in C4 plants?  '
+EXPLANATIONS = {
+    level: ("Plants capture light and turn it into sugar. " * 60).strip()
+    for level in ("eli5", "eli10", "eli12", "eli15", "meme")
+}
+TOKENS = [f"token{i} " for i in range(200)]
+OPS = 100  # Cache calls per benchmark round, to amortise the loop hop
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(services.cache, "_client", fake)
+    return fake
+
+
+def test_sanitize_topic(benchmark):
+    assert benchmark(sanitize_topic, TOPIC)
+
+
+def test_topic_cache_key(benchmark):
+    topic = sanitize_topic(TOPIC)
+    assert benchmark(topic_cache_key, topic, "eli5", "fast").startswith("explanation:")
+
+
+def test_topic_suggest(benchmark):
+    index = TopicIndex()
+    for i in range(20000):
+        index.add(f"topic {i} about science", float(i % 97))
+    prefixes = [f"topic {i}" for i in range(OPS)]
+
+    def lookups():
+        for prefix in prefixes:
+            index.suggest(prefix)
+
+    benchmark(lookups)
+    assert index.suggest("topic 1 ")
+
+
+def test_content_key(benchmark):
+    topic = sanitize_topic(TOPIC)
+    assert len(benchmark(content_key, topic, "eli5", "fast")) == 64
+
+
+def test_cache_get_hit(benchmark, loop, fake_redis):
+    keys = [topic_cache_key(f"topic {i}", "eli5", "fast") for i in range(OPS)]
+    for key in keys:
+        loop.run_until_complete(cache_set(key, {"text": EXPLANATIONS["eli5"]}))
+
+    async def gets():
+        for key in keys:
+            await cache_get(key)
+
+    benchmark(lambda: loop.run_until_complete(gets()))
+    assert fake_redis.calls >= 2 * OPS
+
+
+def test_cache_set(benchmark, loop, fake_redis):
+    keys = [topic_cache_key(f"topic {i}", "eli5", "fast") for i in range(OPS)]
+    value = {"text": EXPLANATIONS["eli5"]}
+
+    async def sets():
+        for key in keys:
+            await cache_set(key, value)
+
+    benchmark(lambda: loop.run_until_complete(sets()))
+    assert len(fake_redis.data) == OPS
+
+
+def test_sse_frame_encoding(benchmark):
+    """One streamed answer's worth of frames, as query_topic_stream emits them."""
+    encoder = SSEEncoder()
+
+    def stream():
+        for seq, token in enumerate(TOKENS):
+            encoder.frame({"chunk": token}, f"{'0' * 32}:{seq}")
+        return encoder.done()
+
+    assert benchmark(stream)
+
+
+@pytest.mark.parametrize("render", [render_text, render_markdown], ids=["txt", "md"])
+def test_export_document(benchmark, render):
+    assert benchmark(render, TOPIC, EXPLANATIONS).startswith("# ")
+
+
+def test_export_document_json(benchmark):
+    assert benchmark(render_json, TOPIC, EXPLANATIONS)
@@ -10,14 +10,70 @@ class Settings(BaseSettings):
     """Application settings loaded from environment."""
 
     environment: str = "development"
+    host: str = "0.0.0.0"  # Bind address for `python -m server`
+    port: int = 8000
+    web_concurrency: int = 0  # Server worker processes; 0 means one per CPU
+    shutdown_grace_period: float = 30.0  # On SIGTERM, wait this long for streams and background writes
     groq_api_key: str = ""
 
     kaggle_api_token: str = ""
     gemini_api_key: str = ""
     redis_url: str = "redis://localhost:6379"
+    redis_socket_timeout: float = 0.5
+    redis_connect_timeout: float = 1.0
+    redis_max_connections: int = 50
+    redis_health_check_interval: int = 30
+    hot_key_threshold: int = 50  # Reads per window that make a cache key hot
+    hot_key_window: float = 10.0  # Hot-key counts halve this often (seconds)
+    hot_key_ttl: float = 2.0  # How long a hot key's value is served from process memory
+    hot_key_top_k: int = 32  # Heaviest keys tracked per worker
+    redis_op_timeout: float = 0.25  # Hard cap per cache call on the query path
+    redis_breaker_failure_rate: float = 0.5  # Open when this share of recent calls fail
+    redis_breaker_min_calls: int = 10  # ...out of at least this many
+    redis_breaker_window: float = 10.0  # Rolling window for failure tracking (seconds)
+    redis_breaker_cooldown: float = 5.0  # Bypass Redis this long before probing again
     cache_ttl: int = 86400  # 24 hours
+    request_deadline: float = 10.0  # Overall budget per request (seconds); 0 disables
+    auth_timeout: float = 3.0  # Cap on the Supabase token check, within the request budget
+    search_min_budget: float = 2.0  # Skip optional search context with less budget than this
+    disk_cache_path: str = ".cache/explanations.sqlite3"  # Durable store under Redis; empty disables
+    disk_cache_max_bytes: int = 512 * 1024 * 1024  # Compact least recently read entries past this
+    image_cache_path: str = ".cache/images.sqlite3"  # Proxied image originals and thumbnails; empty disables
+    image_cache_max_bytes: int = 1024 * 1024 * 1024
+    image_fetch_timeout: float = 5.0  # Upstream image download timeout (seconds)
+    image_fetch_max_bytes: int = 10 * 1024 * 1024  # Refuse larger originals
+    image_fetch_max_connections: int = 20  # Pooled upstream connections for the image proxy
+    image_workers: int = 2  # Threads producing thumbnails
+    image_cache_max_age: int = 31536000  # Thumbnails are content-addressed, so cache for a year
+    image_meta_ttl: int = 86400  # Per-query image search results kept in Redis (seconds)
+    regenerate_pool_size: int = 3  # Distinct regenerate variants kept per (topic, level, mode)
+    stream_buffer_ttl: int = 300  # Resumable SSE buffer lifetime (seconds)
+    stream_disconnect_grace: float = 5.0  # Wait for a reconnect before cancelling generation
+    stream_fill_cache_on_disconnect: bool = False  # Finish abandoned generations to fill the cache
+    query_cache_max_age: int = 300  # Browser/CDN freshness for GET /api/query (seconds)
+    query_cache_stale_while_revalidate: int = 86400  # ...then serve stale while refetching
+    pinned_cache_max_age: int = 3600
+    pinned_cache_stale_while_revalidate: int = 86400
+    suggest_sync_interval: float = 30.0  # Seconds between topic popularity syncs with Redis
+    suggest_min_popularity: float = 3.0  # Queries before an organic topic is offered to others
+    suggest_max_topics: int = 50000  # Topics indexed per worker; least popular are evicted on sync
+    export_page_size: int = 100  # History rows fetched per keyset page in bulk export
+    export_concurrency: int = 4  # Topics generated at once while exporting history
+    batch_max_items: int = 100  # Items accepted by /api/query/batch
+    batch_concurrency: int = 4  # Topics generated at once per batch request
+    sse_coalesce_ms: int = 20  # Merge tiny tokens into one SSE frame within this window
+    sse_coalesce_bytes: int = 256  # ...or until this much text is pending
+    db_executor_workers: int = 16  # Threads for blocking Supabase calls, apart from the default executor
+    default_executor_workers: int = 0  # asyncio.to_thread pool size; 0 keeps Python's default
+    diagnostics_enabled: bool = True  # Event-loop lag, executor saturation and slow-callback monitoring
+    loop_lag_interval: float = 0.5  # Seconds between event-loop lag probes
+    slow_callback_threshold: float = 0.25  # Log a stack sample when the loop is blocked this long
+    metrics_token: str = ""  # Bearer token required by /api/metrics when set
+    log_async: bool = False  # orjson rendering + background stdout writer
+    log_success_sample_rate: float = 1.0  # Share of http_request_success lines to keep
     rate_limit_per_user: int = 20  # Requests per minute
-    rate_limit_burst: int = 5
+    rate_limit_pro_multiplier: int = 5  # Pro users get rate_limit_per_user x this
+    rate_limit_sync_interval: float = 0.5  # Seconds between batched Redis syncs
     supabase_url: str = ""
     supabase_anon_key: str = ""
     supabase_service_role_key: str = ""
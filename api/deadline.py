@@ -0,0 +1,108 @@
+"""Per-request deadlines.
+
+The request middleware stores an absolute deadline in a contextvar, so it
+follows the request through every await, dependency and spawned task.
+Service layers ask how much budget is left to shrink their own timeouts
+(``budget``), skip optional work (``has_budget``), or bound a whole stage
+(``within``). Timed-out and skipped stages are logged and counted per
+stage in ``knowbear_deadline_events_total``.
+"""
+
+import asyncio
+import time
+from contextvars import Context, ContextVar, Token, copy_context
+from typing import Awaitable, TypeVar
+
+from logging_config import logger
+from metrics import deadline_events
+
+T = TypeVar("T")
+
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """A stage ran out of request budget."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def start(seconds: float) -> Token:
+    """Give the current context ``seconds`` of budget; 0 or less means no deadline."""
+    return _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+
+
+def clear() -> Token:
+    """Drop the deadline for the rest of this context (e.g. a detached background task)."""
+    return _deadline.set(None)
+
+
+def detached_context() -> Context:
+    """
+    Copy of the current context without a deadline.
+
+    Pass it to ``create_task(..., context=...)`` for background work that
+    outlives the request; it keeps the log context but not the budget.
+    """
+    ctx = copy_context()
+    ctx.run(_deadline.set, None)
+    return ctx
+
+
+def reset(token: Token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left, or None when there is no deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+
+def budget(timeout: float) -> float:
+    """``timeout`` shrunk to whatever is left of the request budget."""
+    left = remaining()
+    return timeout if left is None else min(timeout, left)
+
+
+def has_budget(seconds: float) -> bool:
+    """Whether at least ``seconds`` remain; used to skip optional work."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def record_timeout(stage: str) -> None:
+    deadline_events.labels(stage, "timeout").inc()
+    logger.warning("deadline_stage_timeout", stage=stage)
+
+
+def record_skip(stage: str) -> None:
+    deadline_events.labels(stage, "skipped").inc()
+    logger.info("deadline_stage_skipped", stage=stage, remaining=remaining())
+
+
+async def within(stage: str, aw: Awaitable[T], timeout: float | None = None) -> T:
+    """
+    Await ``aw`` bounded by the remaining budget (and ``timeout`` if given).
+
+    Raises DeadlineExceeded if the budget runs out first; a timeout that
+    was not shortened by the deadline surfaces as a plain TimeoutError.
+    """
+    left = remaining()
+    if left is None and timeout is None:
+        return await aw
+    limit = min(t for t in (left, timeout) if t is not None)
+    if left is not None and left <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        record_timeout(stage)
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(aw, limit)
+    except asyncio.TimeoutError:
+        if left is not None and left <= limit:
+            record_timeout(stage)
+            raise DeadlineExceeded(stage) from None
+        raise
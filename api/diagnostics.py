@@ -0,0 +1,126 @@
+"""Runtime diagnostics.
+
+Started from the app lifespan, this watches for the two ways the worker
+quietly degrades:
+
+- **Event-loop lag.** A probe task sleeps ``loop_lag_interval`` and
+  records how late it woke up. Every probe also samples queue depth and
+  busy threads of the default and DB executors.
+- **Blocked loop.** A watchdog thread expects the probe's heartbeat. When
+  the loop has not run it for ``slow_callback_threshold`` past its due
+  time, the watchdog samples the loop thread's stack, so the log shows
+  what was blocking rather than just that something was.
+
+Everything lands in ``/api/metrics``; ``snapshot()`` feeds the health
+endpoint.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from config import get_settings
+from executors import InstrumentedExecutor, get_db_executor, install_default_executor
+from logging_config import logger
+from metrics import event_loop_lag, executor_active, executor_queue_depth, slow_callbacks
+
+STACK_DEPTH = 20  # Frames kept per slow-callback sample
+BACKLOG_LOG_INTERVAL = 30.0  # Seconds between executor backlog warnings per pool
+
+
+class RuntimeDiagnostics:
+    """Loop lag probe plus a watchdog thread for blocked-loop stack samples."""
+
+    def __init__(self):
+        self.lag = 0.0  # Most recent probe
+        self.max_lag = 0.0  # Worst since start
+        self.stalls = 0
+        self.executors: list[InstrumentedExecutor] = []
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._beat = 0.0  # When the probe last ran (monotonic)
+        self._due = 0.0  # When it should run next
+        self._loop_thread_id: int | None = None
+        self._backlog_logged: dict[str, float] = {}
+
+    def start(self) -> None:
+        settings = get_settings()
+        if not settings.diagnostics_enabled or self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self.executors = [install_default_executor(loop), get_db_executor()]
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._due = self._beat + settings.loop_lag_interval
+        self._stop.clear()
+        self._task = loop.create_task(self._probe(settings.loop_lag_interval))
+        self._thread = threading.Thread(
+            target=self._watch, args=(settings.slow_callback_threshold,), name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _probe(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.lag = max(now - self._due, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            event_loop_lag.observe(self.lag)
+            self._beat = now
+            self._due = now + interval
+            self._sample_executors(now)
+
+    def _sample_executors(self, now: float) -> None:
+        for executor in self.executors:
+            executor_queue_depth.labels(executor.name).set(executor.queued)
+            executor_active.labels(executor.name).set(executor.active)
+            if executor.queued and now - self._backlog_logged.get(executor.name, 0.0) > BACKLOG_LOG_INTERVAL:
+                self._backlog_logged[executor.name] = now
+                logger.warning(
+                    "executor_backlog",
+                    pool=executor.name,
+                    queued=executor.queued,
+                    active=executor.active,
+                    max_workers=executor.max_workers,
+                )
+
+    def _watch(self, threshold: float) -> None:
+        """Watchdog thread: sample the loop's stack when the probe is overdue."""
+        reported = 0.0  # Heartbeat of the stall already reported
+        while not self._stop.wait(threshold / 2):
+            beat = self._beat
+            blocked = time.monotonic() - self._due
+            if blocked < threshold or beat == reported:
+                continue
+            reported = beat
+            self.stalls += 1
+            slow_callbacks.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame, limit=STACK_DEPTH) if frame is not None else []
+            logger.warning("slow_callback", blocked_for=round(blocked, 3), stack="".join(stack))
+
+    def snapshot(self) -> dict:
+        return {
+            "loop_lag": round(self.lag, 4),
+            "max_loop_lag": round(self.max_lag, 4),
+            "slow_callbacks": self.stalls,
+            "executors": {
+                e.name: {"queued": e.queued, "active": e.active, "max_workers": e.max_workers}
+                for e in self.executors
+            },
+        }
+
+
+diagnostics = RuntimeDiagnostics()
@@ -0,0 +1,107 @@
+"""Thread pools for blocking I/O.
+
+The Supabase client is synchronous, so every call runs in a thread. Those
+calls get their own pool (``db_executor_workers`` threads) instead of
+sharing asyncio's default executor with disk-cache reads and
+``to_thread`` callers, so a slow database cannot starve the rest.
+
+Both pools are ``InstrumentedExecutor``s: they track how many calls are
+queued and running and how long calls wait for a thread, which is what
+the runtime diagnostics report.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from config import get_settings
+from metrics import executor_wait
+
+T = TypeVar("T")
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that records queue depth, busy threads and queue wait."""
+
+    def __init__(self, name: str, max_workers: int | None = None):
+        super().__init__(max_workers, thread_name_prefix=name)
+        self.name = name
+        self.queued = 0
+        self.active = 0
+        self._counts_lock = threading.Lock()
+        self._wait = executor_wait.labels(name)
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def submit(self, fn: Callable[..., T], /, *args, **kwargs) -> Future:
+        submitted = time.perf_counter()
+
+        def run():
+            with self._counts_lock:
+                self.queued -= 1
+                self.active += 1
+                self._wait.observe(time.perf_counter() - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._counts_lock:
+                    self.active -= 1
+
+        with self._counts_lock:
+            self.queued += 1
+        try:
+            return super().submit(run)
+        except BaseException:
+            with self._counts_lock:
+                self.queued -= 1
+            raise
+
+
+_db_executor: InstrumentedExecutor | None = None
+
+
+def _reset_after_fork() -> None:
+    # Pool threads don't survive fork()
+    global _db_executor
+    _db_executor = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_db_executor() -> InstrumentedExecutor:
+    """The Supabase I/O pool, created on first use."""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = InstrumentedExecutor("db", get_settings().db_executor_workers)
+    return _db_executor
+
+
+def install_default_executor(loop: asyncio.AbstractEventLoop) -> InstrumentedExecutor:
+    """Make ``loop``'s default executor (used by ``asyncio.to_thread``) instrumented."""
+    workers = get_settings().default_executor_workers or None
+    executor = InstrumentedExecutor("default", workers)
+    loop.set_default_executor(executor)
+    return executor
+
+
+async def run_db(fn: Callable[..., T], /, *args, **kwargs) -> T:
+    """``asyncio.to_thread`` for blocking Supabase calls, on the DB pool."""
+    loop = asyncio.get_running_loop()
+    # Carry contextvars (log context, request deadline) into the thread like to_thread does
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_db_executor(), call)
+
+
+def shutdown_db_executor() -> None:
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=False)
+        _db_executor = None
@@ -1,34 +1,160 @@
 """Structured logging configuration."""
 
+import atexit
+import queue
+import random
 import sys
 import structlog
 import logging
+import threading
+import orjson
+
+from config import get_settings
+
+_writer: "_QueueWriter | None" = None
+
+_WARNING_METHODS = frozenset({"warning", "warn", "error", "exception", "critical", "fatal"})
+
+_callsite = structlog.processors.CallsiteParameterAdder(
+    {
+        structlog.processors.CallsiteParameter.FILENAME,
+        structlog.processors.CallsiteParameter.FUNC_NAME,
+        structlog.processors.CallsiteParameter.LINENO,
+    },
+    additional_ignores=["logging_config"],
+)
+
+
+def _callsite_for_warnings(logger, method_name, event_dict):
+    """Only pay for stack inspection on warnings and errors."""
+    if method_name in _WARNING_METHODS:
+        return _callsite(logger, method_name, event_dict)
+    return event_dict
+
+
+def _sampler(rate: float):
+    """Drop a share of routine ``http_request_success`` lines."""
+    def sample(logger, method_name, event_dict):
+        if event_dict.get("event") == "http_request_success" and random.random() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+    return sample
+
+
+def _orjson_dumps(obj, **kwargs) -> str:
+    return orjson.dumps(obj, default=str).decode()
+
+
+class _QueueWriter:
+    """Background thread draining rendered lines to stdout in batches."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lines: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        lines = self.lines
+        while True:
+            line = lines.get()
+            batch = []
+            while line is not None:
+                batch.append(line)
+                if len(batch) >= 512:
+                    break
+                try:
+                    line = lines.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.stream.write("\n".join(batch) + "\n")
+                self.stream.flush()
+            if line is None:
+                return
+
+    def stop(self):
+        self.lines.put(None)
+        self.thread.join(timeout=5)
+
+
+class _QueueLogger:
+    """structlog logger that enqueues rendered lines instead of writing them."""
+
+    def msg(self, message: str) -> None:
+        # Look the writer up per line: cached bound loggers outlive a
+        # setup_logging() restart, which replaces the writer and its queue
+        writer = _writer
+        if writer is not None:
+            writer.lines.put(message)
+        else:
+            sys.stdout.write(message + "\n")
+
+    debug = info = warning = warn = error = critical = exception = fatal = log = msg
+
+
+def shutdown_logging():
+    """Flush and stop the background log writer, if running."""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
 
 def setup_logging():
-    """Configure structured logging."""
+    """Configure structured logging.
+
+    With ``log_async`` enabled, events are rendered with orjson, callsite
+    info is only added at warning level and above, and lines are queued to
+    a background writer thread so logging never blocks the event loop on
+    stdout.
+    """
+    global _writer
+    settings = get_settings()
+    sample_rate = settings.log_success_sample_rate
+    sampler = _sampler(sample_rate) if sample_rate < 1 else None
+
+    if settings.log_async:
+        shutdown_logging()
+        _writer = _QueueWriter(sys.stdout)
+        queue_logger = _QueueLogger()
+        processors = [
+            structlog.contextvars.merge_contextvars,
+            structlog.processors.add_log_level,
+            sampler,
+            structlog.processors.TimeStamper(fmt="iso"),
+            _callsite_for_warnings,
+            structlog.processors.JSONRenderer(serializer=_orjson_dumps),
+        ]
+        structlog.configure(
+            processors=[p for p in processors if p is not None],
+            logger_factory=lambda *args: queue_logger,
+            wrapper_class=structlog.make_filtering_bound_logger(logging.INFO),
+            cache_logger_on_first_use=True,
+        )
+        return
+
     logging.basicConfig(
         format="%(message)s",
         stream=sys.stdout,
         level=logging.INFO,
     )
 
+    processors = [
+        structlog.contextvars.merge_contextvars,
+        structlog.processors.add_log_level,
+        sampler,
+        structlog.processors.TimeStamper(fmt="iso"),
+        _callsite,
+        structlog.processors.JSONRenderer(),
+    ]
     structlog.configure(
-        processors=[
-            structlog.contextvars.merge_contextvars,
-            structlog.processors.add_log_level,
-            structlog.processors.TimeStamper(fmt="iso"),
-            structlog.processors.CallsiteParameterAdder(
-                {
-                    structlog.processors.CallsiteParameter.FILENAME,
-                    structlog.processors.CallsiteParameter.FUNC_NAME,
-                    structlog.processors.CallsiteParameter.LINENO,
-                }
-            ),
-            structlog.processors.JSONRenderer(),
-        ],
+        processors=[p for p in processors if p is not None],
         logger_factory=structlog.stdlib.LoggerFactory(),
         wrapper_class=structlog.stdlib.BoundLogger,
         cache_logger_on_first_use=True,
     )
 
+atexit.register(shutdown_logging)
+
 logger = structlog.get_logger()
@@ -1,31 +1,69 @@
 """FastAPI main application."""
 
 import asyncio
+import importlib.util
 import os
-import structlog
+import time
 from datetime import datetime
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, Response, Depends
+from fastapi import FastAPI, Request, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-from routers import pinned, query, export, history
-from services.cache import close_redis, get_redis
+from fastapi.responses import PlainTextResponse
+from routers import pinned, query, export, history, topics, images
+from services import cache, stream_buffer, variants
+from middleware import RequestContextMiddleware
+from responses import ORJSONResponse
+from services.cache import close_redis, get_breaker, get_redis
+from services.disk_cache import close_store
+from services.hotkeys import get_tracker
+from services.images import close_images
+from services.rate_limit import rate_limiter
+from services.suggest import topic_index
+from auth import verify_token_optional
 from services.inference import close_client
 from services.model_provider import ModelProvider, ModelError, RequiresPro, ModelUnavailable
-from logging_config import setup_logging, logger
+from logging_config import setup_logging, shutdown_logging, logger
 from config import get_settings
+from diagnostics import diagnostics
+from executors import shutdown_db_executor
+import metrics
 
 
 redis_available = False
 
 
+async def drain_background(timeout: float) -> None:
+    """
+    Wait for detached work to finish before clients are closed.
+
+    Covers history writes, stream producers (which fill the cache) and
+    cache refills, including any they spawn while we wait; whatever is
+    still running after ``timeout`` is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    deadline_at = loop.time() + timeout
+    while True:
+        pending = {*query.history_tasks, *stream_buffer._tasks, *variants._tasks, *cache._refills}
+        pending.discard(asyncio.current_task())
+        if not pending:
+            return
+        remaining = deadline_at - loop.time()
+        if remaining <= 0:
+            logger.warning("shutdown_drain_timeout", cancelled=len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            return
+        logger.info("shutdown_draining", tasks=len(pending))
+        await asyncio.wait(pending, timeout=remaining)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
     """App lifespan: startup/shutdown."""
     setup_logging()
+    diagnostics.start()
     
     global redis_available
     redis_available = False
@@ -34,9 +72,8 @@ async def lifespan(app: FastAPI):
 
     try:
         await r.ping()
-        await FastAPILimiter.init(r)
         redis_available = True
-        logger.info("redis_connected_rate_limiter_init")
+        logger.info("redis_connected")
     except Exception as e:
 
         logger.error("redis_connection_failed", error=str(e))
@@ -44,12 +81,15 @@ async def lifespan(app: FastAPI):
         # Soften enforcement to prevent total site blackout if Redis is just flapping
         is_prod = get_settings().environment == "production"
         if is_prod:
-            logger.error("PROD_REDIS_FAILURE_CONTINUING_UNPROTECTED", error=str(e))
-            # Site will still run, but rate limiting will be off. 
+            logger.error("PROD_REDIS_FAILURE_CONTINUING_LOCAL_LIMITS", error=str(e))
+            # Site will still run; rate limits fall back to per-worker buckets.
             # This prevents the "Failed to Fetch" error caused by the app crashing on startup.
         else:
             logger.warning("redis_unavailable_dev_mode_continuing", error=str(e))
 
+    rate_limiter.start()
+    topic_index.start()
+
     provider = ModelProvider.get_instance()
     await provider.initialize()
     
@@ -57,7 +97,16 @@ async def lifespan(app: FastAPI):
                 gemini_configured=provider.gemini_configured)
     
     yield
-    await asyncio.gather(close_redis(), close_client(), ModelProvider.get_instance().close())
+    # Uvicorn has already stopped accepting and let open responses (SSE
+    # streams included) finish; now let their background writes land
+    await drain_background(get_settings().shutdown_grace_period)
+    await rate_limiter.stop()
+    await topic_index.stop()
+    await asyncio.gather(close_redis(), close_client(), close_images(), ModelProvider.get_instance().close())
+    close_store()
+    await diagnostics.stop()
+    shutdown_db_executor()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -65,6 +114,7 @@ app = FastAPI(
     description="AI-powered layered explanations",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 allowed_origins = os.getenv(
@@ -77,77 +127,24 @@ app.add_middleware(
     allow_origins=[origin.strip() for origin in allowed_origins],
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["content-type", "authorization"],
+    allow_headers=["content-type", "authorization", "last-event-id"],  # Last-Event-ID: SSE resume
     max_age=3600,
 )
-
-
-@app.middleware("http")
-async def security_headers(request: Request, call_next):
-    """Add security headers to all responses."""
-    response = await call_next(request)
-    
-    csp = (
-        "default-src 'self'; "
-        "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://vercel.live; " 
-        "style-src 'self' 'unsafe-inline'; "
-        "img-src 'self' blob: data: https://*.googleusercontent.com; "
-        "connect-src 'self' https://*.supabase.co https://*.groq.com https://api.groq.com; "
-        "font-src 'self' data:; "
-        "object-src 'none'; "
-        "base-uri 'self'; "
-        "form-action 'self'; "
-        "frame-ancestors 'none';"
-    )
-    
-    response.headers["Content-Security-Policy"] = csp
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "0"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-    response.headers["Strict-Transport-Security"] = "max-age=63072000; includeSubDomains; preload"
-    
-    return response
-
-
-@app.middleware("http")
-async def structlog_middleware(request: Request, call_next):
-    """Log requests with structlog."""
-    structlog.contextvars.clear_contextvars()
-    structlog.contextvars.bind_contextvars(
-        path=request.url.path,
-        method=request.method,
-        client_ip=request.client.host if request.client else None,
-    )
-    
-    try:
-        response = await call_next(request)
-        structlog.contextvars.bind_contextvars(
-            status_code=response.status_code,
-        )
-        if response.status_code >= 400:
-             logger.warning("http_request_failed")
-        else:
-             logger.info("http_request_success")
-        return response
-    except Exception as e:
-        logger.error("http_request_exception", error=str(e))
-        raise
+app.add_middleware(RequestContextMiddleware)
 
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global error handler."""
     logger.error("global_exception", error=str(exc))
-    return JSONResponse(status_code=500, content={"error": "Internal server error"})
+    return ORJSONResponse(status_code=500, content={"error": "Internal server error"})
 
 
 @app.exception_handler(ModelUnavailable)
 async def model_unavailable_handler(request: Request, exc: ModelUnavailable):
     """Handle missing model configuration."""
     logger.warning("model_unavailable", error=str(exc))
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=503,
         content={"error": "Service Unavailable", "detail": str(exc)}
     )
@@ -157,7 +154,7 @@ async def model_unavailable_handler(request: Request, exc: ModelUnavailable):
 async def requires_pro_handler(request: Request, exc: RequiresPro):
     """Handle pro-only feature access."""
     logger.info("requires_pro_access", error=str(exc))
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=402,
         content={"error": "Payment Required", "detail": str(exc)}
     )
@@ -167,7 +164,7 @@ async def requires_pro_handler(request: Request, exc: RequiresPro):
 async def model_error_handler(request: Request, exc: ModelError):
     """Handle general model errors."""
     logger.error("model_error", error=str(exc))
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=400,
         content={"error": "Bad Request", "detail": str(exc)}
     )
@@ -175,25 +172,14 @@ async def model_error_handler(request: Request, exc: ModelError):
 
 # app.include_router(pinned.router, prefix="/api") removed - duplicate below
 
-async def conditional_rate_limit(request: Request, response: Response):
+async def conditional_rate_limit(request: Request, auth_data: dict = Depends(verify_token_optional)):
     """
-    Apply rate limiting ONLY if Redis is available.
-    In development (when Redis fails), this becomes a no-op.
-    """
-    if not redis_available:
-        return
-
-    try:
-        if get_settings().environment == "production":
-             await RateLimiter(times=get_settings().rate_limit_per_user, seconds=60)(request, response)
-        else:
-            try:
-                await RateLimiter(times=get_settings().rate_limit_per_user, seconds=60)(request, response)
-            except Exception:
-                pass
-    except Exception:
-        pass
+    Per-user (or per-IP) rate limit, tier-aware for pro users.
 
+    Decided from in-process token buckets; Redis is only touched by the
+    limiter's background sync, so an outage degrades to per-worker limits.
+    """
+    await rate_limiter.check(request, auth_data)
 
 
 app.include_router(pinned.router, prefix="/api")
@@ -204,6 +190,8 @@ app.include_router(
 )
 app.include_router(export.router, prefix="/api")
 app.include_router(history.router, prefix="/api")
+app.include_router(topics.router, prefix="/api")
+app.include_router(images.router, prefix="/api")
 
 
 @app.get("/api/health", tags=["health"])
@@ -213,9 +201,10 @@ async def health():
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat(),
         "environment": get_settings().environment,
+        "redis_breaker": get_breaker().state,
+        "runtime": diagnostics.snapshot(),
     }
 
-
     try:
         r = await get_redis()
         await r.ping()
@@ -225,23 +214,55 @@ async def health():
         is_prod = get_settings().environment == "production"
         if is_prod:
 
-            return JSONResponse(status_code=503, content=status)
-
-    try:
-        from google import genai
-        status["google_genai"] = "✓ installed"
-    except Exception as e:
-        status["google_genai"] = f"✗ {str(e)}"
+            return ORJSONResponse(status_code=503, content=status)
 
-    try:
-        import fpdf
-        status["fpdf2"] = "✓ installed"
-    except Exception as e:
-        status["fpdf2"] = f"✗ {str(e)}"
+    # Check availability without importing; these packages are slow to load
+    for name, module in (("google_genai", "google.genai"), ("fpdf2", "fpdf"), ("pillow", "PIL")):
+        try:
+            found = importlib.util.find_spec(module) is not None
+            status[name] = "✓ installed" if found else "✗ not installed"
+        except Exception as e:
+            status[name] = f"✗ {str(e)}"
 
     return status
 
 
+@app.get("/api/metrics", tags=["health"], include_in_schema=False)
+async def metrics_endpoint(request: Request):
+    """Prometheus exposition of in-process metrics."""
+    token = get_settings().metrics_token
+    if token and request.headers.get("authorization") != f"Bearer {token}":
+        return ORJSONResponse(status_code=401, content={"error": "Unauthorized"})
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/debug/hot-keys", tags=["health"], include_in_schema=False)
+async def hot_keys_endpoint(request: Request, limit: int = Query(20, ge=1, le=100)):
+    """
+    This worker's most-read explanation keys, heaviest first.
+
+    Debug data about what people are reading, so unlike ``/api/metrics``
+    it is only served when ``metrics_token`` is configured.
+    """
+    token = get_settings().metrics_token
+    if not token:
+        return ORJSONResponse(status_code=404, content={"error": "Not found"})
+    if request.headers.get("authorization") != f"Bearer {token}":
+        return ORJSONResponse(status_code=401, content={"error": "Unauthorized"})
+    tracker = get_tracker()
+    now = time.monotonic()
+    keys = []
+    for key, reads in tracker.trending(limit):
+        pin = tracker.pins.get(key)
+        keys.append({
+            "key": key,
+            "reads": reads,
+            "hot": reads >= tracker.threshold,
+            "pinned_for": round(pin[0] - now, 3) if pin and pin[0] > now else 0,
+        })
+    return {"pid": os.getpid(), "window": tracker.window, "threshold": tracker.threshold, "keys": keys}
+
+
 # Catch-all route for debugging (should be last)
 @app.get("/{path:path}")
 async def catch_all(path: str):
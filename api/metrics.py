@@ -0,0 +1,280 @@
+"""Prometheus-style metrics.
+
+A small in-process registry of counters, gauges and histograms rendered in
+the Prometheus text exposition format by ``/api/metrics``. Labelled children
+are cached per label tuple, so the hot path is a dict lookup plus an add.
+"""
+
+import functools
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Iterable
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+_registry: list["_Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+        _registry.append(self)
+
+    def labels(self, *values: str):
+        """Child metric for one combination of label values."""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Fresh per-label-set value holder."""
+
+    @abstractmethod
+    def _samples(self) -> Iterable[str]:
+        """Exposition lines for every child."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        """Read the value from ``fn`` whenever metrics are scraped."""
+        self._function = fn
+
+    def _samples(self):
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        yield from super()._samples()
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Distribution of observations in fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _samples(self):
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+def timed(histogram: Histogram, *label_values: str, in_flight: Gauge | None = None):
+    """Decorator observing the wall time of an async function."""
+    child = histogram.labels(*label_values)
+    gauge = in_flight.labels(*label_values) if in_flight is not None else None
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if gauge is not None:
+                gauge.inc()
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+                if gauge is not None:
+                    gauge.dec()
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# HTTP
+http_requests = Counter(
+    "knowbear_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+http_latency = Histogram(
+    "knowbear_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+
+# Cache
+cache_requests = Counter(
+    "knowbear_cache_requests_total", "Cache lookups by tier and result.", ("tier", "result")
+)
+cache_latency = Histogram(
+    "knowbear_cache_operation_duration_seconds", "Cache operation latency.", ("op",)
+)
+
+redis_breaker_state = Gauge(
+    "knowbear_redis_breaker_state", "Redis circuit breaker state (0 closed, 1 half-open, 2 open)."
+)
+
+# Generation
+generation_latency = Histogram(
+    "knowbear_generation_duration_seconds", "Model generation wall time.", ("kind",)
+)
+stream_ttfc = Histogram(
+    "knowbear_stream_time_to_first_chunk_seconds", "Time from stream start to first model chunk."
+)
+provider_tokens_per_second = Histogram(
+    "knowbear_provider_tokens_per_second", "Streamed chunks per second per generation.", buckets=RATE_BUCKETS
+)
+streams_cancelled = Counter(
+    "knowbear_streams_cancelled_total", "Generations cancelled because every client disconnected."
+)
+stream_chunks_saved = Counter(
+    "knowbear_stream_chunks_saved_total", "Estimated chunks not generated thanks to cancellation."
+)
+
+# Rate limiting
+rate_limit_decisions = Counter(
+    "knowbear_rate_limit_decisions_total", "Rate limiter decisions.", ("result",)
+)
+rate_limit_sync_failures = Counter(
+    "knowbear_rate_limit_sync_failures_total", "Failed batch syncs of local buckets to Redis."
+)
+
+# Supabase / auth
+supabase_latency = Histogram(
+    "knowbear_supabase_call_duration_seconds", "Supabase call latency.", ("op",)
+)
+
+# Request deadlines
+deadline_events = Counter(
+    "knowbear_deadline_events_total", "Stages cut short by the request deadline.", ("stage", "outcome")
+)
+
+# Background work
+background_in_flight = Gauge(
+    "knowbear_background_tasks_in_flight", "Background tasks currently running.", ("task",)
+)
+active_streams = Gauge(
+    "knowbear_active_streams", "Streaming generations currently buffered on this worker."
+)
+
+# Runtime
+event_loop_lag = Histogram(
+    "knowbear_event_loop_lag_seconds", "How late the event loop ran a timer scheduled for now."
+)
+slow_callbacks = Counter(
+    "knowbear_slow_callbacks_total", "Times the event loop was blocked past the slow-callback threshold."
+)
+executor_queue_depth = Gauge(
+    "knowbear_executor_queue_depth", "Calls waiting for a free executor thread.", ("pool",)
+)
+executor_active = Gauge(
+    "knowbear_executor_active_threads", "Executor threads currently running a call.", ("pool",)
+)
+executor_wait = Histogram(
+    "knowbear_executor_wait_seconds", "Time calls spent queued before an executor thread picked them up.", ("pool",)
+)
@@ -0,0 +1,92 @@
+"""Pure-ASGI request middleware.
+
+Replaces the former ``@app.middleware("http")`` pair (security headers and
+request logging). Those ran on BaseHTTPMiddleware, which spawns a task and
+re-wraps the response body stream for every request; this middleware only
+intercepts ``http.response.start`` to append a precomputed header block and
+passes body messages (including SSE chunks) straight through.
+"""
+
+import time
+
+import structlog
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import deadline
+import metrics
+from config import get_settings
+from logging_config import logger
+
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://vercel.live; "
+    "style-src 'self' 'unsafe-inline'; "
+    "img-src 'self' blob: data: https://*.googleusercontent.com; "
+    "connect-src 'self' https://*.supabase.co https://*.groq.com https://api.groq.com; "
+    "font-src 'self' data:; "
+    "object-src 'none'; "
+    "base-uri 'self'; "
+    "form-action 'self'; "
+    "frame-ancestors 'none';"
+)
+
+SECURITY_HEADERS: tuple[tuple[bytes, bytes], ...] = tuple(
+    (name.encode("latin-1"), value.encode("latin-1"))
+    for name, value in (
+        ("content-security-policy", CONTENT_SECURITY_POLICY),
+        ("x-content-type-options", "nosniff"),
+        ("x-frame-options", "DENY"),
+        ("x-xss-protection", "0"),
+        ("referrer-policy", "strict-origin-when-cross-origin"),
+        ("permissions-policy", "geolocation=(), microphone=(), camera=()"),
+        ("strict-transport-security", "max-age=63072000; includeSubDomains; preload"),
+    )
+)
+
+
+class RequestContextMiddleware:
+    """Add security headers, bind the log context, start the request deadline and record metrics."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        structlog.contextvars.clear_contextvars()
+        structlog.contextvars.bind_contextvars(
+            path=scope["path"],
+            method=scope["method"],
+            client_ip=client[0] if client else None,
+        )
+        start = time.perf_counter()
+        status_code = 500
+        # Every await below (dependencies, services, spawned tasks) inherits this budget
+        token = deadline.start(get_settings().request_deadline)
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [*message.get("headers", ()), *SECURITY_HEADERS]
+                structlog.contextvars.bind_contextvars(status_code=status_code)
+                if status_code >= 400:
+                    logger.warning("http_request_failed")
+                else:
+                    logger.info("http_request_success")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            logger.error("http_request_exception", error=str(e))
+            raise
+        finally:
+            deadline.reset(token)
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.http_latency.labels(scope["method"], route).observe(time.perf_counter() - start)
+            metrics.http_requests.labels(scope["method"], route, str(status_code)).inc()
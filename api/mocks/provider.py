@@ -0,0 +1,29 @@
+"""In-process model provider stand-in."""
+
+import asyncio
+from typing import AsyncIterator
+
+
+class MockProvider:
+    """Deterministic fake model with configurable time-to-first-token and token rate."""
+
+    def __init__(self, ttft: float = 0.0, tokens_per_second: float = 0.0, tokens: int = 40):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.calls = 0
+
+    async def stream(self, topic: str, level: str, **kwargs) -> AsyncIterator[str]:
+        """Yield ``tokens`` words about ``topic``, paced like a real model."""
+        self.calls += 1
+        if self.ttft:
+            await asyncio.sleep(self.ttft)
+        gap = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for i in range(self.tokens):
+            if i and gap:
+                await asyncio.sleep(gap)
+            yield f"{topic} ({level}) token {i}. " if i == 0 else f"w{i} "
+
+    async def generate(self, topic: str, level: str, premium: bool = False, mode: str = "ensemble") -> str:
+        """Complete explanation, same signature as ``ensemble_generate``."""
+        return "".join([chunk async for chunk in self.stream(topic, level, mode=mode)])
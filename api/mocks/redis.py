@@ -0,0 +1,100 @@
+"""In-process Redis stand-in."""
+
+import asyncio
+import fnmatch
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of redis.asyncio used by the services."""
+
+    def __init__(self, latency: float = 0.0):
+        self.data: dict[str, object] = {}
+        self.latency = latency  # Injected delay for get/set calls
+        self.calls = 0
+
+    async def _delay(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        await self._delay()
+        val = self.data.get(key)
+        return val if isinstance(val, bytes) else None
+
+    async def mget(self, keys):
+        await self._delay()
+        return [v if isinstance(v, bytes) else None for v in map(self.data.get, keys)]
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def setex(self, key, ttl, value):
+        await self._delay()
+        return await self.set(key, value, ex=ttl)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(k, None) is not None for k in keys)
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def expire(self, key, ttl):
+        return key in self.data
+
+    async def rpush(self, key, *values):
+        lst = self.data.setdefault(key, [])
+        lst.extend(values)
+        return len(lst)
+
+    async def lrange(self, key, start, end):
+        lst = self.data.get(key, [])
+        return lst[start:] if end == -1 else lst[start:end + 1]
+
+    async def scan_iter(self, match="*", count=None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    async def zincrby(self, key, amount, member):
+        zset = self.data.setdefault(key, {})
+        member = member.encode() if isinstance(member, str) else member
+        zset[member] = zset.get(member, 0.0) + amount
+        return zset[member]
+
+    async def zmscore(self, key, members):
+        zset = self.data.get(key, {})
+        return [zset.get(m.encode() if isinstance(m, str) else m) for m in members]
+
+    async def zrevrange(self, key, start, end, withscores=False):
+        ranked = sorted(self.data.get(key, {}).items(), key=lambda kv: kv[1], reverse=True)
+        ranked = ranked[start:] if end == -1 else ranked[start:end + 1]
+        return ranked if withscores else [member for member, _ in ranked]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        calls, self.calls = self.calls, []
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in calls]
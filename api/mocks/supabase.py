@@ -0,0 +1,158 @@
+"""In-process Supabase stand-in."""
+
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any
+
+TOKEN_PREFIX = "token-"  # Bearer "token-<user id>" authenticates as that user
+
+
+def user_token(user_id: str) -> str:
+    return TOKEN_PREFIX + user_id
+
+
+class _Auth:
+    def __init__(self, client: "FakeSupabase"):
+        self.client = client
+
+    def get_user(self, token: str):
+        self.client._delay()
+        if not token.startswith(TOKEN_PREFIX):
+            raise ValueError("Invalid token")
+        user_id = token[len(TOKEN_PREFIX):]
+        return SimpleNamespace(
+            user=SimpleNamespace(id=user_id, email=f"{user_id}@example.com", user_metadata={})
+        )
+
+
+class FakeQuery:
+    """The subset of the PostgREST query builder the routers use."""
+
+    def __init__(self, client: "FakeSupabase", table: str):
+        self.client = client
+        self.table = table
+        self.filters: list = []
+        self.sort: list[tuple[str, bool]] = []
+        self.max_rows: int | None = None
+        self.one = False
+        self.action = "select"
+        self.payload: Any = None
+
+    def select(self, columns: str = "*"):
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def or_(self, expr: str):
+        # Only the keyset cursor used by history export:
+        # created_at.lt."<ts>",and(created_at.eq."<ts>",id.lt."<id>")
+        ts, row_id = re.match(r'created_at\.lt\."(.+?)",.*id\.lt\."(.+?)"', expr).groups()
+        self.filters.append(lambda row: (row["created_at"], str(row["id"])) < (ts, row_id))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.sort.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self.max_rows = size
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows):
+        self.action, self.payload = "upsert", rows
+        return self
+
+    def update(self, values: dict):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def _matches(self, row: dict) -> bool:
+        return all(f(row) for f in self.filters)
+
+    def execute(self):
+        self.client._delay()
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self.action in ("insert", "upsert"):
+                data = [self.client._store(self.table, row, self.action == "upsert") for row in _as_list(self.payload)]
+            elif self.action == "update":
+                values = {k: (_now() if v == "now()" else v) for k, v in self.payload.items()}
+                data = [row for row in rows if self._matches(row)]
+                for row in data:
+                    row.update(values)
+            elif self.action == "delete":
+                data = [row for row in rows if self._matches(row)]
+                rows[:] = [row for row in rows if not self._matches(row)]
+            else:
+                data = [row for row in rows if self._matches(row)]
+                for column, desc in reversed(self.sort):
+                    data.sort(key=lambda row: row.get(column), reverse=desc)
+                if self.max_rows is not None:
+                    data = data[: self.max_rows]
+            data = [dict(row) for row in data]
+        if self.one:
+            return SimpleNamespace(data=data[0] if data else None)
+        return SimpleNamespace(data=data)
+
+
+class FakeSupabase:
+    """
+    Thread-safe in-memory Supabase client.
+
+    ``latency`` is slept (blocking, like the real client) on every auth
+    call and query, so it occupies a DB executor thread for that long.
+    """
+
+    def __init__(self, latency: float = 0.0, pro_users: set[str] | None = None):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.tables: dict[str, list[dict]] = {"users": [], "history": []}
+        self.auth = _Auth(self)
+        self.calls = 0
+        for user_id in pro_users or ():
+            self.tables["users"].append({"id": user_id, "is_pro": True})
+
+    def _delay(self) -> None:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def _store(self, table: str, row: dict, upsert: bool) -> dict:
+        rows = self.tables[table]
+        if upsert and "id" in row:
+            for existing in rows:
+                if existing.get("id") == row["id"]:
+                    existing.update(row)
+                    return existing
+        stored = {"id": str(uuid.uuid4()), "created_at": _now(), **row}
+        rows.append(stored)
+        return stored
+
+
+def _as_list(rows) -> list[dict]:
+    return rows if isinstance(rows, list) else [rows]
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
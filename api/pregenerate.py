@@ -0,0 +1,228 @@
+"""Offline bulk pre-generation.
+
+Fills the explanation cache for a list of topics without going through
+the HTTP API. Each topic is run through ``sanitize_topic`` and generated
+at every level with bounded concurrency via the same generation and cache
+services the API uses. Results stream to a JSONL file, which doubles as
+the checkpoint: a re-run skips every (topic, level) already written
+successfully, so a crashed run resumes where it stopped. Run from the
+``api`` directory:
+
+    python -m pregenerate topics.txt --output results.jsonl [--concurrency 8]
+    python -m pregenerate topics.txt --output results.jsonl --mock-provider --mock-tps 200
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Iterable, TextIO
+
+import orjson
+
+from prompts import PROMPTS
+from services.cache import close_redis, get_explanation, set_explanation
+from services.disk_cache import close_store
+from utils import normalize_topic, sanitize_topic
+
+DEFAULT_LEVELS = tuple(level for level in PROMPTS if level != "technical_depth")
+
+Generate = Callable[..., Awaitable[str]]
+
+
+def read_topics(lines: Iterable[str]) -> list[str]:
+    """Non-empty, non-comment lines, de-duplicated in order."""
+    topics, seen = [], set()
+    for line in lines:
+        topic = line.strip()
+        if topic and not topic.startswith("#") and topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def load_checkpoint(path: str) -> set[tuple[str, str]]:
+    """(normalized topic, level) pairs already written successfully to ``path``."""
+    done: set[tuple[str, str]] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # Torn last line from a crash
+            if "error" not in record:
+                done.add((normalize_topic(record["topic"]), record["level"]))
+    return done
+
+
+class Progress:
+    """Throughput and ETA reporting on stderr."""
+
+    def __init__(self, total: int, stream: TextIO = sys.stderr, interval: float = 5.0):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = self.generated = self.cached = self.failed = 0
+        self.started = time.monotonic()
+        self._last = self.started
+
+    def record(self, result: str) -> None:
+        self.done += 1
+        setattr(self, result, getattr(self, result) + 1)
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report()
+
+    def report(self) -> None:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = remaining / rate if rate else (0.0 if not remaining else float("inf"))
+        print(
+            f"[pregenerate] {self.done}/{self.total} "
+            f"({self.generated} generated, {self.cached} cached, {self.failed} failed) "
+            f"{rate:.1f}/s, ETA {_format_seconds(eta)}",
+            file=self.stream,
+            flush=True,
+        )
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "?"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+async def pregenerate(
+    topics: list[str],
+    output: str,
+    levels: Iterable[str] = DEFAULT_LEVELS,
+    mode: str = "fast",
+    concurrency: int = 4,
+    generate: Generate | None = None,
+    force: bool = False,
+    progress_interval: float = 5.0,
+) -> Progress:
+    """
+    Generate and cache every (topic, level) not yet in ``output``.
+
+    ``generate`` defaults to ``ensemble_generate``; pass a mock provider's
+    ``generate`` for dry runs. Cached explanations are recorded without a
+    model call unless ``force`` is set.
+    """
+    if generate is None:
+        from services.ensemble import ensemble_generate as generate
+
+    done = load_checkpoint(output)
+    jobs: list[tuple[str, str]] = []
+    for raw in topics:
+        try:
+            topic = sanitize_topic(raw)
+        except ValueError as e:
+            print(f"[pregenerate] skipping {raw!r}: {e}", file=sys.stderr)
+            continue
+        jobs.extend((topic, lvl) for lvl in levels if (normalize_topic(topic), lvl) not in done)
+
+    progress = Progress(len(jobs), interval=progress_interval)
+    if done:
+        print(f"[pregenerate] resuming: {len(done)} already done, {len(jobs)} to go", file=sys.stderr)
+    if not jobs:
+        return progress
+
+    queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    with open(output, "ab") as out:
+        if out.tell():
+            with open(output, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    out.write(b"\n")  # Terminate a torn line so new records parse
+
+        def write(record: dict[str, Any]) -> None:
+            # One write + flush per record so a crash loses at most a torn line
+            out.write(orjson.dumps(record) + b"\n")
+            out.flush()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    topic, level = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                record: dict[str, Any] = {"topic": topic, "level": level, "mode": mode}
+                try:
+                    cached = None if force else await get_explanation(topic, level, mode)
+                    if cached and cached.get("text"):
+                        text, result = cached["text"], "cached"
+                    else:
+                        text, result = await generate(topic, level, mode=mode), "generated"
+                        await set_explanation(topic, level, mode, {"text": text})
+                    record.update(cached=result == "cached", text=text)
+                except Exception as e:
+                    record["error"] = str(e) or type(e).__name__
+                    result = "failed"
+                record["elapsed"] = round(time.perf_counter() - start, 4)
+                write(record)
+                progress.record(result)
+
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return progress
+
+
+async def _run(args: argparse.Namespace) -> int:
+    if args.topics == "-":
+        topics = read_topics(sys.stdin)
+    else:
+        with open(args.topics, encoding="utf-8") as f:
+            topics = read_topics(f)
+
+    generate = None
+    if args.mock_provider:
+        from mocks.provider import MockProvider
+        generate = MockProvider(ttft=args.mock_ttft, tokens_per_second=args.mock_tps).generate
+
+    try:
+        progress = await pregenerate(
+            topics,
+            args.output,
+            levels=args.levels.split(","),
+            mode=args.mode,
+            concurrency=args.concurrency,
+            generate=generate,
+            force=args.force,
+            progress_interval=args.progress_interval,
+        )
+    finally:
+        await close_redis()
+        close_store()
+    progress.report()
+    return 1 if progress.failed else 0
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("topics", help="File with one topic per line, or - for stdin")
+    parser.add_argument("--output", required=True, help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--levels", default=",".join(DEFAULT_LEVELS))
+    parser.add_argument("--mode", default="fast")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--force", action="store_true", help="Regenerate even when cached")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between reports")
+    parser.add_argument("--mock-provider", action="store_true", help="Use the in-process mock model")
+    parser.add_argument("--mock-ttft", type=float, default=0.05, help="Mock time to first token (s)")
+    parser.add_argument("--mock-tps", type=float, default=200.0, help="Mock tokens per second")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -2,6 +2,9 @@
 
 # Specialized "Chain of Thought" and internal instructions are omitted.
 
+# Bump whenever prompts change in a way that should invalidate stored answers
+PROMPT_VERSION = "1"
+
 PROMPTS = {
     "eli5": "Explain {topic} like I'm 5.",
     "eli10": "Explain {topic} like I'm 10.",
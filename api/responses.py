@@ -0,0 +1,40 @@
+"""Response classes."""
+
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse, Response
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def cache_control(max_age: int, stale_while_revalidate: int = 0, private: bool = False) -> str:
+    """Cache-Control value (public unless ``private``) with an optional stale-while-revalidate window."""
+    value = f"{'private' if private else 'public'}, max-age={max_age}"
+    if stale_while_revalidate:
+        value += f", stale-while-revalidate={stale_while_revalidate}"
+    return value
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str, cache_control_value: str, vary: str | None = None) -> Response:
+    """Empty 304 carrying the validators a cache needs to refresh its copy."""
+    headers = {"ETag": etag, "Cache-Control": cache_control_value}
+    if vary:
+        headers["Vary"] = vary
+    return Response(status_code=304, headers=headers)
@@ -3,21 +3,31 @@ import io
 import json
 import base64
 import re
-import markdown
+import time
+import zipfile
 import structlog
-from typing import Optional, Dict
+from typing import AsyncIterator, Optional, Dict
 
-from fastapi import APIRouter, HTTPException, Depends
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
 
-from auth import verify_token, check_is_pro
+import deadline
+from auth import verify_token, check_is_pro, get_supabase_admin
+from config import get_settings
+from executors import run_db
+from services.cache import get_explanations, set_explanation
 from services.ensemble import ensemble_generate
+from services.rate_limit import rate_limiter
+from utils import sanitize_topic
 
 logger = structlog.get_logger(__name__)
 router = APIRouter(tags=["export"])
 
+NOT_GENERATED = "Not generated: rate limit reached. Export again later to include it."
+
 
 class ExportRequest(BaseModel):
     topic: str = Field(..., min_length=1)
@@ -28,34 +38,6 @@ class ExportRequest(BaseModel):
     visuals: Optional[dict[str, str]] = None
 
 
-from fpdf import FPDF, HTMLMixin
-class StyledPDF(FPDF, HTMLMixin):
-    def __init__(self, topic_name: str, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.topic_name = topic_name
-
-    def header(self):
-        # Fill background for every page
-        self.set_fill_color(10, 10, 10)
-        self.rect(0, 0, 210, 297, "F")
-        
-        if self.page_no() > 1:
-            self.set_font("helvetica", "I", 8)
-            self.set_text_color(150, 150, 150)
-            self.cell(0, 10, f"KnowBear Technical Depth: {self.topic_name}", align="R")
-            self.ln(10)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font("helvetica", "I", 8)
-        self.set_text_color(150, 150, 150)
-        self.cell(0, 10, f"Page {self.page_no()} / {{nb}}", align="C")
-
-
-def safe_latin1(text: str) -> str:
-    # Ensure text is safe for fpdf2's default helvetica font.
-    return text.encode('latin-1', 'replace').decode('latin-1')
-
 @router.post("/export")
 async def export_explanations(req: ExportRequest, auth_data: dict = Depends(verify_token)) -> StreamingResponse:
     """Export explanations in requested format."""
@@ -112,47 +94,215 @@ async def export_explanations(req: ExportRequest, auth_data: dict = Depends(veri
     filename_base = f"{slug}-technical-depth" if is_technical else f"knowbear-{slug}"
 
     if req.format == "txt":
-        content = f"# {req.topic}\n\n"
-        if len(req.explanations) > 1:
-            content += "---\n\n"
-        for level, text in req.explanations.items():
-            if not is_technical and len(req.explanations) > 1:
-                lvl_name = "TECHNICAL DEPTH" if level == "technical_depth" else level.replace('eli', 'ELI-').upper()
-                content += f"## {lvl_name}\n\n"
-            content += f"{text.strip()}\n\n"
-            if len(req.explanations) > 1:
-                content += "---\n\n"
+        content = render_text(req.topic, req.explanations, headings=not is_technical)
         return StreamingResponse(
             io.BytesIO(content.encode()),
             media_type="text/plain",
             headers={"Content-Disposition": f"attachment; filename={filename_base}.txt"},
         )
     elif req.format == "md":
-        content = f"# {req.topic}\n\n"
-        if len(req.explanations) > 1:
-            content += "---\n\n"
-        for level, text in req.explanations.items():
-            if not is_technical and len(req.explanations) > 1:
-                lvl_name = level.replace('eli', 'ELI-').upper()
-                content += f"## {lvl_name}\n\n"
-            content += f"{text.strip()}\n\n"
-            if len(req.explanations) > 1:
-                content += "---\n\n"
+        content = render_markdown(req.topic, req.explanations, headings=not is_technical)
         return StreamingResponse(
             io.BytesIO(content.encode()),
             media_type="text/markdown",
             headers={"Content-Disposition": f"attachment; filename={filename_base}.md"},
         )
     elif req.format == "json":
-        data = {"topic": req.topic, "explanations": req.explanations}
         return StreamingResponse(
-            io.BytesIO(json.dumps(data, indent=2).encode()),
+            io.BytesIO(render_json(req.topic, req.explanations).encode()),
             media_type="application/json",
             headers={"Content-Disposition": f"attachment; filename={filename_base}.json"},
         )
     # elif req.format == "pdf":
     #     try:
+    #         from services.pdf import StyledPDF, safe_latin1  # imported lazily; fpdf is heavy
     #         ... PDF logic ...
     #     except Exception as e:
         
-    raise HTTPException(400, "Requested format is currently disabled or invalid")
\ No newline at end of file
+    raise HTTPException(400, "Requested format is currently disabled or invalid")
+
+def render_text(topic: str, explanations: dict[str, str], headings: bool = True) -> str:
+    """Plain-text document for one topic, one section per level."""
+    content = f"# {topic}\n\n"
+    if len(explanations) > 1:
+        content += "---\n\n"
+    for level, text in explanations.items():
+        if headings and len(explanations) > 1:
+            lvl_name = "TECHNICAL DEPTH" if level == "technical_depth" else level.replace('eli', 'ELI-').upper()
+            content += f"## {lvl_name}\n\n"
+        content += f"{text.strip()}\n\n"
+        if len(explanations) > 1:
+            content += "---\n\n"
+    return content
+
+
+def render_json(topic: str, explanations: dict[str, str]) -> str:
+    """JSON document for one topic."""
+    return json.dumps({"topic": topic, "explanations": explanations}, indent=2)
+
+
+def render_markdown(topic: str, explanations: dict[str, str], headings: bool = True) -> str:
+    """Markdown document for one topic, one section per level."""
+    content = f"# {topic}\n\n"
+    if len(explanations) > 1:
+        content += "---\n\n"
+    for level, text in explanations.items():
+        if headings and len(explanations) > 1:
+            lvl_name = level.replace('eli', 'ELI-').upper()
+            content += f"## {lvl_name}\n\n"
+        content += f"{text.strip()}\n\n"
+        if len(explanations) > 1:
+            content += "---\n\n"
+    return content
+
+
+class _ZipSink:
+    """Write-only file object that hands zip output back in pieces.
+
+    zipfile falls back to data descriptors on unseekable outputs, so each
+    member can be emitted as soon as it is written and nothing but the
+    central directory (a few dozen bytes per file) stays in memory.
+    """
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+async def _history_pages(supabase, user_id: str, page_size: int) -> AsyncIterator[list[dict]]:
+    """History rows newest first, fetched in keyset pages of (created_at, id)."""
+    last = None
+    while True:
+        query = supabase.table("history").select("id, topic, levels, mode, created_at").eq("user_id", user_id)
+        if last is not None:
+            ts, row_id = last["created_at"], last["id"]
+            query = query.or_(f'created_at.lt."{ts}",and(created_at.eq."{ts}",id.lt."{row_id}")')
+        query = query.order("created_at", desc=True).order("id", desc=True).limit(page_size)
+        rows = (await run_db(query.execute)).data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+
+
+async def _page_explanations(
+    rows: list[dict], semaphore: asyncio.Semaphore, user_id: str
+) -> AsyncIterator[tuple[dict, str, dict[str, str]]]:
+    """
+    Yield (row, topic, explanations) in history order; only missing levels are generated.
+
+    Each generation costs the user one rate-limit token, as in batch
+    queries. Once the bucket is empty, missing levels are exported as not
+    generated rather than failing an archive that is already streaming.
+    """
+    by_mode: dict[str, list[tuple[dict, str, list[str]]]] = {}
+    for row in rows:
+        try:
+            topic = sanitize_topic(row["topic"])
+        except ValueError:
+            continue
+        mode = row.get("mode") or "fast"
+        mode = "fast" if mode in ("ensemble", "technical_depth") else mode
+        by_mode.setdefault(mode, []).append((row, topic, row.get("levels") or ["eli5"]))
+
+    async def fill(mode: str, row: dict, topic: str, found: dict[str, dict | None]):
+        explanations = {lvl: v["text"] for lvl, v in found.items() if v and v.get("text")}
+        missing = [lvl for lvl in found if lvl not in explanations]
+        if missing and not rate_limiter.charge(user_id, len(missing)):
+            for lvl in missing:
+                explanations[lvl] = NOT_GENERATED
+        elif missing:
+            async with semaphore:
+                results = await asyncio.gather(
+                    *(ensemble_generate(topic, lvl, mode=mode) for lvl in missing), return_exceptions=True
+                )
+            for lvl, result in zip(missing, results):
+                if isinstance(result, str):
+                    explanations[lvl] = result
+                    await set_explanation(topic, lvl, mode, {"text": result})
+                else:
+                    explanations[lvl] = f"Error generating content: {result}"
+        # Keep the levels in the order the user viewed them
+        return row, topic, {lvl: explanations[lvl] for lvl in found}
+
+    tasks = []
+    for mode, items in by_mode.items():
+        # One batched cache read per page (and mode)
+        cached = iter(await get_explanations([(t, lvl) for _, t, levels in items for lvl in levels], mode))
+        for row, topic, levels in items:
+            found = {lvl: next(cached) for lvl in levels}
+            tasks.append(asyncio.ensure_future(fill(mode, row, topic, found)))
+    try:
+        # Rows are generated concurrently but emitted in order, so archive
+        # numbering follows the history
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@router.get("/export/history")
+async def export_history(
+    format: str = Query("md", pattern="^(md|json)$"),
+    auth_data: dict = Depends(verify_token),
+) -> StreamingResponse:
+    """
+    Export the user's whole history as a ZIP of md or json files.
+
+    History is read in keyset pages; explanations come from the cache, and
+    only missing ones are generated, ``export_concurrency`` topics at a
+    time. The archive is streamed member by member, so memory use is
+    bounded by one page however long the history is.
+    """
+    user_id = auth_data["user"].id
+    supabase = get_supabase_admin()
+    if not supabase:
+        raise HTTPException(status_code=500, detail="Database connection error")
+    settings = get_settings()
+
+    async def body():
+        # A long export is not bound by the request deadline
+        deadline.clear()
+        semaphore = asyncio.Semaphore(settings.export_concurrency)
+        sink = _ZipSink()
+        count = 0
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            async for rows in _history_pages(supabase, user_id, settings.export_page_size):
+                async for row, topic, explanations in _page_explanations(rows, semaphore, user_id):
+                    count += 1
+                    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")[:40] or "topic"
+                    if format == "json":
+                        name = f"{count:04d}-{slug}.json"
+                        data = orjson.dumps(
+                            {"topic": topic, "mode": row.get("mode"), "created_at": row.get("created_at"),
+                             "explanations": explanations},
+                            option=orjson.OPT_INDENT_2,
+                        )
+                    else:
+                        name = f"{count:04d}-{slug}.md"
+                        data = render_markdown(topic, explanations).encode()
+                    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(info, data)
+                    yield sink.drain()
+        yield sink.drain()  # Central directory
+        logger.info("export_history_complete", user_id=user_id, topics=count)
+
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=knowbear-history.zip"},
+    )
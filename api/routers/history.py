@@ -1,7 +1,7 @@
-import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 
 from auth import verify_token, get_supabase_admin
+from executors import run_db
 from pydantic import BaseModel
 from typing import List
 from datetime import datetime
@@ -33,7 +33,7 @@ async def get_history(auth_data: dict = Depends(verify_token)):
         raise HTTPException(status_code=500, detail="Database connection error")
     
     try:
-        response = await asyncio.to_thread(
+        response = await run_db(
             supabase.table("history").select("*").eq("user_id", user_id).order("created_at", desc=True).limit(50).execute
         )
         return response.data
@@ -52,7 +52,7 @@ async def add_history_item(data: HistoryCreate, auth_data: dict = Depends(verify
         raise HTTPException(status_code=500, detail="Database connection error")
         
     try:
-        response = await asyncio.to_thread(
+        response = await run_db(
             supabase.table("history").insert({
                 "user_id": user_id,
                 "topic": data.topic,
@@ -81,7 +81,7 @@ async def delete_history_item(item_id: str, auth_data: dict = Depends(verify_tok
         
     try:
         # Securely delete only if user_id matches
-        await asyncio.to_thread(
+        await run_db(
             supabase.table("history").delete().eq("id", item_id).eq("user_id", user_id).execute
         )
         return {"status": "deleted"}
@@ -99,7 +99,7 @@ async def clear_history(auth_data: dict = Depends(verify_token)):
         raise HTTPException(status_code=500, detail="Database connection error")
         
     try:
-        await asyncio.to_thread(
+        await run_db(
             supabase.table("history").delete().eq("user_id", user_id).execute
         )
         return {"status": "cleared"}
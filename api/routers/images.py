@@ -0,0 +1,47 @@
+"""Image proxy endpoints."""
+
+from fastapi import APIRouter, HTTPException, Path, Query, Request, Response
+
+from config import get_settings
+from logging_config import logger
+from responses import ORJSONResponse, cache_control, etag_matches, not_modified
+from services.images import IMAGE_WIDTHS, ImageUnavailable, get_thumbnail, snap_width
+from services.search import search_service
+
+router = APIRouter(tags=["images"])
+
+
+@router.get("/images/search")
+async def search_images(q: str = Query(..., min_length=1, max_length=200)) -> ORJSONResponse:
+    """Images for a query, as proxy URLs with the widths they can be requested at."""
+    images = await search_service.get_images(q)
+    return ORJSONResponse(
+        {"query": q, "images": images, "widths": list(IMAGE_WIDTHS)},
+        headers={"Cache-Control": cache_control(300)},
+    )
+
+
+@router.get("/images/{image_id}")
+async def proxy_image(
+    request: Request,
+    image_id: str = Path(..., pattern="^[0-9a-f]{32}$"),
+    w: int = Query(640, ge=1, le=4096),
+) -> Response:
+    """
+    WebP thumbnail of a registered image.
+
+    ``w`` snaps up to a standard width so the cache holds a handful of
+    sizes per image. The bytes for an (id, width) never change, so they
+    are served as immutable.
+    """
+    width = snap_width(w)
+    etag = f'"{image_id}-{width}"'
+    cc = f"public, max-age={get_settings().image_cache_max_age}, immutable"
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, cc)
+    try:
+        data = await get_thumbnail(image_id, width)
+    except ImageUnavailable as e:
+        logger.info("image_unavailable", image_id=image_id, error=str(e))
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(data, media_type="image/webp", headers={"Cache-Control": cc, "ETag": etag})
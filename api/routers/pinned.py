@@ -1,6 +1,12 @@
 """Pinned topics endpoint."""
 
-from fastapi import APIRouter
+import hashlib
+
+import orjson
+from fastapi import APIRouter, Request, Response
+
+from config import get_settings
+from responses import cache_control, etag_matches, not_modified
 
 router = APIRouter(tags=["pinned"])
 
@@ -16,7 +22,18 @@ PINNED_TOPICS = [
 ]
 
 
-@router.get("/pinned")
-async def get_pinned() -> list[dict]:
+# The list is static, so its body and ETag are computed once
+_BODY = orjson.dumps(PINNED_TOPICS)
+_ETAG = f'"{hashlib.sha256(_BODY).hexdigest()[:32]}"'
+
+
+@router.get("/pinned", response_model=list[dict])
+async def get_pinned(request: Request) -> Response:
     """Return curated pinned topics."""
-    return PINNED_TOPICS
+    settings = get_settings()
+    cc = cache_control(settings.pinned_cache_max_age, settings.pinned_cache_stale_while_revalidate)
+    if etag_matches(request.headers.get("if-none-match"), _ETAG):
+        return not_modified(_ETAG, cc)
+    return Response(
+        _BODY, media_type="application/json", headers={"ETag": _ETAG, "Cache-Control": cc}
+    )
@@ -1,17 +1,35 @@
 """Query endpoint for generating explanations."""
 
 import asyncio
-from fastapi import APIRouter, HTTPException, Depends
+import hashlib
+from contextlib import aclosing
+
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from fastapi_limiter.depends import RateLimiter
 from utils import sanitize_topic, topic_cache_key
-from services.cache import cache_get, cache_set
+from services.cache import (
+    explanation_etag,
+    get_explanation,
+    get_explanation_etags,
+    get_explanations,
+    set_explanation,
+)
 from services.ensemble import ensemble_generate
 from services.inference import generate_stream_explanation
+from services.stream_buffer import find_active, parse_event_id, replay, start_stream, stream_exists
+from services.suggest import topic_index
+from services.rate_limit import rate_limiter
+from services.variants import record_generated, take_variant
 from auth import verify_token_optional, get_supabase_admin, ensure_user_exists, check_is_pro
 from logging_config import logger
-import json
+import deadline
+from config import get_settings
+from executors import run_db
+from metrics import background_in_flight, supabase_latency, timed
+from responses import ORJSONResponse, cache_control, etag_matches, not_modified
+from sse import SSEEncoder, coalesce_chunks
 
 
 router = APIRouter(tags=["query"])
@@ -32,14 +50,91 @@ class QueryResponse(BaseModel):
     cached: bool = False
 
 
+class BatchItem(BaseModel):
+    topic: str = Field(..., min_length=1, max_length=200)
+    levels: list[str] = Field(default_factory=list)
+
+
+class BatchQueryRequest(BaseModel):
+    items: list[BatchItem] = Field(..., min_length=1)
+    mode: str = "fast"
+    bypass_cache: bool = False
+
+
 @router.post("/query", response_model=QueryResponse)
 async def query_topic(
     req: QueryRequest,
     auth_data: dict = Depends(verify_token_optional)
 ) -> QueryResponse:
     """Generate explanations for a topic."""
-    if (req.mode == "ensemble" or req.mode == "technical_depth"):
-        req.mode = "fast"
+    response, _ = await _answer_query(req, auth_data)
+    return response
+
+
+def _effective_mode(mode: str) -> str:
+    return "fast" if mode in ("ensemble", "technical_depth") else mode
+
+
+def _query_etag(mode: str, levels: list[str], etags: list[str]) -> str:
+    """Strong ETag for a (levels, mode) response, built from per-level content hashes."""
+    raw = mode + "|" + ",".join(f"{lvl}={etag}" for lvl, etag in zip(levels, etags))
+    return f'"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+@router.get("/query", response_model=QueryResponse)
+async def query_topic_get(
+    request: Request,
+    topic: str = Query(..., min_length=1, max_length=200),
+    levels: list[str] = Query(default_factory=list),
+    mode: str = "ensemble",
+    auth_data: dict = Depends(verify_token_optional)
+) -> Response:
+    """
+    Cacheable GET variant of ``POST /query``.
+
+    Responses carry a content-hash ``ETag`` and a public ``Cache-Control``
+    with ``stale-while-revalidate``, so browsers and the CDN can serve
+    repeat views. ``If-None-Match`` is answered with a 304 from the
+    per-level ETag metadata in Redis without reading the explanations.
+    Signed-in responses are ``private`` and everything varies on
+    ``Authorization``: a shared-cache hit would skip the history write.
+    """
+    # Accept both ?levels=eli5&levels=eli10 and ?levels=eli5,eli10
+    levels = [lvl for value in levels for lvl in value.split(",") if lvl] or ["eli5"]
+    settings = get_settings()
+    cc = cache_control(
+        settings.query_cache_max_age,
+        settings.query_cache_stale_while_revalidate,
+        private=auth_data is not None,
+    )
+    req = QueryRequest(topic=topic, levels=levels, mode=mode)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        try:
+            clean = sanitize_topic(topic)
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        etags = await get_explanation_etags(clean, levels, _effective_mode(mode))
+        if all(etags):
+            etag = _query_etag(_effective_mode(mode), levels, etags)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, cc, vary="Authorization")
+
+    response, complete = await _answer_query(req, auth_data)
+    etags = [explanation_etag(response.explanations[lvl]) for lvl in levels]
+    headers = {
+        "ETag": _query_etag(req.mode, levels, etags),
+        # Never let a cache hold on to a partial failure
+        "Cache-Control": cc if complete else "no-store",
+        "Vary": "Authorization",
+    }
+    return ORJSONResponse(response.model_dump(), headers=headers)
+
+
+async def _answer_query(req: QueryRequest, auth_data: dict | None) -> tuple[QueryResponse, bool]:
+    """Shared body of the POST and GET query routes; also reports whether every level succeeded."""
+    req.mode = _effective_mode(req.mode)
 
     try:
         topic = sanitize_topic(req.topic)
@@ -53,8 +148,7 @@ async def query_topic(
     
     if not req.bypass_cache:
         for lvl in levels:
-            key = topic_cache_key(topic, lvl)
-            cached = await cache_get(key)
+            cached = await get_explanation(topic, lvl, req.mode)
             if cached:
                 explanations[lvl] = cached.get("text", "")
             else:
@@ -64,43 +158,140 @@ async def query_topic(
 
     # If all levels are cached, we still want to record history if authenticated
     if not uncached and not req.bypass_cache:
+        topic_index.record(topic)
         if auth_data:
             logger.info("query_cached_saving_history", user_id=auth_data["user"].id, topic=topic)
-            asyncio.create_task(save_to_history(auth_data["user"], topic, levels, req.mode))
+            _save_history_later(auth_data["user"], topic, levels, req.mode)
         else:
             logger.info("query_cached_no_auth", topic=topic)
-        return QueryResponse(topic=topic, explanations=explanations, cached=True)
+        return QueryResponse(topic=topic, explanations=explanations, cached=True), True
 
     logger.info("query_start_generation", topic=topic, levels=uncached, has_auth=bool(auth_data))
-    tasks = {lvl: ensemble_generate(topic, lvl, req.mode) for lvl in uncached}
+    tasks = {lvl: deadline.within("model", ensemble_generate(topic, lvl, mode=req.mode)) for lvl in uncached}
     results = await asyncio.gather(*tasks.values(), return_exceptions=True)
 
+    complete = True
     for lvl, result in zip(tasks.keys(), results):
         if isinstance(result, str):
             explanations[lvl] = result
-            key = topic_cache_key(topic, lvl)
-            await cache_set(key, {"text": result})
+            await set_explanation(topic, lvl, req.mode, {"text": result})
         else:
             error_msg = str(result) if result else "Unknown error"
             explanations[lvl] = f"Error generating {lvl}: {error_msg}"
             logger.error("query_generation_failed", level=lvl, error=error_msg)
+            complete = False
+
 
+    if complete:
+        topic_index.record(topic)
 
     if auth_data:
         logger.info("query_success_saving_history", user_id=auth_data["user"].id, topic=topic)
-        asyncio.create_task(save_to_history(auth_data["user"], topic, levels, req.mode))
+        _save_history_later(auth_data["user"], topic, levels, req.mode)
     else:
         logger.info("query_success_no_auth", topic=topic)
 
-    return QueryResponse(topic=topic, explanations=explanations, cached=False)
+    return QueryResponse(topic=topic, explanations=explanations, cached=False), complete
+
+
+@router.post("/query/batch")
+async def query_batch(
+    req: BatchQueryRequest,
+    request: Request,
+    # Shares the router's rate-limit dependency, so the token is verified once
+    auth_data: dict | None = Depends(verify_token_optional),
+) -> StreamingResponse:
+    """
+    Generate explanations for many topics in one request.
+
+    All (topic, level) pairs are looked up in one batched cache read; only
+    the misses are generated, at most ``batch_concurrency`` topics at a
+    time. Each item is written as one NDJSON line as soon as it finishes,
+    so lines arrive in completion order and carry the item's ``index``.
+    Batch calls are meant for content tooling and are not recorded in
+    the caller's history. Every explanation that has to be generated costs
+    one rate-limit token, so a batch can't be used to get around the limiter.
+    """
+    if auth_data is None:
+        raise HTTPException(401, "Missing authentication credentials")
+    settings = get_settings()
+    if len(req.items) > settings.batch_max_items:
+        raise HTTPException(400, f"At most {settings.batch_max_items} items per batch")
+    mode = _effective_mode(req.mode)
+
+    invalid: list[dict] = []
+    valid: list[tuple[int, str, list[str]]] = []
+    for index, item in enumerate(req.items):
+        try:
+            valid.append((index, sanitize_topic(item.topic), item.levels or ["eli5"]))
+        except ValueError as e:
+            invalid.append({"index": index, "topic": item.topic, "error": str(e)})
+
+    pairs = [(topic, lvl) for _, topic, levels in valid for lvl in levels]
+    cached = [None] * len(pairs) if req.bypass_cache else await get_explanations(pairs, mode)
+    hits = iter(cached)
+    lookups = [(index, topic, {lvl: next(hits) for lvl in levels}) for index, topic, levels in valid]
+    misses = sum(not (v and v.get("text")) for v in cached)
+    limit = rate_limiter.limit_for(auth_data["user"].id)
+    if misses > limit:
+        raise HTTPException(400, f"Batch needs {misses} generations; at most {limit} per minute")
+    if misses > 1:
+        # The request itself already paid for one
+        await rate_limiter.check(request, auth_data, cost=misses - 1)
+    logger.info(
+        "query_batch_start",
+        items=len(req.items),
+        cache_hits=sum(v is not None for v in cached),
+        user_id=auth_data["user"].id,
+    )
+
+    semaphore = asyncio.Semaphore(settings.batch_concurrency)
+
+    async def generate(index: int, topic: str, found: dict[str, dict | None]) -> dict:
+        explanations = {lvl: v["text"] for lvl, v in found.items() if v and v.get("text")}
+        missing = [lvl for lvl in found if lvl not in explanations]
+        if missing:
+            async with semaphore:
+                results = await asyncio.gather(
+                    *(ensemble_generate(topic, lvl, mode=mode) for lvl in missing), return_exceptions=True
+                )
+            for lvl, result in zip(missing, results):
+                if isinstance(result, str):
+                    explanations[lvl] = result
+                    await set_explanation(topic, lvl, mode, {"text": result})
+                else:
+                    explanations[lvl] = f"Error generating {lvl}: {result or 'Unknown error'}"
+                    logger.error("query_batch_generation_failed", topic=topic, level=lvl, error=str(result))
+        return {"index": index, "topic": topic, "explanations": explanations, "cached": not missing}
+
+    async def body():
+        for line in invalid:
+            yield orjson.dumps(line) + b"\n"
+        tasks = [asyncio.ensure_future(generate(*lookup)) for lookup in lookups]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield orjson.dumps(await next_done) + b"\n"
+        finally:
+            # Client went away: stop generating for it
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 
 @router.post("/query/stream")
 async def query_topic_stream(
     req: QueryRequest,
+    request: Request,
     auth_data: dict = Depends(verify_token_optional)
 ):
-    """Stream explanations for a topic."""
+    """
+    Stream explanations for a topic.
+
+    Generated chunks carry ``id: <stream_id>:<seq>`` so a client that drops
+    the connection can retry with ``Last-Event-ID`` and resume from the
+    server-side buffer instead of starting a new generation.
+    """
     if (req.mode == "ensemble" or req.mode == "technical_depth"):
         req.mode = "fast"
 
@@ -111,63 +302,139 @@ async def query_topic_stream(
 
     # For streaming, we usually handle one level at a time
     level = req.levels[0] if req.levels else "eli5"
+    cache_key = topic_cache_key(topic, level, req.mode)
+    resume = parse_event_id(request.headers.get("last-event-id"))
+
+    if auth_data:
+        viewer = f"user:{auth_data['user'].id}"
+    else:
+        viewer = f"ip:{request.client.host if request.client else 'unknown'}"
+
+    async def fill_cache(content: str):
+        # Runs when generation finishes, even if the client already left.
+        # Regenerated answers join the variant pool rather than replacing
+        # the primary cached explanation.
+        if req.regenerate:
+            await record_generated(topic, level, req.mode, viewer, content)
+        else:
+            await set_explanation(topic, level, req.mode, {"text": content})
+
+    settings = get_settings()
+    encoder = SSEEncoder()
 
     async def event_generator():
-        full_content = ""
         try:
             # Yield metadata first
-            yield f"data: {json.dumps({'topic': topic, 'level': level})}\n\n"
-            
+            yield encoder.frame({"topic": topic, "level": level})
+
+            stream_id, after = None, 0
+            if resume:
+                if await stream_exists(resume[0]):
+                    stream_id, after = resume
+                    logger.info("query_stream_resumed", topic=topic, level=level, after=after)
+                else:
+                    # Buffer expired: tell the client to discard what it has
+                    yield encoder.frame({"reset": True})
+
+            # Regenerate: serve a pooled variant this viewer hasn't seen yet
+            content = None
+            if stream_id is None and req.regenerate:
+                content = await take_variant(topic, level, req.mode, viewer, req.temperature)
+                if content:
+                    logger.info("query_stream_variant_hit", topic=topic, level=level)
+
+            # The primary answer and its in-flight generation are shared with
+            # normal requests; a regenerate must neither serve nor join them
+            shared = not req.bypass_cache and not req.regenerate
+
             # Check cache first for instant delivery
-            if not req.bypass_cache:
-                cache_key = topic_cache_key(topic, level)
-                cached = await cache_get(cache_key)
+            if stream_id is None and shared and content is None:
+                cached = await get_explanation(topic, level, req.mode)
                 if cached and cached.get("text"):
                     logger.info("query_stream_cache_hit", topic=topic, level=level)
                     content = cached["text"]
-                    # Yield in small chunks to simulate streaming for UI consistency if needed, 
-                    # or just one big chunk. Let's do a few chunks for smooth UI.
-                    chunk_size = 500
-                    for i in range(0, len(content), chunk_size):
-                        chunk = content[i:i+chunk_size]
-                        yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                        await asyncio.sleep(0.01) # Tiny sleep for UI smoothness
-                    
-                    yield "data: [DONE]\n\n"
-                    if auth_data:
-                        asyncio.create_task(save_to_history(auth_data["user"], topic, [level], req.mode))
-                    return
+
+            if content:
+                # Yield in small chunks to simulate streaming for UI consistency if needed, 
+                # or just one big chunk. Let's do a few chunks for smooth UI.
+                chunk_size = 500
+                for i in range(0, len(content), chunk_size):
+                    chunk = content[i:i+chunk_size]
+                    yield encoder.frame({"chunk": chunk})
+                    await asyncio.sleep(0.01) # Tiny sleep for UI smoothness
+
+                yield encoder.done()
+                topic_index.record(topic)
+                if auth_data:
+                    _save_history_later(auth_data["user"], topic, [level], req.mode)
+                return
+
+            if stream_id is None and shared:
+                # Join a generation already in flight for the same key
+                stream_id = await find_active(cache_key)
+                if stream_id:
+                    logger.info("query_stream_joined", topic=topic, level=level)
 
             # If not cached or bypass requested, stream from model
-            async for chunk in generate_stream_explanation(
-                topic, 
-                level, 
-                mode=req.mode, 
-                temperature=req.temperature,
-                regenerate=req.regenerate
-            ):
-                full_content += chunk
-                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-            
-            # Final event
-            yield "data: [DONE]\n\n"
-            
-            # Cache the result for future "revisits"
-            if full_content.strip():
-                cache_key = topic_cache_key(topic, level)
-                await cache_set(cache_key, {"text": full_content})
-            
+            if stream_id is None:
+                buf = await start_stream(
+                    generate_stream_explanation(
+                        topic, 
+                        level, 
+                        mode=req.mode, 
+                        temperature=req.temperature,
+                        regenerate=req.regenerate
+                    ),
+                    on_complete=fill_cache,
+                    cache_key=cache_key if shared else None,
+                )
+                stream_id = buf.stream_id
+
+            # aclosing() detaches this consumer as soon as the client goes away,
+            # letting the buffer cancel a generation nobody is reading. The
+            # coalescer is closed first so no read is left running on the replay.
+            window = settings.sse_coalesce_ms / 1000
+            async with aclosing(replay(stream_id, after, request.is_disconnected)) as events, \
+                    aclosing(coalesce_chunks(events, window, settings.sse_coalesce_bytes)) as frames:
+                async for seq, event in frames:
+                    event_id = f"{stream_id}:{seq}"
+                    if "chunk" in event:
+                        yield encoder.frame(event, event_id)
+                    elif "error" in event:
+                        yield encoder.frame(event, event_id)
+                        return
+                    else:
+                        # Final event
+                        yield encoder.done(event_id)
+                        break
+                else:
+                    # Client disconnected before the stream finished
+                    return
+
+            topic_index.record(topic)
             # Record in history if authenticated
             if auth_data:
-                asyncio.create_task(save_to_history(auth_data["user"], topic, [level], req.mode))
+                _save_history_later(auth_data["user"], topic, [level], req.mode)
                 
         except Exception as e:
             logger.error("streaming_failed", error=str(e), topic=topic)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield encoder.frame({"error": str(e)})
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
 
+history_tasks: set[asyncio.Task] = set()  # Drained on shutdown so no write is lost
+
+
+def _save_history_later(user, topic: str, levels: list[str], mode: str) -> None:
+    task = asyncio.get_running_loop().create_task(
+        save_to_history(user, topic, levels, mode), context=deadline.detached_context()
+    )
+    history_tasks.add(task)
+    task.add_done_callback(history_tasks.discard)
+
+
+@timed(supabase_latency, "save_to_history", in_flight=background_in_flight)
 async def save_to_history(user, topic: str, levels: list[str], mode: str):
     """Background task to save query to history. Deduplicates by topic per user."""
     logger.info("save_to_history_task_start", user_id=user.id, topic=topic)
@@ -179,7 +446,7 @@ async def save_to_history(user, topic: str, levels: list[str], mode: str):
             return
 
         # Check for existing entry for this user and topic
-        existing = await asyncio.to_thread(
+        existing = await run_db(
             supabase.table("history").select("id, levels").eq("user_id", user.id).eq("topic", topic).execute
         )
         
@@ -189,7 +456,7 @@ async def save_to_history(user, topic: str, levels: list[str], mode: str):
             existing_levels = set(existing.data[0]["levels"])
             new_levels = list(existing_levels.union(set(levels)))
             
-            await asyncio.to_thread(
+            await run_db(
                 supabase.table("history").update({
                     "levels": new_levels,
                     "mode": mode,
@@ -199,7 +466,7 @@ async def save_to_history(user, topic: str, levels: list[str], mode: str):
             logger.info("save_to_history_task_updated", user_id=user.id, topic=topic)
         else:
             # Insert new entry
-            response = await asyncio.to_thread(
+            response = await run_db(
                 supabase.table("history").insert({
                     "user_id": user.id,
                     "topic": topic,
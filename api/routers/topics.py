@@ -0,0 +1,20 @@
+"""Topic suggestion endpoint."""
+
+from fastapi import APIRouter, Query
+
+from responses import ORJSONResponse, cache_control
+from services.suggest import TOP_K, topic_index
+
+router = APIRouter(tags=["topics"])
+
+
+@router.get("/topics/suggest")
+async def suggest_topics(
+    q: str = Query("", max_length=200),
+    limit: int = Query(8, ge=1, le=TOP_K),
+) -> ORJSONResponse:
+    """Popular and already-cached topics starting with ``q``."""
+    return ORJSONResponse(
+        {"query": q, "suggestions": topic_index.suggest(q, limit)},
+        headers={"Cache-Control": cache_control(60)},
+    )
@@ -0,0 +1,180 @@
+"""Production server.
+
+A small pre-fork supervisor around uvicorn. The parent imports the app
+once (so workers share its pages copy-on-write and start instantly),
+binds the listening socket, and forks ``web_concurrency`` workers that
+serve it with uvloop and httptools. Anything process-bound (Redis pool,
+SQLite handles, thread pools, the model provider) is created lazily in
+each worker's lifespan; modules holding such state reset it in forked
+children via ``os.register_at_fork``.
+
+On SIGTERM or SIGINT the supervisor forwards the signal. Each worker stops
+accepting, lets in-flight responses (SSE streams included) finish, drains
+background history writes and cache fills in the lifespan, then exits.
+Workers still running after ``shutdown_grace_period`` are killed. A
+second signal kills at once. Crashed workers are replaced. Run from the
+``api`` directory:
+
+    python -m server [--workers N] [--host 0.0.0.0] [--port 8000]
+"""
+
+import argparse
+import importlib.util
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from config import get_settings
+from logging_config import logger
+
+STARTUP_FAILURE = 3  # Worker exit code when the app failed to start
+KILL_MARGIN = 5.0  # Extra seconds past the grace period before SIGKILL
+REAP_INTERVAL = 0.2
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_config(app, grace: float) -> uvicorn.Config:
+    has = lambda name: importlib.util.find_spec(name) is not None  # noqa: E731
+    return uvicorn.Config(
+        app,
+        loop="uvloop" if has("uvloop") else "asyncio",
+        http="httptools" if has("httptools") else "h11",
+        lifespan="on",
+        timeout_graceful_shutdown=grace,
+        access_log=False,  # RequestContextMiddleware logs every request
+        server_header=False,
+        log_level="warning",
+    )
+
+
+def _run_worker(config: uvicorn.Config, sock: socket.socket) -> int:
+    # uvicorn installs its own SIGTERM/SIGINT handlers for a graceful stop
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(sig, signal.SIG_DFL)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    return 0 if server.started else STARTUP_FAILURE
+
+
+class Supervisor:
+    """Forks workers, replaces crashed ones, and stops them on a signal."""
+
+    def __init__(self, config: uvicorn.Config, sock: socket.socket, workers: int, grace: float):
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.grace = grace
+        self.pids: set[int] = set()
+        self.stopping = False
+        self.failed = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = _run_worker(self.config, self.sock)
+            finally:
+                os._exit(code)
+        self.pids.add(pid)
+        logger.info("server_worker_started", pid=pid)
+
+    def _on_signal(self, signum, frame) -> None:
+        if self.stopping:
+            # Second signal: don't wait for the drain
+            self._kill(signal.SIGKILL)
+            return
+        self.stopping = True
+        logger.info("server_stopping", signal=signal.Signals(signum).name, workers=len(self.pids))
+        self._kill(signal.SIGTERM)
+
+    def _kill(self, sig: int) -> None:
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                self.pids.discard(pid)
+
+    def _reap(self) -> list[tuple[int, int]]:
+        exited = []
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.pids.clear()
+                break
+            if pid == 0:
+                break
+            self.pids.discard(pid)
+            exited.append((pid, os.waitstatus_to_exitcode(status)))
+        return exited
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+        for _ in range(self.workers):
+            self.spawn()
+
+        while not self.stopping:
+            time.sleep(REAP_INTERVAL)
+            for pid, code in self._reap():
+                if self.stopping:
+                    break
+                if code == STARTUP_FAILURE:
+                    # Respawning would fail the same way
+                    logger.error("server_worker_startup_failed", pid=pid)
+                    self.failed = self.stopping = True
+                    self._kill(signal.SIGTERM)
+                    break
+                logger.warning("server_worker_died", pid=pid, exit_code=code)
+                self.spawn()
+
+        kill_at = time.monotonic() + self.grace + KILL_MARGIN
+        while self.pids and time.monotonic() < kill_at:
+            self._reap()
+            time.sleep(REAP_INTERVAL)
+        if self.pids:
+            logger.warning("server_workers_killed", pids=sorted(self.pids))
+            self._kill(signal.SIGKILL)
+            while self.pids:
+                self._reap()
+                time.sleep(REAP_INTERVAL)
+        logger.info("server_stopped")
+        return 1 if self.failed else 0
+
+
+def main_cli() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--workers", type=int, default=settings.web_concurrency or os.cpu_count() or 1)
+    parser.add_argument("--grace", type=float, default=settings.shutdown_grace_period, help="Drain timeout (s)")
+    args = parser.parse_args()
+
+    # Preload: import the app (and everything it imports) once, before forking
+    started = time.perf_counter()
+    from main import app
+    logger.info("server_app_loaded", seconds=round(time.perf_counter() - started, 3))
+
+    sock = bind_socket(args.host, args.port)
+    logger.info("server_listening", host=args.host, port=args.port, workers=args.workers)
+    supervisor = Supervisor(worker_config(app, args.grace), sock, args.workers, args.grace)
+    sys.exit(supervisor.run())
+
+
+if __name__ == "__main__":
+    main_cli()
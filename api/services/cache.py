@@ -1,22 +1,167 @@
 """Redis caching service."""
 
+import asyncio
+import hashlib
+import os
+import time
 import orjson
-from typing import Any
-try:
-    import redis.asyncio as redis
-except ImportError:
-    # Fallback for environments without redis
-    redis = None
+from collections import deque
+from typing import Any, Awaitable, Callable
 
+import deadline
 from config import get_settings
 from logging_config import logger
+from metrics import cache_latency, cache_requests, redis_breaker_state, timed
+from services.disk_cache import content_key, disk_get, disk_get_many, disk_set
+from prompts import PROMPTS
+from services.hotkeys import get_tracker
+from utils import topic_cache_key
 
 _client = None
+_breaker: "CircuitBreaker | None" = None
+
+
+def _reset_after_fork() -> None:
+    # A connection pool can't be shared across processes; each worker opens its own
+    global _client, _breaker
+    _client = None
+    _breaker = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class CircuitOpen(Exception):
+    """Redis is being bypassed because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker for Redis calls.
+
+    Closed: calls go through and outcomes are tracked over a rolling window.
+    Once at least ``min_calls`` outcomes are recorded and the failure share
+    reaches ``failure_rate``, the breaker opens and every call is bypassed
+    immediately for ``cooldown`` seconds. It then goes half-open and lets a
+    single probe through: success closes it, failure re-opens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failure_rate: float, min_calls: int, window: float, cooldown: float):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to Redis right now."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+            logger.info("redis_breaker_half_open")
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def record(self, ok: bool) -> None:
+        """Record the outcome of an allowed call."""
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+            if ok:
+                self._reset(self.CLOSED)
+                logger.info("redis_breaker_closed")
+            else:
+                self._trip(now)
+            return
+
+        outcomes = self._outcomes
+        outcomes.append((now, ok))
+        if not ok:
+            self._failures += 1
+        while outcomes and now - outcomes[0][0] > self.window:
+            if not outcomes.popleft()[1]:
+                self._failures -= 1
+        if len(outcomes) >= self.min_calls and self._failures / len(outcomes) >= self.failure_rate:
+            self._trip(now)
+
+    def _trip(self, now: float) -> None:
+        self._reset(self.OPEN)
+        self._opened_at = now
+        logger.warning("redis_breaker_open", cooldown=self.cooldown)
+
+    def _reset(self, state: str) -> None:
+        self.state = state
+        self._outcomes.clear()
+        self._failures = 0
+        self._probing = False
+
+    async def call(
+        self, fn: Callable[[], Awaitable[Any]], timeout: float, stage: str | None = None
+    ) -> Any:
+        """
+        Run ``fn`` under the breaker with a hard per-call timeout.
+
+        With ``stage`` set, the timeout is also capped by the request
+        deadline; running out of request budget is not held against Redis.
+        """
+        if not self.allow():
+            raise CircuitOpen()
+        try:
+            if stage:
+                result = await deadline.within(stage, fn(), timeout)
+            else:
+                result = await asyncio.wait_for(fn(), timeout)
+        except (asyncio.CancelledError, deadline.DeadlineExceeded):
+            # The caller went away or ran out of time; that says nothing about Redis
+            self._probing = False
+            raise
+        except Exception:
+            self.record(False)
+            raise
+        self.record(True)
+        return result
+
+
+def get_breaker() -> CircuitBreaker:
+    """The process-wide Redis breaker, built from settings on first use."""
+    global _breaker
+    if _breaker is None:
+        settings = get_settings()
+        _breaker = CircuitBreaker(
+            failure_rate=settings.redis_breaker_failure_rate,
+            min_calls=settings.redis_breaker_min_calls,
+            window=settings.redis_breaker_window,
+            cooldown=settings.redis_breaker_cooldown,
+        )
+    return _breaker
+
+
+redis_breaker_state.set_function(
+    lambda: {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}[get_breaker().state]
+)
+
 
 async def get_redis():
     """Get or create Redis client."""
     global _client
     if _client is None:
+        try:
+            # Imported on first use to keep it off the cold-start path
+            import redis.asyncio as redis
+        except ImportError:
+            # Fallback for environments without redis
+            return None
         settings = get_settings()
         # Generic Redis connection logic
         # In production, replace with your Redis URL
@@ -26,33 +171,232 @@ async def get_redis():
             _client = redis.from_url(
                 url, 
                 decode_responses=False,
-                socket_timeout=2.0,
-                socket_connect_timeout=2.0
+                socket_timeout=settings.redis_socket_timeout,
+                socket_connect_timeout=settings.redis_connect_timeout,
+                max_connections=settings.redis_max_connections,
+                health_check_interval=settings.redis_health_check_interval,
+                retry_on_timeout=False,
             )
     return _client
 
+_redis_hit = cache_requests.labels("redis", "hit")
+_redis_miss = cache_requests.labels("redis", "miss")
+_redis_error = cache_requests.labels("redis", "error")
+_redis_bypass = cache_requests.labels("redis", "bypass")
+_redis_deadline = cache_requests.labels("redis", "deadline")
+_local_hit = cache_requests.labels("local", "hit")
+
+@timed(cache_latency, "get")
 async def cache_get(key: str) -> dict[str, Any] | None:
-    """Get cached value."""
+    """
+    Get cached value. Returns None at once while the breaker is open.
+
+    Hot keys are served from a short-lived local pin instead of Redis.
+    """
+    tracker = get_tracker()
+    pinned = tracker.record(key)
+    if pinned is not None:
+        _local_hit.inc()
+        return orjson.loads(pinned)
+    read_at = tracker.version
     try:
         r = await get_redis()
         if not r: return None
-        val = await r.get(key)
-        return orjson.loads(val) if val else None
+        val = await get_breaker().call(lambda: r.get(key), get_settings().redis_op_timeout, "cache_get")
+        if not val:
+            _redis_miss.inc()
+            return None
+        _redis_hit.inc()
+        if tracker.pin(key, val, read_at):
+            _prefetch_siblings(key)
+        return orjson.loads(val)
+    except CircuitOpen:
+        _redis_bypass.inc()
+        return None
+    except deadline.DeadlineExceeded:
+        _redis_deadline.inc()
+        return None
     except Exception as e:
-        logger.warning("cache_get_failed", key=key, error=str(e))
+        _redis_error.inc()
+        logger.warning("cache_get_failed", key=key, error=str(e) or type(e).__name__)
         return None
 
+@timed(cache_latency, "get_many")
+async def cache_get_many(keys: list[str]) -> list[dict[str, Any] | None]:
+    """Get several cached values with one MGET; misses and failures are None."""
+    if not keys:
+        return []
+    tracker = get_tracker()
+    results: list[dict[str, Any] | None] = [None] * len(keys)
+    remote: list[int] = []
+    for i, key in enumerate(keys):
+        pinned = tracker.record(key)
+        if pinned is None:
+            remote.append(i)
+        else:
+            results[i] = orjson.loads(pinned)
+    _local_hit.inc(len(keys) - len(remote))
+    if not remote:
+        return results
+    misses = len(remote)
+    read_at = tracker.version
+    try:
+        r = await get_redis()
+        if not r: return results
+        fetch = [keys[i] for i in remote]
+        vals = await get_breaker().call(
+            lambda: r.mget(fetch), get_settings().redis_op_timeout, "cache_get_many"
+        )
+    except CircuitOpen:
+        _redis_bypass.inc(misses)
+        return results
+    except deadline.DeadlineExceeded:
+        _redis_deadline.inc(misses)
+        return results
+    except Exception as e:
+        _redis_error.inc(misses)
+        logger.warning("cache_get_many_failed", keys=misses, error=str(e) or type(e).__name__)
+        return results
+    hits = 0
+    for i, val in zip(remote, vals):
+        if val:
+            hits += 1
+            tracker.pin(keys[i], val, read_at)
+            results[i] = orjson.loads(val)
+    _redis_hit.inc(hits)
+    _redis_miss.inc(misses - hits)
+    return results
+
+@timed(cache_latency, "set")
 async def cache_set(key: str, value: dict[str, Any], ttl: int | None = None) -> bool:
-    """Set cached value with TTL."""
+    """Set cached value with TTL. Skipped while the breaker is open."""
+    tracker = get_tracker()
+    tracker.unpin(key)  # Stop serving the old value now
     try:
         r = await get_redis()
         if not r: return False
         settings = get_settings()
-        await r.setex(key, ttl or settings.cache_ttl, orjson.dumps(value))
+        payload = orjson.dumps(value)
+        await get_breaker().call(
+            lambda: r.setex(key, ttl or settings.cache_ttl, payload), settings.redis_op_timeout
+        )
         return True
+    except CircuitOpen:
+        return False
     except Exception as e:
-        logger.error("cache_set_failed", key=key, error=str(e))
+        logger.error("cache_set_failed", key=key, error=str(e) or type(e).__name__)
         return False
+    finally:
+        # Reads that started before the write landed may hold the old value
+        tracker.unpin(key)
+
+_refills: set[asyncio.Task] = set()
+
+
+async def get_explanation(topic: str, level: str, mode: str) -> dict[str, Any] | None:
+    """
+    Look up an explanation in Redis, then in the durable disk store.
+
+    A disk hit is copied back into Redis in the background so the next
+    read is served from memory.
+    """
+    key = topic_cache_key(topic, level, mode)
+    cached = await cache_get(key)
+    if cached:
+        return cached
+    cached = await disk_get(content_key(topic, level, mode))
+    if cached:
+        _refill(topic, level, mode, cached)
+    return cached
+
+
+async def get_explanations(
+    pairs: list[tuple[str, str]], mode: str
+) -> list[dict[str, Any] | None]:
+    """Batched ``get_explanation`` for (topic, level) pairs: one MGET, then one disk query."""
+    keys = [topic_cache_key(topic, level, mode) for topic, level in pairs]
+    results = await cache_get_many(keys)
+    misses: dict[str, list[int]] = {}
+    for i, value in enumerate(results):
+        if not value:
+            misses.setdefault(content_key(*pairs[i], mode), []).append(i)
+    if misses:
+        for digest, value in (await disk_get_many(list(misses))).items():
+            for i in misses[digest]:
+                results[i] = value
+            _refill(*pairs[misses[digest][0]], mode, value)
+    return results
+
+
+def _refill(topic: str, level: str, mode: str, value: dict[str, Any]) -> None:
+    """Copy a disk hit back into Redis in the background."""
+    task = asyncio.get_running_loop().create_task(
+        _cache_set_explanation(topic, level, mode, value), context=deadline.detached_context()
+    )
+    _refills.add(task)
+    task.add_done_callback(_refills.discard)
+
+
+def _prefetch_siblings(key: str) -> None:
+    """
+    A topic that just turned hot is about to be read at its other levels
+    too (viewers switch levels): pin those now with one MGET.
+    """
+    prefix, sep, level = key.rpartition(":")
+    if not key.startswith("explanation:") or not sep:
+        return
+    siblings = [f"{prefix}:{other}" for other in PROMPTS if other != level]
+    task = asyncio.get_running_loop().create_task(_pin_many(siblings), context=deadline.detached_context())
+    _refills.add(task)
+    task.add_done_callback(_refills.discard)
+
+
+async def _pin_many(keys: list[str]) -> None:
+    tracker = get_tracker()
+    read_at = tracker.version
+    try:
+        r = await get_redis()
+        if not r: return
+        vals = await get_breaker().call(
+            lambda: r.mget(keys), get_settings().redis_op_timeout, "cache_prefetch"
+        )
+    except Exception as e:
+        logger.debug("cache_prefetch_failed", keys=len(keys), error=str(e) or type(e).__name__)
+        return
+    for key, val in zip(keys, vals):
+        if val:
+            tracker.pin(key, val, read_at, force=True)
+
+
+def explanation_etag(text: str) -> str:
+    """Content hash of one explanation, stored alongside it for cheap revalidation."""
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _etag_key(topic: str, level: str, mode: str) -> str:
+    return f"etag:{topic_cache_key(topic, level, mode)}"
+
+
+async def _cache_set_explanation(topic: str, level: str, mode: str, value: dict[str, Any]) -> None:
+    coros = [cache_set(topic_cache_key(topic, level, mode), value)]
+    if value.get("text"):
+        coros.append(cache_set(_etag_key(topic, level, mode), {"etag": explanation_etag(value["text"])}))
+    await asyncio.gather(*coros)
+
+
+async def get_explanation_etags(topic: str, levels: list[str], mode: str) -> list[str | None]:
+    """Stored content hashes for each level, read without fetching the bodies."""
+    metas = await cache_get_many([_etag_key(topic, level, mode) for level in levels])
+    return [meta.get("etag") if meta else None for meta in metas]
+
+
+async def set_explanation(topic: str, level: str, mode: str, value: dict[str, Any]) -> None:
+    """Store an explanation (and its ETag metadata) in Redis and the durable disk store."""
+    await asyncio.gather(
+        _cache_set_explanation(topic, level, mode, value),
+        disk_set(content_key(topic, level, mode), value),
+    )
+
 
 async def close_redis() -> None:
     """Close Redis connection."""
@@ -0,0 +1,265 @@
+"""Durable on-disk explanation store.
+
+An SQLite file sits underneath Redis so explanations survive Redis expiry
+and eviction. Entries are content-addressed by a digest of (normalized
+topic, level, mode, prompt version), so a prompt change naturally misses
+instead of serving stale answers. Reads go through SQLite's memory-mapped
+I/O; all calls run in a worker thread to keep the event loop free.
+
+When the stored payload grows past ``disk_cache_max_bytes`` the least
+recently read entries are deleted down to a low-water mark. The running
+total lives in a meta row updated in the same transaction as each write,
+so every worker sharing the file sees the same size. The same
+class, with raw blob values, backs the image proxy's store.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import orjson
+
+from config import get_settings
+from logging_config import logger
+from metrics import cache_latency, cache_requests, timed
+from prompts import PROMPT_VERSION
+from utils import normalize_topic
+
+COMPACT_TO = 0.9  # Compact down to this share of the size limit
+TOUCH_INTERVAL = 3600.0  # Refresh an entry's access time at most this often
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed);
+CREATE TABLE IF NOT EXISTS {table}_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO {table}_meta (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM {table};
+"""
+
+_disk_hit = cache_requests.labels("disk", "hit")
+_disk_miss = cache_requests.labels("disk", "miss")
+_disk_error = cache_requests.labels("disk", "error")
+
+
+def content_key(topic: str, level: str, mode: str) -> str:
+    """Content address of an explanation."""
+    raw = "\0".join((normalize_topic(topic), level, mode, PROMPT_VERSION))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DiskCache:
+    """SQLite-backed key/value store with size-based compaction."""
+
+    def __init__(
+        self, path: str, max_bytes: int, mmap_bytes: int = 256 * 1024 * 1024, table: str = "explanations"
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.table = table
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA mmap_size={int(mmap_bytes)}")
+        self._db.executescript(_SCHEMA.format(table=table))
+
+    @property
+    def size(self) -> int:
+        """Stored payload bytes, across every process using the file."""
+        with self._lock:
+            return self._total()
+
+    def _total(self) -> int:
+        return self._db.execute(f"SELECT total FROM {self.table}_meta WHERE id = 0").fetchone()[0]
+
+    def get_blob(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value, accessed FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > TOUCH_INTERVAL:
+                self._db.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        payload = self.get_blob(key)
+        return None if payload is None else orjson.loads(payload)
+
+    def get_many(self, keys: list[str]) -> dict[str, dict[str, Any]]:
+        """Entries found among ``keys``, in one query."""
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return {key: orjson.loads(value) for key, value in rows}
+
+    def set_blob(self, key: str, payload: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so the size delta and
+            # the total it is added to can't interleave with another worker
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._db.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now),
+                )
+                self._db.execute(
+                    f"UPDATE {self.table}_meta SET total = total + ? WHERE id = 0",
+                    (len(payload) - (old[0] if old else 0),),
+                )
+                total = self._total()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            if total > self.max_bytes:
+                self._compact()
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        self.set_blob(key, orjson.dumps(value))
+
+    def _compact(self) -> None:
+        """Delete least recently read entries until under the low-water mark."""
+        target = int(self.max_bytes * COMPACT_TO)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-read under the write lock: another worker may have compacted already
+            total = self._total()
+            freed = 0
+            doomed = []
+            if total > self.max_bytes:
+                for key, size in self._db.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed"):
+                    if total - freed <= target:
+                        break
+                    doomed.append((key,))
+                    freed += size
+                self._db.executemany(f"DELETE FROM {self.table} WHERE key = ?", doomed)
+                self._db.execute(f"UPDATE {self.table}_meta SET total = total - ? WHERE id = 0", (freed,))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if not doomed:
+            return
+        # Hand freed pages back to the filesystem a little at a time
+        self._db.execute("PRAGMA incremental_vacuum")
+        logger.info("disk_cache_compacted", table=self.table, entries=len(doomed), bytes_freed=freed, size=total - freed)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_store: DiskCache | None = None
+_store_failed = False
+
+
+def _reset_after_fork() -> None:
+    # SQLite connections must not cross fork(); each worker reopens the file
+    global _store, _store_failed
+    _store = None
+    _store_failed = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_store() -> DiskCache | None:
+    """The process-wide store, opened on first use; None when disabled or unusable."""
+    global _store, _store_failed
+    if _store is None and not _store_failed:
+        settings = get_settings()
+        if not settings.disk_cache_path:
+            _store_failed = True
+            return None
+        try:
+            _store = DiskCache(settings.disk_cache_path, settings.disk_cache_max_bytes)
+        except Exception as e:
+            # e.g. a read-only filesystem; carry on with Redis alone
+            _store_failed = True
+            logger.warning("disk_cache_unavailable", path=settings.disk_cache_path, error=str(e))
+    return _store
+
+
+@timed(cache_latency, "disk_get")
+async def disk_get(key: str) -> dict[str, Any] | None:
+    """Read an entry from the durable store."""
+    store = get_store()
+    if store is None:
+        return None
+    try:
+        value = await asyncio.to_thread(store.get, key)
+    except Exception as e:
+        _disk_error.inc()
+        logger.warning("disk_cache_get_failed", key=key, error=str(e))
+        return None
+    if value is None:
+        _disk_miss.inc()
+        return None
+    _disk_hit.inc()
+    return value
+
+
+@timed(cache_latency, "disk_get_many")
+async def disk_get_many(keys: list[str]) -> dict[str, dict[str, Any]]:
+    """Read several entries from the durable store in one query."""
+    store = get_store()
+    if store is None or not keys:
+        return {}
+    try:
+        found = await asyncio.to_thread(store.get_many, keys)
+    except Exception as e:
+        _disk_error.inc(len(keys))
+        logger.warning("disk_cache_get_many_failed", keys=len(keys), error=str(e))
+        return {}
+    _disk_hit.inc(len(found))
+    _disk_miss.inc(len(keys) - len(found))
+    return found
+
+
+@timed(cache_latency, "disk_set")
+async def disk_set(key: str, value: dict[str, Any]) -> bool:
+    """Write an entry to the durable store."""
+    store = get_store()
+    if store is None:
+        return False
+    try:
+        await asyncio.to_thread(store.set, key, value)
+        return True
+    except Exception as e:
+        _disk_error.inc()
+        logger.error("disk_cache_set_failed", key=key, error=str(e))
+        return False
+
+
+def close_store() -> None:
+    """Close the store if it was opened."""
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
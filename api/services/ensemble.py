@@ -1,7 +1,9 @@
 """Ensemble generation service."""
 
 from typing import Dict, Any, List
+from metrics import generation_latency, timed
 
+@timed(generation_latency, "ensemble")
 async def ensemble_generate(topic: str, level: str, premium: bool = False, mode: str = "ensemble") -> str:
     """
     Generate an explanation using an ensemble of models.
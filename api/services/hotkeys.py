@@ -0,0 +1,158 @@
+"""Hot-key detection.
+
+When one topic goes viral every worker reads the same Redis key, and the
+shard holding it becomes the bottleneck. ``cache_get`` feeds every key
+into a count-min sketch (fixed memory, over-estimates only) that keeps a
+top-k heap of the heaviest keys. Counts halve every ``hot_key_window``,
+so the ranking follows what is trending rather than all-time totals.
+
+A key with an estimated ``hot_key_threshold`` reads per window is hot. Its
+payload is pinned in process memory for ``hot_key_ttl`` seconds, so
+repeat reads skip Redis. The TTL is short, and writes through this worker
+unpin at once, so a pinned value can only be that stale.
+
+Only explanation bodies and their ETag metadata are tracked. They are
+written once per generation, not read-modify-written like the variant
+pools, and their keys name a topic, never a viewer. A read that overlaps
+a write through this worker does not pin what it read: every write bumps
+``version``, and ``pin`` refuses a payload fetched before the key's last
+write.
+"""
+
+import array
+import time
+
+from config import get_settings
+
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+TRACKED_PREFIXES = ("explanation:", "etag:explanation:")
+
+
+def tracked(key: str) -> bool:
+    return key.startswith(TRACKED_PREFIXES)
+
+
+class CountMinSketch:
+    """Approximate counts in ``depth`` rows of ``width`` counters."""
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.width = width
+        self.rows = [array.array("L", [0]) * width for _ in range(depth)]
+
+    def _cells(self, key: str):
+        # Double hashing: row i probes h1 + i * h2
+        h1 = hash(key)
+        h2 = hash((key, 1)) | 1
+        width = self.width
+        for i, row in enumerate(self.rows):
+            yield row, (h1 + i * h2) % width
+
+    def add(self, key: str, amount: int = 1) -> int:
+        """Count ``key`` and return its new estimate."""
+        estimate = None
+        for row, i in self._cells(key):
+            row[i] += amount
+            estimate = row[i] if estimate is None else min(estimate, row[i])
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in self._cells(key))
+
+    def halve(self) -> None:
+        for row in self.rows:
+            for i, value in enumerate(row):
+                if value:
+                    row[i] = value >> 1
+
+
+class HotKeyTracker:
+    """Sketch plus top-k of the heaviest keys, and the local pins for hot ones."""
+
+    def __init__(self):
+        settings = get_settings()
+        self.threshold = settings.hot_key_threshold
+        self.window = settings.hot_key_window
+        self.ttl = settings.hot_key_ttl
+        self.k = settings.hot_key_top_k
+        self.sketch = CountMinSketch()
+        self.top: dict[str, int] = {}  # Key -> estimate, at most k entries
+        self.pins: dict[str, tuple[float, bytes]] = {}  # Key -> (expires, payload)
+        self.version = 0  # Bumped by every local write
+        self.written: dict[str, int] = {}  # Key -> version of its last write, for the current window
+        self._window_version = 0
+        self._decay_at = time.monotonic() + self.window
+
+    def record(self, key: str) -> bytes | None:
+        """Count one read of ``key``; returns its pinned payload if it has a live pin."""
+        if not tracked(key):
+            return None
+        now = time.monotonic()
+        if now >= self._decay_at:
+            self._decay(now)
+        estimate = self.sketch.add(key)
+        top = self.top
+        if key in top or len(top) < self.k:
+            top[key] = estimate
+        else:
+            coldest = min(top, key=top.__getitem__)
+            if estimate > top[coldest]:
+                del top[coldest]
+                top[key] = estimate
+
+        pin = self.pins.get(key)
+        if pin is not None:
+            if pin[0] > now:
+                return pin[1]
+            del self.pins[key]
+        return None
+
+    def is_hot(self, key: str) -> bool:
+        return self.top.get(key, 0) >= self.threshold
+
+    def pin(self, key: str, payload: bytes, read_at: int, force: bool = False) -> bool:
+        """
+        Keep ``payload`` locally if ``key`` is hot (or ``force``); True when newly pinned.
+
+        ``read_at`` is ``version`` from before the read that returned
+        ``payload``; a write to ``key`` since then makes it too old to pin.
+        """
+        if not tracked(key) or self.written.get(key, 0) > read_at:
+            return False
+        if not (force or self.is_hot(key)):
+            return False
+        fresh = key not in self.pins
+        self.pins[key] = (time.monotonic() + self.ttl, payload)
+        return fresh
+
+    def unpin(self, key: str) -> None:
+        """Drop ``key``'s pin and fence off reads that started before this write."""
+        if not tracked(key):
+            return
+        self.pins.pop(key, None)
+        self.version += 1
+        self.written[key] = self.version
+
+    def _decay(self, now: float) -> None:
+        self.sketch.halve()
+        self.top = {key: count >> 1 for key, count in self.top.items() if count > 1}
+        self.pins = {key: pin for key, pin in self.pins.items() if pin[0] > now}
+        # Reads last well under a window; keep one window of writes to fence them
+        self.written = {key: v for key, v in self.written.items() if v > self._window_version}
+        self._window_version = self.version
+        self._decay_at = now + self.window
+
+    def trending(self, limit: int | None = None) -> list[tuple[str, int]]:
+        """Heaviest keys first, with their estimated reads this window."""
+        ranked = sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+
+_tracker: HotKeyTracker | None = None
+
+
+def get_tracker() -> HotKeyTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = HotKeyTracker()
+    return _tracker
@@ -0,0 +1,331 @@
+"""Image proxy.
+
+Search results never expose third-party image URLs to the browser. Each
+URL is registered in Redis under a content-free id (a digest of the URL)
+and served from ``/api/images/{id}`` as a resized WebP thumbnail, so
+latency and payload size are ours to control and the proxy can only ever
+fetch URLs our own search produced. If Redis can't take the registration
+the mapping goes to the image store instead, and if that fails too the
+result falls back to the original URL rather than a proxy link that would
+404. Redirects are followed by hand, a
+few hops at most, and every hop must be http(s) to a public address.
+
+Originals are downloaded once through a pooled client and kept, with the
+thumbnails made from them, in a size-bounded SQLite store (the same
+``DiskCache`` that backs explanations). Resizing runs in a small thread
+pool; concurrent requests for the same thumbnail share one fetch/resize.
+"""
+
+import asyncio
+import hashlib
+import io
+import ipaddress
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import deadline
+from config import get_settings
+from logging_config import logger
+from metrics import cache_requests
+from services.cache import cache_get, cache_set
+from services.disk_cache import DiskCache
+
+# httpx and PIL are imported on first use so they stay off the cold-start path
+if TYPE_CHECKING:
+    import httpx
+
+IMAGE_WIDTHS = (160, 320, 640, 1024, 1600)  # Thumbnail sizes; requests snap up to one of these
+MAX_PIXELS = 40_000_000  # Refuse to decode anything larger (decompression bombs)
+THUMBNAIL_QUALITY = 80
+MAX_REDIRECTS = 3
+
+_image_hit = cache_requests.labels("image", "hit")
+_image_miss = cache_requests.labels("image", "miss")
+_image_error = cache_requests.labels("image", "error")
+
+
+class ImageUnavailable(Exception):
+    """The image is unknown, could not be fetched, or is not a usable image."""
+
+
+def image_id(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:32]
+
+
+def snap_width(width: int) -> int:
+    """Smallest standard width at least ``width`` (the largest when beyond them all)."""
+    return next((w for w in IMAGE_WIDTHS if w >= width), IMAGE_WIDTHS[-1])
+
+
+def _source_key(image_id: str) -> str:
+    return f"image:src:{image_id}"
+
+
+async def register_image(url: str, title: str = "") -> dict[str, str]:
+    """Allow ``url`` through the proxy and return its public metadata."""
+    iid = image_id(url)
+    settings = get_settings()
+    registered = await cache_set(_source_key(iid), {"url": url}, ttl=settings.image_meta_ttl * 7)
+    if not registered and not await _store_set(_source_key(iid), url.encode()):
+        logger.warning("image_register_failed", image_id=iid)
+        return {"id": iid, "url": url, "title": title}
+    return {"id": iid, "url": f"/api/images/{iid}", "title": title}
+
+
+# --- Shared resources -------------------------------------------------------
+
+_client: "httpx.AsyncClient | None" = None
+_store: DiskCache | None = None
+_store_failed = False
+_pool: ThreadPoolExecutor | None = None
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def _reset_after_fork() -> None:
+    global _client, _store, _store_failed, _pool
+    _client, _store, _store_failed, _pool = None, None, False, None
+    _inflight.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client() -> "httpx.AsyncClient":
+    """Pooled upstream client, created on first use."""
+    global _client
+    if _client is None:
+        import httpx
+
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.image_fetch_max_connections,
+            max_keepalive_connections=settings.image_fetch_max_connections,
+        )
+        _client = httpx.AsyncClient(
+            limits=limits,
+            timeout=settings.image_fetch_timeout,
+            follow_redirects=False,  # _download follows them, checking each hop
+            headers={"User-Agent": "KnowBear image proxy"},
+        )
+    return _client
+
+
+def get_store() -> DiskCache | None:
+    """The image store, opened on first use; None when disabled or unusable."""
+    global _store, _store_failed
+    if _store is None and not _store_failed:
+        settings = get_settings()
+        if not settings.image_cache_path:
+            _store_failed = True
+            return None
+        try:
+            _store = DiskCache(settings.image_cache_path, settings.image_cache_max_bytes, table="images")
+        except Exception as e:
+            _store_failed = True
+            logger.warning("image_cache_unavailable", path=settings.image_cache_path, error=str(e))
+    return _store
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(get_settings().image_workers, thread_name_prefix="thumbnail")
+    return _pool
+
+
+async def close_images() -> None:
+    """Release the upstream client, resize pool and store."""
+    global _client, _store, _pool
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    if _store is not None:
+        _store.close()
+        _store = None
+
+
+async def _store_get(key: str) -> bytes | None:
+    store = get_store()
+    if store is None:
+        return None
+    try:
+        return await asyncio.to_thread(store.get_blob, key)
+    except Exception as e:
+        _image_error.inc()
+        logger.warning("image_cache_get_failed", key=key, error=str(e))
+        return None
+
+
+async def _store_set(key: str, data: bytes) -> bool:
+    store = get_store()
+    if store is None:
+        return False
+    try:
+        await asyncio.to_thread(store.set_blob, key, data)
+    except Exception as e:
+        _image_error.inc()
+        logger.warning("image_cache_set_failed", key=key, error=str(e))
+        return False
+    return True
+
+
+# --- Fetch and resize -------------------------------------------------------
+
+def _is_public(address: str) -> bool:
+    return ipaddress.ip_address(address.split("%", 1)[0]).is_global
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+async def _resolve(host: str) -> list[str]:
+    infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+async def _check_url(url: "httpx.URL") -> None:
+    """Refuse anything but http(s) to hosts that resolve only to public addresses."""
+    if url.scheme not in ("http", "https") or not url.host:
+        raise ImageUnavailable(f"refusing {url.scheme or 'relative'} URL")
+    try:
+        addresses = [url.host] if _is_ip(url.host) else await _resolve(url.host)
+    except OSError as e:
+        raise ImageUnavailable(f"cannot resolve {url.host}: {e}") from e
+    if not addresses or not all(_is_public(a) for a in addresses):
+        raise ImageUnavailable(f"refusing non-public host {url.host}")
+
+
+def _check_peer(response: "httpx.Response") -> None:
+    # The host may resolve differently at connect time; check where we actually landed
+    stream = response.extensions.get("network_stream")
+    peer = stream.get_extra_info("server_addr") if stream is not None else None
+    if peer and not _is_public(peer[0]):
+        raise ImageUnavailable("upstream connected to a non-public address")
+
+
+async def _download(url: str) -> bytes:
+    """Fetch ``url``, refusing non-images, unsafe redirects and anything over the size limit."""
+    import httpx
+
+    limit = get_settings().image_fetch_max_bytes
+    try:
+        target = httpx.URL(url)
+        for _ in range(MAX_REDIRECTS + 1):
+            await _check_url(target)
+            async with get_client().stream("GET", target) as response:
+                _check_peer(response)
+                if not response.is_redirect:
+                    return await _read_image(response, limit)
+                target = response.url.join(response.headers["location"])
+    except httpx.HTTPError as e:
+        raise ImageUnavailable(f"fetch failed: {e}") from e
+    except httpx.InvalidURL as e:
+        raise ImageUnavailable(f"bad URL: {e}") from e
+    raise ImageUnavailable("too many redirects")
+
+
+async def _read_image(response: "httpx.Response", limit: int) -> bytes:
+    if response.status_code != 200:
+        raise ImageUnavailable(f"upstream returned {response.status_code}")
+    if not response.headers.get("content-type", "").startswith("image/"):
+        raise ImageUnavailable("upstream did not return an image")
+    if int(response.headers.get("content-length") or 0) > limit:
+        raise ImageUnavailable("image too large")
+    parts, size = [], 0
+    async for chunk in response.aiter_bytes():
+        size += len(chunk)
+        if size > limit:
+            raise ImageUnavailable("image too large")
+        parts.append(chunk)
+    return b"".join(parts)
+
+
+async def _original(iid: str) -> bytes:
+    key = f"orig:{iid}"
+    data = await _store_get(key)
+    if data is not None:
+        return data
+    source = await cache_get(_source_key(iid))
+    if source and source.get("url"):
+        url = source["url"]
+    else:
+        # Registered while Redis was down
+        stored = await _store_get(_source_key(iid))
+        if stored is None:
+            raise ImageUnavailable("unknown image")
+        url = stored.decode()
+    data = await _download(url)
+    await _store_set(key, data)
+    return data
+
+
+def _resize(data: bytes, width: int) -> bytes:
+    """WebP thumbnail no wider than ``width``; runs in the resize pool."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            # Decode at reduced scale where the format supports it (JPEG)
+            img.draft("RGB", (width, width * 4))
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+            if img.width > width:
+                img.thumbnail((width, max(1, img.height * width // img.width)), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImageUnavailable(f"unreadable image: {e}") from e
+    return out.getvalue()
+
+
+async def _make_thumbnail(iid: str, width: int) -> bytes:
+    original = await _original(iid)
+    loop = asyncio.get_running_loop()
+    thumb = await loop.run_in_executor(_get_pool(), _resize, original, width)
+    await _store_set(f"thumb:{iid}:{width}", thumb)
+    return thumb
+
+
+def _settle(key: str, future: asyncio.Future) -> None:
+    _inflight.pop(key, None)
+    if not future.cancelled():
+        future.exception()  # Retrieved here in case every waiter went away
+
+
+async def get_thumbnail(iid: str, width: int) -> bytes:
+    """
+    WebP thumbnail of a registered image at a standard width.
+
+    Raises ImageUnavailable when the id is unknown or the upstream image
+    cannot be used.
+    """
+    width = snap_width(width)
+    key = f"thumb:{iid}:{width}"
+    thumb = await _store_get(key)
+    if thumb is not None:
+        _image_hit.inc()
+        return thumb
+    _image_miss.inc()
+
+    pending = _inflight.get(key)
+    if pending is None:
+        # Shared by every waiter, so not bound by the first one's deadline
+        pending = asyncio.get_running_loop().create_task(
+            _make_thumbnail(iid, width), context=deadline.detached_context()
+        )
+        _inflight[key] = pending
+        pending.add_done_callback(lambda f: _settle(key, f))
+    # Shielded so one client going away doesn't fail the others waiting on it
+    return await asyncio.shield(pending)
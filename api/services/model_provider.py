@@ -1,7 +1,6 @@
 """Model provider abstraction."""
 
 import os
-import httpx
 import re
 from typing import Dict, Any, List, Optional
 from config import get_settings
@@ -10,6 +9,14 @@ class ModelError(Exception):
     """Base model error."""
     pass
 
+class ModelUnavailable(ModelError):
+    """No configured model can serve the request."""
+    pass
+
+class RequiresPro(ModelError):
+    """Requested model or mode is limited to pro users."""
+    pass
+
 class ModelProvider:
     """Singleton for managing model clients and inference routing."""
 
@@ -18,7 +25,7 @@ class ModelProvider:
     def __init__(self):
         self.settings = get_settings()
         # Initialize preferred AI clients here (e.g., Groq, Gemini, OpenAI)
-        pass
+        self.gemini_configured = bool(self.settings.gemini_api_key)
 
     @classmethod
     def get_instance(cls):
@@ -26,6 +33,19 @@ class ModelProvider:
             cls._instance = cls()
         return cls._instance
     
+    async def initialize(self):
+        """Prepare provider clients on startup."""
+        pass
+
+    async def close(self):
+        """Release provider clients on shutdown."""
+        pass
+
+    @classmethod
+    def reset(cls):
+        """Forget the instance, e.g. in a freshly forked worker."""
+        cls._instance = None
+
     async def generate_text(self, model_type: str, prompt: str, **kwargs) -> str:
         """Complete text using specified model."""
         # Routing logic and provider-specific execution
@@ -45,3 +65,6 @@ class ModelProvider:
     async def _fallback_chain(self, prompt: str) -> dict:
         """Standard fallback strategy."""
         return {"provider": "fallback", "content": "Fallback response."}
+
+
+os.register_at_fork(after_in_child=ModelProvider.reset)
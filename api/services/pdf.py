@@ -0,0 +1,35 @@
+"""PDF rendering for exports.
+
+Kept out of ``routers.export`` so fpdf is only imported when a PDF is
+actually requested.
+"""
+
+from fpdf import FPDF, HTMLMixin
+
+
+class StyledPDF(FPDF, HTMLMixin):
+    def __init__(self, topic_name: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.topic_name = topic_name
+
+    def header(self):
+        # Fill background for every page
+        self.set_fill_color(10, 10, 10)
+        self.rect(0, 0, 210, 297, "F")
+        
+        if self.page_no() > 1:
+            self.set_font("helvetica", "I", 8)
+            self.set_text_color(150, 150, 150)
+            self.cell(0, 10, f"KnowBear Technical Depth: {self.topic_name}", align="R")
+            self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("helvetica", "I", 8)
+        self.set_text_color(150, 150, 150)
+        self.cell(0, 10, f"Page {self.page_no()} / {{nb}}", align="C")
+
+
+def safe_latin1(text: str) -> str:
+    # Ensure text is safe for fpdf2's default helvetica font.
+    return text.encode('latin-1', 'replace').decode('latin-1')
@@ -0,0 +1,213 @@
+"""Hybrid rate limiter.
+
+Requests are admitted from in-process token buckets with no I/O on the
+request path. A background task periodically flushes each bucket's pending
+consumption to Redis in one atomic Lua call, which returns the global usage
+per key for the current window; buckets then refuse requests once the
+global count (as of the last sync) plus local pending use reaches the limit.
+
+If Redis is unavailable the limiter keeps enforcing per-worker buckets and
+retries the flush on the next interval instead of failing open.
+"""
+
+import asyncio
+import time
+
+from fastapi import HTTPException, Request
+
+import deadline
+import metrics
+from auth import check_is_pro
+from config import get_settings
+from logging_config import logger
+from services.cache import get_redis
+
+WINDOW = 60  # Seconds; limits are expressed per minute
+PRO_STATUS_TTL = 300.0  # Seconds to trust a cached pro lookup
+
+# Atomically add each key's pending count to its window counter and return
+# the new totals. KEYS[i] pairs with ARGV[i + 1]; ARGV[1] is the key TTL.
+SYNC_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local totals = {}
+for i, key in ipairs(KEYS) do
+    local used = tonumber(ARGV[i + 1])
+    local total = redis.call('INCRBY', key, used)
+    if total == used then
+        redis.call('EXPIRE', key, ttl)
+    end
+    totals[i] = total
+end
+return totals
+"""
+
+_allowed = metrics.rate_limit_decisions.labels("allowed")
+_limited = metrics.rate_limit_decisions.labels("limited")
+
+
+class _Bucket:
+    __slots__ = ("limit", "tokens", "updated", "window", "pending", "remote_used")
+
+    def __init__(self, limit: int, now: float, window: int):
+        self.limit = limit
+        self.tokens = float(limit)
+        self.updated = now
+        self.window = window
+        self.pending = 0  # Admitted locally, not yet flushed to Redis
+        self.remote_used = 0  # Global usage in ``window`` as of the last sync
+
+
+class HybridRateLimiter:
+    """Per-identity limits from local token buckets, synced to Redis in batches."""
+
+    def __init__(self):
+        self.buckets: dict[str, _Bucket] = {}
+        self._pro: dict[str, tuple[bool, float]] = {}
+        self._pro_lookups: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self._redis_ok = True
+
+    def limit_for(self, user_id: str | None) -> int:
+        """Requests per minute for a user; pro users get a multiple of the base limit."""
+        settings = get_settings()
+        base = settings.rate_limit_per_user
+        if user_id and self._is_pro_cached(user_id):
+            return base * settings.rate_limit_pro_multiplier
+        return base
+
+    def _is_pro_cached(self, user_id: str) -> bool:
+        cached = self._pro.get(user_id)
+        now = time.monotonic()
+        if cached and cached[1] > now:
+            return cached[0]
+        # Look up in the background; use the last known (or free) tier meanwhile
+        if user_id not in self._pro_lookups:
+            self._pro_lookups.add(user_id)
+            asyncio.get_running_loop().create_task(
+                self._refresh_pro(user_id), context=deadline.detached_context()
+            )
+        return cached[0] if cached else False
+
+    async def _refresh_pro(self, user_id: str) -> None:
+        try:
+            self._pro[user_id] = (await check_is_pro(user_id), time.monotonic() + PRO_STATUS_TTL)
+        finally:
+            self._pro_lookups.discard(user_id)
+
+    def allow(self, key: str, limit: int, cost: int = 1) -> tuple[bool, float]:
+        """Try to admit a request worth ``cost`` tokens; returns (allowed, retry_after_seconds)."""
+        now = time.time()
+        window = int(now // WINDOW)
+        rate = limit / WINDOW
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = _Bucket(limit, now, window)
+        else:
+            if bucket.window != window:
+                # New window: unflushed use from the old one no longer counts
+                bucket.window = window
+                bucket.remote_used = 0
+                bucket.pending = 0
+            if bucket.limit != limit:
+                # Tier changed: rescale the bucket rather than resetting it
+                bucket.tokens = bucket.tokens * limit / bucket.limit
+                bucket.limit = limit
+            bucket.tokens = min(float(limit), bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        if bucket.tokens < cost:
+            return False, (cost - bucket.tokens) / rate
+        if bucket.remote_used + bucket.pending + cost > limit:
+            return False, (window + 1) * WINDOW - now
+        bucket.tokens -= cost
+        bucket.pending += cost
+        return True, 0.0
+
+    def charge(self, user_id: str, cost: int) -> bool:
+        """Spend ``cost`` tokens of a signed-in user's bucket on work a route does in bulk."""
+        allowed, _ = self.allow(f"user:{user_id}", self.limit_for(user_id), cost)
+        (_allowed if allowed else _limited).inc()
+        return allowed
+
+    async def check(self, request: Request, auth_data: dict | None, cost: int = 1) -> None:
+        """Raise 429 if the caller is over its limit (``cost`` tokens for this request)."""
+        user_id = auth_data["user"].id if auth_data else None
+        if user_id:
+            key = f"user:{user_id}"
+        else:
+            key = f"ip:{request.client.host if request.client else 'unknown'}"
+        allowed, retry_after = self.allow(key, self.limit_for(user_id), cost)
+        if allowed:
+            _allowed.inc()
+            return
+        _limited.inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(int(retry_after) + 1, 1))},
+        )
+
+    async def sync(self) -> None:
+        """Flush pending usage to Redis and pull back global totals."""
+        window = int(time.time() // WINDOW)
+        batch = [(key, b) for key, b in self.buckets.items() if b.pending and b.window == window]
+        if not batch:
+            return
+        sent = [b.pending for _, b in batch]
+        try:
+            r = await get_redis()
+            if not r:
+                return
+            keys = [f"rl:{key}:{window}" for key, _ in batch]
+            totals = await r.eval(SYNC_SCRIPT, len(keys), *keys, WINDOW * 2, *sent)
+        except Exception as e:
+            metrics.rate_limit_sync_failures.inc()
+            if self._redis_ok:
+                logger.warning("rate_limit_sync_failed_local_only", error=str(e))
+                self._redis_ok = False
+            return
+        if not self._redis_ok:
+            logger.info("rate_limit_sync_recovered")
+            self._redis_ok = True
+        for (_, bucket), used, total in zip(batch, sent, totals):
+            if bucket.window == window:
+                bucket.pending -= used
+                bucket.remote_used = int(total)
+
+    def prune(self) -> None:
+        """Forget idle buckets that have refilled and have nothing to flush, and stale pro lookups."""
+        now = time.time()
+        idle = [
+            key for key, b in self.buckets.items()
+            if not b.pending and now - b.updated > WINDOW
+        ]
+        for key in idle:
+            del self.buckets[key]
+        expired = time.monotonic()
+        for user_id in [u for u, (_, until) in self._pro.items() if until <= expired]:
+            del self._pro[user_id]
+
+    async def _run(self) -> None:
+        interval = get_settings().rate_limit_sync_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+                self.prune()
+            except Exception as e:
+                logger.error("rate_limit_sync_loop_error", error=str(e))
+
+    def start(self) -> None:
+        """Start the background sync loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the sync loop after a final flush."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.sync()
+
+
+rate_limiter = HybridRateLimiter()
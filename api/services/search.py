@@ -1,12 +1,12 @@
 import hashlib
 import random
-import httpx
 from typing import Dict, Any, List, Optional
+import deadline
 from config import get_settings
 from services.cache import cache_get, cache_set
+from services.images import register_image
 from logging_config import logger
 
-settings = get_settings()
 
 class SearchManager:
     """Manages search queries across multiple providers."""
@@ -15,7 +15,11 @@ class SearchManager:
         self.visual_keywords = {"diagram", "flowchart", "image", "photo", "visual", "graph", "chart"}
 
     async def get_search_context(self, query: str) -> str:
-        """Fetch search context from available providers."""
+        """Fetch search context from available providers; empty when the request is short on time."""
+        if not deadline.has_budget(get_settings().search_min_budget):
+            # Context is optional: better a prompt without it than a late answer
+            deadline.record_skip("search_context")
+            return ""
         try:
             cache_key = f"search:{hashlib.sha256(query.encode()).hexdigest()}"
             cached = await cache_get(cache_key)
@@ -32,13 +36,27 @@ class SearchManager:
         return content
 
     async def get_images(self, query: str) -> List[Dict[str, str]]:
-        """Fetch images related to the query."""
+        """
+        Images related to the query, as image proxy URLs.
+
+        Results are cached per query in Redis, so repeat lookups skip both
+        the search provider and re-registering each URL with the proxy.
+        """
+        cache_key = f"images:{hashlib.sha256(query.encode()).hexdigest()}"
+        cached = await cache_get(cache_key)
+        if cached and isinstance(cached, dict) and "images" in cached:
+            return cached["images"]
+
         # Standard placeholder for image search
-        return [
+        results = [
             {"url": "https://example.com/image1.jpg", "title": "Example Image 1"},
             {"url": "https://example.com/image2.jpg", "title": "Example Image 2"}
         ]
 
+        images = [await register_image(item["url"], item.get("title", "")) for item in results]
+        await cache_set(cache_key, {"images": images}, ttl=get_settings().image_meta_ttl)
+        return images
+
     async def get_quote(self) -> str:
         """Fetch a random quote for loading states."""
         fallbacks = [
@@ -0,0 +1,376 @@
+"""Resumable SSE stream buffers.
+
+A streaming generation runs as a background producer that appends numbered
+events to a StreamBuffer. Consumers replay the buffer from any sequence
+number, so a client reconnecting with Last-Event-ID resumes without another
+model call. Events are mirrored to a short-lived Redis list so a reconnect
+that lands on another worker can still resume.
+
+When the last consumer disconnects, the producer is cancelled after a short
+grace period (long enough for a reconnect) unless the cache-fill policy asks
+for every generation to finish.
+"""
+
+import asyncio
+import re
+import time
+import uuid
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import orjson
+
+import deadline
+from config import get_settings
+from logging_config import logger
+from metrics import (
+    active_streams,
+    background_in_flight,
+    provider_tokens_per_second,
+    stream_chunks_saved,
+    stream_ttfc,
+    streams_cancelled,
+)
+from services.cache import get_redis
+
+POLL_INTERVAL = 0.05  # Seconds between Redis polls for remote buffers
+IDLE_TIMEOUT = 30.0  # Give up on a buffer that stops growing
+DISCONNECT_CHECK_INTERVAL = 1.0  # How often an idle consumer checks its client
+
+_STREAM_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_buffers: dict[str, "StreamBuffer"] = {}  # stream_id -> local buffer
+_active: dict[str, str] = {}  # cache_key -> stream_id of in-progress generation
+_tasks: set[asyncio.Task] = set()
+
+_producers_in_flight = background_in_flight.labels("stream_producer")
+_avg_stream_chunks = 0.0  # EWMA of chunks per completed generation
+
+DisconnectCheck = Callable[[], Awaitable[bool]]
+
+
+def _events_key(stream_id: str) -> str:
+    return f"sse:{stream_id}"
+
+
+def _active_key(cache_key: str) -> str:
+    return f"sse:active:{cache_key}"
+
+
+def _watch_key(stream_id: str) -> str:
+    return f"sse:watch:{stream_id}"
+
+
+def is_terminal(event: dict[str, Any]) -> bool:
+    """Whether an event ends the stream."""
+    return "done" in event or "error" in event
+
+
+def parse_event_id(value: str | None) -> tuple[str, int] | None:
+    """Parse a Last-Event-ID header of the form ``<stream_id>:<seq>``."""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition(":")
+    if not _STREAM_ID.match(stream_id) or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamBuffer:
+    """Events of one in-progress generation, mirrored to Redis."""
+
+    def __init__(self, stream_id: str, cache_key: str | None = None):
+        self.stream_id = stream_id
+        self.cache_key = cache_key
+        self.events: list[dict[str, Any]] = []
+        self.finished = False
+        self.consumers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+        self._mirror = True
+
+    async def append(self, event: dict[str, Any]) -> int:
+        """Append an event, wake consumers and return its sequence number."""
+        self.events.append(event)
+        if is_terminal(event):
+            self.finished = True
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        await self._mirror_event(event)
+        return len(self.events)
+
+    async def _mirror_event(self, event: dict[str, Any]) -> None:
+        if not self._mirror:
+            return
+        try:
+            r = await get_redis()
+            if not r:
+                self._mirror = False
+                return
+            key = _events_key(self.stream_id)
+            pipe = r.pipeline(transaction=False)
+            pipe.rpush(key, orjson.dumps(event))
+            pipe.expire(key, get_settings().stream_buffer_ttl)
+            await pipe.execute()
+        except Exception as e:
+            # Stop mirroring rather than paying a failed round trip per chunk
+            self._mirror = False
+            logger.warning("stream_buffer_mirror_failed", stream_id=self.stream_id, error=str(e))
+
+    async def replay(
+        self,
+        after: int = 0,
+        is_disconnected: DisconnectCheck | None = None,
+    ) -> AsyncIterator[tuple[int, dict[str, Any]]]:
+        """Yield ``(seq, event)`` pairs after ``after`` until the stream ends."""
+        self.consumers += 1
+        try:
+            seq = after
+            idle = 0.0
+            while True:
+                changed = self._changed
+                while seq < len(self.events):
+                    idle = 0.0
+                    event = self.events[seq]
+                    seq += 1
+                    yield seq, event
+                    if is_terminal(event):
+                        return
+                if self.finished:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), DISCONNECT_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    if is_disconnected and await is_disconnected():
+                        return
+                    idle += DISCONNECT_CHECK_INTERVAL
+                    if idle >= IDLE_TIMEOUT:
+                        yield seq + 1, {"error": "Stream stalled"}
+                        return
+        finally:
+            self.consumers -= 1
+            if self.consumers == 0 and not self.finished:
+                _spawn(_cancel_if_abandoned(self))
+
+
+def _spawn(coro: Awaitable[Any]) -> asyncio.Task:
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def _cancel_if_abandoned(buf: StreamBuffer) -> None:
+    """Cancel the producer if nobody reattaches within the grace period."""
+    settings = get_settings()
+    if settings.stream_fill_cache_on_disconnect:
+        return
+    await asyncio.sleep(settings.stream_disconnect_grace)
+    if buf.finished or buf.consumers > 0 or buf.task is None or buf.task.done():
+        return
+    try:
+        # A consumer replaying from another worker keeps the stream alive
+        r = await get_redis()
+        if r and await r.exists(_watch_key(buf.stream_id)):
+            return
+    except Exception:
+        pass
+    buf.task.cancel()
+
+
+async def _produce(
+    buf: StreamBuffer,
+    source: AsyncIterator[str],
+    on_complete: Callable[[str], Awaitable[Any]],
+) -> None:
+    global _avg_stream_chunks
+    parts: list[str] = []
+    _producers_in_flight.inc()
+    start = time.perf_counter()
+    try:
+        # Time to first chunk counts against the request budget; once the
+        # model is streaming, the generation is detached from the request
+        chunk = await deadline.within("model_first_chunk", anext(source, None))
+        deadline.clear()
+        while chunk is not None:
+            if not parts:
+                stream_ttfc.observe(time.perf_counter() - start)
+            parts.append(chunk)
+            await buf.append({"chunk": chunk})
+            chunk = await anext(source, None)
+        await buf.append({"done": True})
+        elapsed = time.perf_counter() - start
+        if parts and elapsed > 0:
+            provider_tokens_per_second.observe(len(parts) / elapsed)
+        _avg_stream_chunks = len(parts) if not _avg_stream_chunks else 0.9 * _avg_stream_chunks + 0.1 * len(parts)
+        content = "".join(parts)
+        if content.strip():
+            await on_complete(content)
+    except asyncio.CancelledError:
+        saved = max(int(_avg_stream_chunks) - len(parts), 0)
+        streams_cancelled.inc()
+        stream_chunks_saved.inc(saved)
+        logger.info(
+            "stream_cancelled_no_consumers",
+            stream_id=buf.stream_id,
+            chunks_generated=len(parts),
+            chunks_saved_estimate=saved,
+        )
+        await _discard(buf)
+        raise
+    except Exception as e:
+        logger.error("stream_producer_failed", stream_id=buf.stream_id, error=str(e))
+        await buf.append({"error": str(e)})
+    finally:
+        _producers_in_flight.dec()
+        # Close the upstream explicitly so provider connections are released now,
+        # not whenever the generator is garbage collected
+        aclose = getattr(source, "aclose", None)
+        if aclose:
+            try:
+                await aclose()
+            except Exception:
+                pass
+        await _release(buf)
+
+
+async def _discard(buf: StreamBuffer) -> None:
+    """Drop a cancelled buffer so late reconnects restart instead of resuming."""
+    _buffers.pop(buf.stream_id, None)
+    try:
+        r = await get_redis()
+        if r:
+            await r.delete(_events_key(buf.stream_id))
+    except Exception:
+        pass
+
+
+async def _release(buf: StreamBuffer) -> None:
+    if buf.cache_key and _active.get(buf.cache_key) == buf.stream_id:
+        del _active[buf.cache_key]
+        try:
+            r = await get_redis()
+            if r:
+                await r.delete(_active_key(buf.cache_key))
+        except Exception:
+            pass
+    if buf.stream_id in _buffers:
+        # Keep the finished buffer around for late reconnects on this worker
+        asyncio.get_running_loop().call_later(
+            get_settings().stream_buffer_ttl, _buffers.pop, buf.stream_id, None
+        )
+
+
+async def start_stream(
+    source: AsyncIterator[str],
+    on_complete: Callable[[str], Awaitable[Any]],
+    cache_key: str | None = None,
+) -> StreamBuffer:
+    """
+    Run ``source`` in the background, buffering its chunks.
+
+    ``on_complete`` receives the full content once the source finishes. When
+    ``cache_key`` is given, other requests for the same key can join the
+    stream via ``find_active``.
+    """
+    buf = StreamBuffer(uuid.uuid4().hex, cache_key)
+    _buffers[buf.stream_id] = buf
+    if cache_key:
+        _active[cache_key] = buf.stream_id
+        try:
+            r = await get_redis()
+            if r:
+                await r.set(
+                    _active_key(cache_key),
+                    buf.stream_id,
+                    ex=get_settings().stream_buffer_ttl,
+                )
+        except Exception as e:
+            logger.warning("stream_buffer_register_failed", cache_key=cache_key, error=str(e))
+
+    buf.task = _spawn(_produce(buf, source, on_complete))
+    return buf
+
+
+async def find_active(cache_key: str) -> str | None:
+    """Stream id of an in-progress generation for ``cache_key``, if any."""
+    stream_id = _active.get(cache_key)
+    if stream_id:
+        return stream_id
+    try:
+        r = await get_redis()
+        if not r:
+            return None
+        val = await r.get(_active_key(cache_key))
+        return val.decode() if val else None
+    except Exception:
+        return None
+
+
+async def stream_exists(stream_id: str) -> bool:
+    """Whether a buffer for ``stream_id`` can still be replayed."""
+    if stream_id in _buffers:
+        return True
+    try:
+        r = await get_redis()
+        return bool(r and await r.exists(_events_key(stream_id)))
+    except Exception:
+        return False
+
+
+async def replay(
+    stream_id: str,
+    after: int = 0,
+    is_disconnected: DisconnectCheck | None = None,
+) -> AsyncIterator[tuple[int, dict[str, Any]]]:
+    """
+    Yield ``(seq, event)`` pairs of a stream after sequence number ``after``.
+
+    Local buffers are followed in memory; buffers owned by another worker are
+    polled from Redis until a terminal event arrives. ``is_disconnected`` is
+    checked while waiting so an abandoned consumer stops promptly.
+    """
+    buf = _buffers.get(stream_id)
+    if buf is not None:
+        async with aclosing(buf.replay(after, is_disconnected)) as events:
+            async for item in events:
+                yield item
+        return
+
+    seq = after
+    idle = 0.0
+    since_check = DISCONNECT_CHECK_INTERVAL
+    key = _events_key(stream_id)
+    grace = get_settings().stream_disconnect_grace
+    while True:
+        try:
+            r = await get_redis()
+            if since_check >= DISCONNECT_CHECK_INTERVAL:
+                # Tell the owning worker someone is still reading
+                await r.set(_watch_key(stream_id), b"1", ex=max(int(grace * 2), 1))
+                since_check = 0.0
+            raw = await r.lrange(key, seq, -1)
+        except Exception as e:
+            logger.warning("stream_buffer_replay_failed", stream_id=stream_id, error=str(e))
+            yield seq + 1, {"error": "Stream unavailable"}
+            return
+        if raw:
+            idle = 0.0
+            for item in raw:
+                event = orjson.loads(item)
+                seq += 1
+                yield seq, event
+                if is_terminal(event):
+                    return
+            continue
+        if idle >= IDLE_TIMEOUT:
+            yield seq + 1, {"error": "Stream stalled"}
+            return
+        await asyncio.sleep(POLL_INTERVAL)
+        idle += POLL_INTERVAL
+        since_check += POLL_INTERVAL
+        if since_check >= DISCONNECT_CHECK_INTERVAL and is_disconnected and await is_disconnected():
+            return
+
+
+active_streams.set_function(lambda: sum(not buf.finished for buf in _buffers.values()))
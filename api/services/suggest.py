@@ -0,0 +1,234 @@
+"""Topic suggestions.
+
+An in-memory prefix trie over topics we can answer cheaply: the pinned
+topics, popular topics in the cached explanation keyspace, and topics
+ranked by how often they are queried. Each trie node keeps its subtree's top
+topics by popularity, so a lookup is a walk down the prefix plus a copy of
+at most ``TOP_K`` entries.
+
+Popularity counts are kept locally and flushed to a Redis sorted set in
+the background; the same loop pulls back topics other workers have seen,
+so the index grows incrementally without rebuilding. A queried topic is
+only indexed once it reaches ``suggest_min_popularity``, so one user's
+query is never offered to everyone else, and the index is trimmed back to
+``suggest_max_topics`` on sync by dropping the least popular topics.
+"""
+
+import asyncio
+import html
+
+from config import get_settings
+from logging_config import logger
+from prompts import PROMPT_VERSION
+from routers.pinned import PINNED_TOPICS
+from services.cache import get_redis
+from utils import normalize_topic
+
+TOP_K = 10  # Suggestions kept per trie node
+PINNED_SCORE = 1000.0  # Curated topics rank above organic ones until those are popular
+POPULARITY_KEY = "topics:popularity"
+SCAN_PATTERN = f"explanation:v{PROMPT_VERSION}:*"
+SYNC_TOP_N = 5000  # Most popular topics pulled from Redis on each refresh
+SCORE_BATCH = 1000  # Cached topics scored per ZMSCORE call
+EVICT_TO = 0.9  # Trim down to this share of suggest_max_topics, so eviction is rare
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: dict[str, "_Node"] = {}
+        self.top: list[str] = []  # Normalized topics, highest score first
+
+
+class TopicIndex:
+    """Prefix trie with per-node top-k by popularity."""
+
+    def __init__(self):
+        self.root = _Node()
+        self.scores: dict[str, float] = {}
+        self.display: dict[str, str] = {}  # Normalized -> how to show it
+        self.pinned: set[str] = set()  # Never evicted
+        self._pending: dict[str, float] = {}  # Popularity not yet flushed to Redis
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def _rank(self, top: list[str], key: str) -> None:
+        """Place ``key`` in ``top`` by its current score, keeping at most TOP_K."""
+        scores = self.scores
+        if key in top:
+            top.remove(key)
+        elif len(top) >= TOP_K and scores[key] <= scores[top[-1]]:
+            return
+        i = len(top)
+        while i and scores[top[i - 1]] < scores[key]:
+            i -= 1
+        top.insert(i, key)
+        del top[TOP_K:]
+
+    def add(self, topic: str, score: float = 0.0, display: str | None = None) -> None:
+        """
+        Raise ``topic`` to at least ``score``.
+
+        Scores only ever increase, which is what makes the per-node top
+        lists safe to maintain incrementally: a topic pushed out of a list
+        can never need to come back before the topics that displaced it.
+        """
+        key = normalize_topic(topic)
+        if not key:
+            return
+        if display or key not in self.display:
+            # Cached keys hold the escaped form sanitize_topic produces
+            self.display[key] = display or html.unescape(key)
+        old = self.scores.get(key)
+        if old is not None and score <= old:
+            return
+        self.scores[key] = score
+        node = self.root
+        self._rank(node.top, key)
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+            self._rank(node.top, key)
+
+    def record(self, topic: str, amount: float = 1.0) -> None:
+        """Count one query for ``topic``; the count reaches Redis on the next sync."""
+        key = normalize_topic(topic)
+        if not key:
+            return
+        pending = self._pending[key] = self._pending.get(key, 0.0) + amount
+        if key in self.scores:
+            self.add(key, self.scores[key] + amount)
+        elif pending >= get_settings().suggest_min_popularity:
+            self.add(key, pending)
+
+    def suggest(self, prefix: str, limit: int = TOP_K) -> list[str]:
+        """Most popular topics starting with ``prefix``."""
+        node = self.root
+        for ch in normalize_topic(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return [self.display[key] for key in node.top[:limit]]
+
+    def load_pinned(self) -> None:
+        for item in PINNED_TOPICS:
+            self.add(item["title"], PINNED_SCORE, display=item["title"])
+            self.pinned.add(normalize_topic(item["title"]))
+
+    async def load_cached(self, r) -> int:
+        """
+        Add cached topics that are popular enough to suggest.
+
+        Being cached only means somebody asked once, so each topic still has
+        to reach ``suggest_min_popularity`` in the popularity set. This also
+        reaches popular cached topics beyond the ``SYNC_TOP_N`` that sync pulls.
+        """
+        topics: set[str] = set()
+        async for raw in r.scan_iter(match=SCAN_PATTERN, count=1000):
+            key = raw.decode() if isinstance(raw, bytes) else raw
+            # explanation:v<prompt version>:<mode>:<normalized topic>:<level>
+            topic = key.split(":", 3)[-1].rpartition(":")[0]
+            if topic and topic not in self.scores:
+                topics.add(topic)
+        min_popularity = get_settings().suggest_min_popularity
+        candidates = sorted(topics)
+        count = 0
+        for i in range(0, len(candidates), SCORE_BATCH):
+            batch = candidates[i:i + SCORE_BATCH]
+            for topic, score in zip(batch, await r.zmscore(POPULARITY_KEY, batch)):
+                if score is not None and float(score) >= min_popularity:
+                    self.add(topic, float(score))
+                    count += 1
+        return count
+
+    async def sync(self) -> None:
+        """Flush local popularity to Redis and merge in counts from other workers."""
+        r = await get_redis()
+        if not r:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            pipe = r.pipeline(transaction=False)
+            for key, amount in pending.items():
+                pipe.zincrby(POPULARITY_KEY, amount, key)
+            pipe.zrevrange(POPULARITY_KEY, 0, SYNC_TOP_N - 1, withscores=True)
+            results = await pipe.execute()
+        except Exception:
+            # Keep the counts for the next attempt
+            for key, amount in pending.items():
+                self._pending[key] = self._pending.get(key, 0.0) + amount
+            raise
+        min_popularity = get_settings().suggest_min_popularity
+        for member, score in results[-1]:
+            key = member.decode() if isinstance(member, bytes) else member
+            # Unflushed local counts sit on top of the global total
+            score = float(score) + self._pending.get(key, 0.0)
+            if key in self.scores or score >= min_popularity:
+                self.add(key, score)
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Drop the least popular unpinned topics once past ``suggest_max_topics``.
+
+        Removal breaks the incremental top lists, so the trie is rebuilt
+        from the survivors; trimming below the cap keeps that rare.
+        """
+        limit = get_settings().suggest_max_topics
+        if len(self.scores) <= limit:
+            return 0
+        keep = max(int(limit * EVICT_TO), len(self.pinned))
+        ranked = sorted(
+            self.scores.items(), key=lambda item: (item[0] in self.pinned, item[1]), reverse=True
+        )
+        survivors = dict(ranked[:keep])
+        evicted = len(self.scores) - len(survivors)
+        display = self.display
+        self.root, self.scores, self.display = _Node(), {}, {}
+        for key, score in survivors.items():
+            self.add(key, score, display=display.get(key))
+        logger.info("topic_index_evicted", evicted=evicted, topics=len(self))
+        return evicted
+
+    async def build(self) -> None:
+        """Initial load: pinned topics, the cache keyspace and global popularity."""
+        self.load_pinned()
+        try:
+            r = await get_redis()
+            if r:
+                cached = await self.load_cached(r)
+                await self.sync()
+                logger.info("topic_index_built", topics=len(self), cached_topics=cached)
+        except Exception as e:
+            logger.warning("topic_index_build_partial", topics=len(self), error=str(e))
+
+    async def _run(self) -> None:
+        await self.build()
+        interval = get_settings().suggest_sync_interval
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning("topic_index_sync_failed", error=str(e))
+
+    def start(self) -> None:
+        """Build the index and keep it synced in the background."""
+        if self._task is None or self._task.done():
+            self.load_pinned()  # Usable immediately, before the Redis load finishes
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop syncing after a final flush of local counts."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.sync()
+        except Exception:
+            pass
+
+
+topic_index = TopicIndex()
@@ -0,0 +1,155 @@
+"""Regeneration variant pools.
+
+Each (topic, level, mode) keeps a small pool of distinct alternative
+explanations in the cache. A regenerate request is answered from a variant
+the viewer has not seen yet; only when every pooled variant has been seen
+does it fall through to the model, and the pool is topped up in the
+background so the next regenerate is a cache hit.
+"""
+
+import asyncio
+import hashlib
+from typing import Any
+
+import deadline
+from config import get_settings
+from logging_config import logger
+from metrics import background_in_flight, cache_requests
+from services.cache import cache_get, cache_set
+from services.inference import generate_stream_explanation
+from utils import normalize_topic, topic_cache_key
+
+_variant_hit = cache_requests.labels("variants", "hit")
+_variant_miss = cache_requests.labels("variants", "miss")
+_fills_in_flight = background_in_flight.labels("variant_fill")
+
+_filling: set[str] = set()  # Pool keys with a fill running on this worker
+_tasks: set[asyncio.Task] = set()
+
+
+def _pool_key(topic: str, level: str, mode: str) -> str:
+    return f"variants:{normalize_topic(topic)}:{level}:{mode}"
+
+
+def _seen_key(viewer: str, topic: str, level: str, mode: str) -> str:
+    return f"variants:seen:{viewer}:{normalize_topic(topic)}:{level}:{mode}"
+
+
+def variant_id(text: str) -> str:
+    """Short content hash identifying a variant."""
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+async def _load_pool(key: str) -> list[dict[str, Any]]:
+    cached = await cache_get(key)
+    return cached.get("variants", []) if cached else []
+
+
+async def _mark_seen(viewer: str, topic: str, level: str, mode: str, *ids: str) -> None:
+    key = _seen_key(viewer, topic, level, mode)
+    cached = await cache_get(key)
+    seen = cached.get("seen", []) if cached else []
+    seen.extend(i for i in ids if i not in seen)
+    await cache_set(key, {"seen": seen})
+
+
+async def add_variant(topic: str, level: str, mode: str, text: str) -> bool:
+    """Add a variant to the pool unless it duplicates one; oldest drop out past the pool size."""
+    key = _pool_key(topic, level, mode)
+    pool = await _load_pool(key)
+    vid = variant_id(text)
+    if any(v["id"] == vid for v in pool):
+        return False
+    pool.append({"id": vid, "text": text})
+    await cache_set(key, {"variants": pool[-get_settings().regenerate_pool_size:]})
+    return True
+
+
+async def take_variant(
+    topic: str,
+    level: str,
+    mode: str,
+    viewer: str,
+    temperature: float = 0.7,
+) -> str | None:
+    """
+    Next pooled variant ``viewer`` has not seen, or None if there is none.
+
+    The primary cached answer counts as seen. Whatever the outcome, a fill
+    is scheduled when the pool is below its target size.
+    """
+    key = _pool_key(topic, level, mode)
+    pool, seen_cached, primary = await asyncio.gather(
+        _load_pool(key),
+        cache_get(_seen_key(viewer, topic, level, mode)),
+        cache_get(topic_cache_key(topic, level, mode)),
+    )
+    seen = set(seen_cached.get("seen", []) if seen_cached else [])
+    if primary and primary.get("text"):
+        seen.add(variant_id(primary["text"]))
+
+    if len(pool) < get_settings().regenerate_pool_size:
+        schedule_fill(topic, level, mode, temperature)
+
+    for variant in pool:
+        if variant["id"] not in seen:
+            _variant_hit.inc()
+            await _mark_seen(viewer, topic, level, mode, variant["id"])
+            return variant["text"]
+    _variant_miss.inc()
+    return None
+
+
+async def record_generated(topic: str, level: str, mode: str, viewer: str, text: str) -> None:
+    """Pool a freshly generated regenerate answer and mark it seen by its viewer."""
+    await add_variant(topic, level, mode, text)
+    await _mark_seen(viewer, topic, level, mode, variant_id(text))
+
+
+async def _generate(topic: str, level: str, mode: str, temperature: float) -> str:
+    parts = []
+    async for chunk in generate_stream_explanation(
+        topic, level, mode=mode, temperature=temperature, regenerate=True
+    ):
+        parts.append(chunk)
+    return "".join(parts)
+
+
+async def fill_pool(topic: str, level: str, mode: str, temperature: float = 0.7) -> int:
+    """Generate variants until the pool reaches its target size; returns how many were added."""
+    key = _pool_key(topic, level, mode)
+    target = get_settings().regenerate_pool_size
+    added = 0
+    # Bound attempts so a model that keeps repeating itself can't loop forever
+    for _ in range(target * 2):
+        if len(await _load_pool(key)) >= target:
+            break
+        text = await _generate(topic, level, mode, temperature)
+        if text.strip() and await add_variant(topic, level, mode, text):
+            added += 1
+    return added
+
+
+async def _run_fill(key: str, topic: str, level: str, mode: str, temperature: float) -> None:
+    _fills_in_flight.inc()
+    try:
+        added = await fill_pool(topic, level, mode, temperature)
+        logger.info("variant_pool_filled", topic=topic, level=level, mode=mode, added=added)
+    except Exception as e:
+        logger.warning("variant_pool_fill_failed", topic=topic, level=level, error=str(e))
+    finally:
+        _fills_in_flight.dec()
+        _filling.discard(key)
+
+
+def schedule_fill(topic: str, level: str, mode: str, temperature: float = 0.7) -> None:
+    """Top up the pool in the background unless a fill is already running here."""
+    key = _pool_key(topic, level, mode)
+    if key in _filling:
+        return
+    _filling.add(key)
+    task = asyncio.get_running_loop().create_task(
+        _run_fill(key, topic, level, mode, temperature), context=deadline.detached_context()
+    )
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
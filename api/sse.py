@@ -0,0 +1,121 @@
+"""Server-sent event frame encoding.
+
+Shared by every streaming route. Frames are serialized with orjson into a
+reusable bytearray, and tiny model tokens can be coalesced into fewer frames
+over a short time/size window.
+"""
+
+import asyncio
+import time
+from typing import Any, AsyncIterator
+
+import orjson
+
+DONE_FRAME = b"data: [DONE]\n\n"
+
+
+class SSEEncoder:
+    """Encode SSE frames into a preallocated, reused byte buffer."""
+
+    def __init__(self, capacity: int = 1024):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._buf):
+            self._view.release()
+            self._buf = bytearray(max(size, 2 * len(self._buf)))
+            self._view = memoryview(self._buf)
+
+    def frame(self, data: Any, event_id: str | None = None) -> bytes:
+        """Encode one ``data:`` frame, optionally prefixed with an ``id:`` line."""
+        payload = orjson.dumps(data)
+        head = b"id: " + event_id.encode() + b"\ndata: " if event_id is not None else b"data: "
+        end = len(head) + len(payload) + 2
+        self._reserve(end)
+        view = self._view
+        pos = len(head)
+        view[:pos] = head
+        view[pos:pos + len(payload)] = payload
+        view[end - 2:end] = b"\n\n"
+        return view[:end].tobytes()
+
+    def done(self, event_id: str | None = None) -> bytes:
+        """Encode the terminal ``[DONE]`` frame."""
+        if event_id is None:
+            return DONE_FRAME
+        return b"id: " + event_id.encode() + b"\n" + DONE_FRAME
+
+
+async def coalesce_chunks(
+    events: AsyncIterator[tuple[int, dict[str, Any]]],
+    window: float,
+    max_bytes: int,
+) -> AsyncIterator[tuple[int, dict[str, Any]]]:
+    """
+    Merge consecutive ``{"chunk": ...}`` events into larger ones.
+
+    Pending chunks are flushed once ``window`` seconds have passed since the
+    first one arrived, once they reach ``max_bytes`` (counted in characters,
+    which is close enough for mostly-ASCII text), or when a non-chunk
+    event arrives. The merged event keeps the sequence number of its last
+    chunk, so Last-Event-ID resumption still lines up.
+    """
+    if window <= 0 and max_bytes <= 0:
+        async for item in events:
+            yield item
+        return
+
+    parts: list[str] = []
+    size = 0
+    last_seq = 0
+    started = 0.0
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            if parts:
+                # Something is waiting to be flushed: race the next event
+                # against the end of the window
+                if pending is None:
+                    pending = asyncio.ensure_future(events.__anext__())
+                timeout = window - (time.monotonic() - started)
+                if timeout > 0:
+                    await asyncio.wait({pending}, timeout=timeout)
+                if not pending.done():
+                    yield last_seq, {"chunk": "".join(parts)}
+                    parts, size = [], 0
+                    continue
+            try:
+                if pending is not None:
+                    fut, pending = pending, None
+                    seq, event = await fut
+                else:
+                    seq, event = await events.__anext__()
+            except StopAsyncIteration:
+                break
+
+            chunk = event.get("chunk")
+            if chunk is None:
+                if parts:
+                    yield last_seq, {"chunk": "".join(parts)}
+                    parts, size = [], 0
+                yield seq, event
+                continue
+            if not parts:
+                started = time.monotonic()
+            parts.append(chunk)
+            size += len(chunk)
+            last_seq = seq
+            if size >= max_bytes:
+                yield last_seq, {"chunk": "".join(parts)}
+                parts, size = [], 0
+        if parts:
+            yield last_seq, {"chunk": "".join(parts)}
+    finally:
+        # An __anext__ still running on ``events`` would make closing it fail
+        # ("asynchronous generator is already running"): settle it first
+        if pending is not None:
+            pending.cancel()
+            await asyncio.wait({pending})
+            if not pending.cancelled():
+                pending.exception()
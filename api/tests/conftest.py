@@ -0,0 +1,35 @@
+import pytest
+from mocks.redis import FakeRedis
+
+
+@pytest.fixture(autouse=True)
+def disk_store(tmp_path, monkeypatch):
+    """Give each test its own durable cache file instead of the working tree's."""
+    import services.disk_cache
+    from services.disk_cache import DiskCache
+
+    store = DiskCache(str(tmp_path / "explanations.sqlite3"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(services.disk_cache, "_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Make get_redis() hand out a fresh in-process FakeRedis."""
+    import services.cache
+
+    fake = FakeRedis()
+    monkeypatch.setattr(services.cache, "_client", fake)
+    return fake
+
+
+@pytest.fixture(autouse=True)
+def hot_keys(monkeypatch):
+    """Start each test with no hot keys or local pins."""
+    import services.hotkeys
+    from services.hotkeys import HotKeyTracker
+
+    tracker = HotKeyTracker()
+    monkeypatch.setattr(services.hotkeys, "_tracker", tracker)
+    return tracker
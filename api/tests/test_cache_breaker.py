@@ -0,0 +1,66 @@
+import asyncio
+import time
+import pytest
+import services.cache
+from services.cache import CircuitBreaker, cache_get, cache_set
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10.0, cooldown=0.1)
+    monkeypatch.setattr(services.cache, "_breaker", b)
+    return b
+
+
+@pytest.fixture
+def slow_redis(fake_redis, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "redis_op_timeout", 0.02)
+    fake_redis.latency = 0.5
+    return fake_redis
+
+
+@pytest.mark.asyncio
+async def test_slow_redis_opens_breaker_and_bypasses(breaker, slow_redis):
+    for _ in range(4):
+        assert await cache_get("k") is None
+    assert breaker.state == CircuitBreaker.OPEN
+
+    calls = slow_redis.calls
+    start = time.perf_counter()
+    assert await cache_get("k") is None
+    assert await cache_set("k", {"text": "x"}) is False
+    assert time.perf_counter() - start < 0.01
+    assert slow_redis.calls == calls  # Redis was not touched while open
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_after_recovery(breaker, slow_redis):
+    for _ in range(4):
+        await cache_get("k")
+    assert breaker.state == CircuitBreaker.OPEN
+
+    await asyncio.sleep(0.12)
+    slow_redis.latency = 0.0
+    await slow_redis.set("k", b'{"text": "cached"}')
+    assert await cache_get("k") == {"text": "cached"}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens(breaker, slow_redis):
+    for _ in range(4):
+        await cache_get("k")
+    await asyncio.sleep(0.12)
+    assert await cache_get("k") is None  # Probe times out
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_breaker_needs_min_calls():
+    b = CircuitBreaker(failure_rate=0.5, min_calls=4, window=10.0, cooldown=1.0)
+    b.record(False)
+    b.record(False)
+    assert b.state == CircuitBreaker.CLOSED
+    b.record(True)
+    b.record(True)
+    assert b.state == CircuitBreaker.OPEN
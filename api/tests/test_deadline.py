@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import deadline
+import routers.query
+import services.cache
+from config import get_settings
+from main import app
+from metrics import deadline_events
+from services.cache import CircuitBreaker, cache_get
+from services.rate_limit import rate_limiter
+from services.search import search_service
+
+
+@pytest.fixture
+def tight():
+    """Run the test body under a 50ms request budget."""
+    token = deadline.start(0.05)
+    yield
+    deadline.reset(token)
+
+
+def test_budget_shrinks_timeouts():
+    assert deadline.remaining() is None
+    assert deadline.budget(0.25) == 0.25
+    token = deadline.start(0.1)
+    try:
+        assert deadline.budget(0.25) <= 0.1
+        assert deadline.budget(0.01) == 0.01
+        assert not deadline.has_budget(1.0)
+    finally:
+        deadline.reset(token)
+
+
+@pytest.mark.asyncio
+async def test_within_raises_and_counts(tight):
+    before = deadline_events.labels("slow_stage", "timeout").value
+    with pytest.raises(deadline.DeadlineExceeded):
+        await deadline.within("slow_stage", asyncio.sleep(1))
+    assert deadline_events.labels("slow_stage", "timeout").value == before + 1
+
+
+@pytest.mark.asyncio
+async def test_cache_get_gives_up_at_deadline_without_blaming_redis(fake_redis, monkeypatch, tight):
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=1, window=10.0, cooldown=5.0)
+    monkeypatch.setattr(services.cache, "_breaker", breaker)
+    monkeypatch.setattr(get_settings(), "redis_op_timeout", 5.0)
+    fake_redis.latency = 1.0
+
+    start = time.perf_counter()
+    assert await cache_get("explanation:slow:eli5") is None
+    assert time.perf_counter() - start < 0.5
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_search_context_skipped_near_deadline(tight):
+    assert await search_service.get_search_context("anything") == ""
+
+
+def test_query_returns_within_budget(fake_redis, monkeypatch):
+    monkeypatch.setattr(get_settings(), "request_deadline", 0.2)
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+
+    async def slow_model(*args, **kwargs):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(routers.query, "ensemble_generate", slow_model)
+    start = time.perf_counter()
+    r = TestClient(app).post("/api/query", json={"topic": "Slow topic"})
+    assert time.perf_counter() - start < 2
+    assert "deadline exceeded" in r.json()["explanations"]["eli5"]
@@ -0,0 +1,73 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+import diagnostics
+import executors
+from config import get_settings
+from executors import InstrumentedExecutor, run_db
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def warning(self, event, **kw):
+        self.events.append((event, kw))
+
+
+def test_executor_tracks_queue_depth_and_wait():
+    executor = InstrumentedExecutor("test", max_workers=1)
+    release = threading.Event()
+    first = executor.submit(release.wait)
+    second = executor.submit(lambda: "done")
+    time.sleep(0.05)
+
+    assert (executor.active, executor.queued) == (1, 1)
+    release.set()
+    assert second.result(timeout=1) == "done" and first.result(timeout=1)
+    assert (executor.active, executor.queued) == (0, 0)
+    assert executor._wait.count == 2 and executor._wait.sum >= 0.05
+    executor.shutdown()
+
+
+def _blocking_handler():
+    time.sleep(0.4)
+
+
+@pytest.mark.asyncio
+async def test_blocked_loop_is_sampled_with_its_stack(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "loop_lag_interval", 0.05)
+    monkeypatch.setattr(settings, "slow_callback_threshold", 0.1)
+    log = RecordingLogger()
+    monkeypatch.setattr(diagnostics, "logger", log)
+    monitor = diagnostics.RuntimeDiagnostics()
+
+    monitor.start()
+    await asyncio.sleep(0.1)
+    _blocking_handler()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+
+    assert monitor.stalls == 1
+    assert monitor.max_lag >= 0.3
+    event, fields = log.events[0]
+    assert event == "slow_callback"
+    assert "_blocking_handler" in fields["stack"]
+    assert set(monitor.snapshot()["executors"]) == {"default", "db"}
+
+
+@pytest.mark.asyncio
+async def test_run_db_uses_db_pool_and_carries_context(monkeypatch):
+    monkeypatch.setattr(executors, "_db_executor", InstrumentedExecutor("db", 2))
+    request_id = contextvars.ContextVar("request_id")
+    request_id.set("r-1")
+
+    name, value = await run_db(lambda: (threading.current_thread().name, request_id.get()))
+
+    assert name.startswith("db") and value == "r-1"
+    executors._db_executor.shutdown()
@@ -0,0 +1,82 @@
+import pytest
+
+import services.cache
+from services.cache import get_explanation, set_explanation
+from services.disk_cache import DiskCache, content_key
+from utils import topic_cache_key
+
+
+@pytest.mark.asyncio
+async def test_redis_miss_reads_through_disk_and_repopulates(fake_redis, disk_store):
+    await set_explanation("Photosynthesis", "eli5", "fast", {"text": "Plants eat light."})
+    await fake_redis.delete(topic_cache_key("Photosynthesis", "eli5", "fast"))  # Expired or evicted
+
+    assert await get_explanation("photosynthesis ", "eli5", "fast") == {"text": "Plants eat light."}
+    await services.cache._refills.pop()
+    assert await fake_redis.get(topic_cache_key("Photosynthesis", "eli5", "fast"))
+
+
+@pytest.mark.asyncio
+async def test_keys_include_mode_and_prompt_version(fake_redis, disk_store, monkeypatch):
+    # Both tiers, Redis included: nothing is deleted to dodge the first one
+    await set_explanation("Gravity", "eli5", "fast", {"text": "Things fall."})
+
+    assert await get_explanation("Gravity", "eli5", "deep_dive") is None
+    monkeypatch.setattr("services.disk_cache.PROMPT_VERSION", "2")
+    monkeypatch.setattr("utils.PROMPT_VERSION", "2")
+    assert await get_explanation("Gravity", "eli5", "fast") is None
+
+
+@pytest.mark.asyncio
+async def test_modes_do_not_share_cached_answers(fake_redis, disk_store):
+    await set_explanation("Tides", "eli5", "deep_dive", {"text": "A long answer."})
+    await set_explanation("Tides", "eli5", "fast", {"text": "The moon pulls."})
+    await fake_redis.delete(topic_cache_key("Tides", "eli5", "deep_dive"))
+
+    # The disk refill goes back under deep_dive's own key, not the one fast reads
+    assert await get_explanation("Tides", "eli5", "deep_dive") == {"text": "A long answer."}
+    await services.cache._refills.pop()
+    assert await get_explanation("Tides", "eli5", "fast") == {"text": "The moon pulls."}
+    assert await get_explanation("Tides", "eli5", "deep_dive") == {"text": "A long answer."}
+
+
+def test_compaction_evicts_least_recently_read(tmp_path):
+    store = DiskCache(str(tmp_path / "small.sqlite3"), max_bytes=2000)
+    payload = {"text": "x" * 400}
+    for i in range(4):
+        store.set(f"k{i}", payload)
+    store._db.execute("UPDATE explanations SET accessed = 0 WHERE key = 'k0'")
+
+    store.set("k4", payload)  # Pushes the store over its limit
+
+    assert store.size <= 2000 * 0.9
+    assert store.get("k0") is None
+    assert store.get("k4") == payload
+    store.close()
+
+
+def test_store_survives_reopen(tmp_path):
+    path = str(tmp_path / "durable.sqlite3")
+    store = DiskCache(path, max_bytes=1024 * 1024)
+    store.set(content_key("Tides", "eli10", "fast"), {"text": "The moon pulls."})
+    store.close()
+
+    reopened = DiskCache(path, max_bytes=1024 * 1024)
+    assert reopened.get(content_key("tides", "eli10", "fast")) == {"text": "The moon pulls."}
+    assert reopened.size > 0
+    reopened.close()
+
+
+def test_size_limit_holds_across_workers(tmp_path):
+    # Each prefork worker opens its own connection to the same file
+    path = str(tmp_path / "shared.sqlite3")
+    workers = [DiskCache(path, max_bytes=2000) for _ in range(3)]
+    payload = {"text": "x" * 400}
+    for i in range(12):
+        workers[i % 3].set(f"k{i}", payload)
+
+    total = workers[0]._db.execute("SELECT SUM(size) FROM explanations").fetchone()[0]
+    assert total <= 2000
+    assert all(store.size == total for store in workers)
+    for store in workers:
+        store.close()
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import re
+import zipfile
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import routers.export
+from auth import verify_token
+from config import get_settings
+from main import app
+from services.cache import cache_set
+from services.rate_limit import rate_limiter
+from utils import topic_cache_key
+
+
+class FakeHistoryQuery:
+    """Just enough of the PostgREST builder for keyset pagination."""
+
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+        self.cursor = None
+        self.size = None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+
+    def or_(self, expr):
+        ts, row_id = re.match(r'created_at\.lt\."(.+?)",.*id\.lt\."(.+?)"', expr).groups()
+        self.cursor = (ts, row_id)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, size):
+        self.size = size
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+        if self.cursor:
+            rows = [r for r in rows if (r["created_at"], r["id"]) < self.cursor]
+        self.log.append(self.cursor)
+        return SimpleNamespace(data=rows[: self.size])
+
+
+@pytest.fixture
+def history(monkeypatch):
+    rows = [
+        {"id": f"{i:02d}", "user_id": "u1", "topic": f"Topic {i}", "levels": ["eli5", "eli10"],
+         "mode": "fast", "created_at": f"2026-01-{i:02d}T00:00:00"}
+        for i in range(1, 6)
+    ]
+    rows.append({"id": "99", "user_id": "other", "topic": "Secret", "levels": ["eli5"],
+                 "mode": "fast", "created_at": "2026-02-01T00:00:00"})
+    pages = []
+    supabase = SimpleNamespace(table=lambda name: FakeHistoryQuery(list(rows), pages))
+    monkeypatch.setattr(routers.export, "get_supabase_admin", lambda: supabase)
+    monkeypatch.setattr(get_settings(), "export_page_size", 2)
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    app.dependency_overrides[verify_token] = lambda: {"user": SimpleNamespace(id="u1"), "token": "t"}
+    yield pages
+    app.dependency_overrides.clear()
+
+
+def test_history_export_streams_zip_and_generates_only_missing(history, fake_redis, monkeypatch):
+    for i in range(1, 6):
+        asyncio.run(cache_set(topic_cache_key(f"Topic {i}", "eli5", "fast"), {"text": f"Cached {i}"}))
+    generated = []
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        generated.append((topic, level))
+        return f"Fresh {topic}"
+
+    monkeypatch.setattr(routers.export, "ensemble_generate", generate)
+
+    r = TestClient(app).get("/api/export/history?format=json")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    docs = [orjson.loads(archive.read(name)) for name in archive.namelist()]
+    assert [d["topic"] for d in docs] == [f"Topic {i}" for i in range(5, 0, -1)]
+    assert docs[0]["explanations"] == {"eli5": "Cached 5", "eli10": "Fresh Topic 5"}
+    assert sorted(generated) == [(f"Topic {i}", "eli10") for i in range(1, 6)]
+    # Three keyset pages of two rows: no offset scans, other users' rows never read
+    assert history == [None, ("2026-01-04T00:00:00", "04"), ("2026-01-02T00:00:00", "02")]
+
+
+def test_history_export_markdown_uses_cache_on_second_run(history, fake_redis, monkeypatch):
+    calls = []
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        calls.append(topic)
+        return f"About {topic}"
+
+    monkeypatch.setattr(routers.export, "ensemble_generate", generate)
+    client = TestClient(app)
+
+    client.get("/api/export/history")
+    r = client.get("/api/export/history")
+
+    assert len(calls) == 10
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    assert archive.namelist()[:2] == ["0001-topic-5.md", "0002-topic-4.md"]
+    text = archive.read("0001-topic-5.md").decode()
+    assert text.startswith("# Topic 5") and "## ELI-5" in text and "About Topic 5" in text
+
+
+def test_history_export_stops_generating_at_the_rate_limit(history, fake_redis, monkeypatch):
+    calls = []
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        calls.append(topic)
+        return f"About {topic}"
+
+    monkeypatch.setattr(routers.export, "ensemble_generate", generate)
+    monkeypatch.setattr(get_settings(), "rate_limit_per_user", 5)
+
+    r = TestClient(app).get("/api/export/history?format=json")
+
+    assert r.status_code == 200
+    # Two levels per topic: two topics fit in five tokens, the rest are not generated
+    assert len(calls) == 4
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    docs = [orjson.loads(archive.read(name)) for name in archive.namelist()]
+    assert len(docs) == 5
+    skipped = [d for d in docs if d["explanations"]["eli5"] == routers.export.NOT_GENERATED]
+    assert len(skipped) == 3
@@ -0,0 +1,126 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+from services import cache
+from services.cache import cache_get, cache_get_many, cache_set
+from services.hotkeys import CountMinSketch
+from utils import topic_cache_key
+
+
+def test_sketch_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=3)
+    for i in range(500):
+        sketch.add(f"key-{i % 50}")
+    assert all(sketch.estimate(f"key-{i}") >= 10 for i in range(50))
+    sketch.halve()
+    assert sketch.estimate("key-0") >= 5
+
+
+def test_trending_keeps_heaviest_keys(hot_keys):
+    hot_keys.k = 3
+    for i in range(10):
+        for _ in range(i + 1):
+            hot_keys.record(f"explanation:topic {i}:eli5")
+    trending = [key for key, _ in hot_keys.trending()]
+    assert trending == [f"explanation:topic {i}:eli5" for i in (9, 8, 7)]
+
+
+@pytest.mark.asyncio
+async def test_hot_key_is_served_locally(fake_redis, hot_keys):
+    hot_keys.threshold = 5
+    key = topic_cache_key("photosynthesis", "eli5", "fast")
+    await fake_redis.set(key, orjson.dumps({"text": "plants"}))
+
+    for _ in range(5):
+        assert await cache_get(key) == {"text": "plants"}
+    calls = fake_redis.calls
+    for _ in range(20):
+        assert await cache_get(key) == {"text": "plants"}
+    assert fake_redis.calls == calls
+
+    # A write through this worker drops the pin
+    await cache_set(key, {"text": "updated"})
+    assert await cache_get(key) == {"text": "updated"}
+
+
+@pytest.mark.asyncio
+async def test_new_hot_topic_pins_sibling_levels(fake_redis, hot_keys):
+    hot_keys.threshold = 3
+    key = topic_cache_key("photosynthesis", "eli5", "fast")
+    sibling = topic_cache_key("photosynthesis", "eli10", "fast")
+    await fake_redis.set(key, orjson.dumps({"text": "five"}))
+    await fake_redis.set(sibling, orjson.dumps({"text": "ten"}))
+
+    for _ in range(3):
+        await cache_get(key)
+    await asyncio.gather(*cache._refills)
+    calls = fake_redis.calls
+    assert await cache_get_many([key, sibling]) == [{"text": "five"}, {"text": "ten"}]
+    assert fake_redis.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_pin_expires(fake_redis, hot_keys):
+    hot_keys.threshold = 1
+    hot_keys.ttl = 0.0
+    key = topic_cache_key("tides", "eli5", "fast")
+    await fake_redis.set(key, orjson.dumps({"n": 1}))
+    await cache_get(key)
+    await asyncio.gather(*cache._refills)  # Sibling prefetch
+    calls = fake_redis.calls
+    assert await cache_get(key) == {"n": 1}
+    assert fake_redis.calls == calls + 1
+
+
+def test_hot_keys_endpoint(hot_keys, monkeypatch):
+    from config import get_settings
+    from main import app
+
+    hot_keys.threshold = 2
+    for _ in range(3):
+        hot_keys.record("explanation:viral:eli5")
+    hot_keys.record("explanation:quiet:eli5")
+    hot_keys.pin("explanation:viral:eli5", b"{}", hot_keys.version)
+
+    client = TestClient(app)
+    monkeypatch.setattr(get_settings(), "metrics_token", "")
+    assert client.get("/api/debug/hot-keys").status_code == 404  # Off unless a token is set
+    monkeypatch.setattr(get_settings(), "metrics_token", "secret")
+    assert client.get("/api/debug/hot-keys").status_code == 401
+
+    body = client.get("/api/debug/hot-keys", headers={"authorization": "Bearer secret"}).json()
+    assert [k["key"] for k in body["keys"]] == ["explanation:viral:eli5", "explanation:quiet:eli5"]
+    viral, quiet = body["keys"]
+    assert viral["hot"] and viral["pinned_for"] > 0
+    assert not quiet["hot"] and quiet["pinned_for"] == 0
+
+
+@pytest.mark.asyncio
+async def test_only_explanation_keys_are_tracked(fake_redis, hot_keys):
+    hot_keys.threshold = 1
+    viewer_key = "variants:seen:user:u1:photosynthesis:eli5:fast"
+    await fake_redis.set(viewer_key, orjson.dumps({"seen": []}))
+    for _ in range(3):
+        await cache_get(viewer_key)
+    await cache_get_many([viewer_key, "variants:photosynthesis:eli5:fast"])
+
+    assert hot_keys.trending() == [] and hot_keys.pins == {}
+
+
+@pytest.mark.asyncio
+async def test_read_overlapping_a_write_is_not_pinned(fake_redis, hot_keys):
+    hot_keys.threshold = 1
+    key = topic_cache_key("volcanoes", "eli5", "fast")
+    await fake_redis.set(key, orjson.dumps({"text": "old"}))
+    fake_redis.latency = 0.02
+
+    read = asyncio.ensure_future(cache_get(key))
+    await asyncio.sleep(0.005)  # GET in flight
+    await cache_set(key, {"text": "new"})
+    assert await read == {"text": "old"}
+
+    assert key not in hot_keys.pins
+    assert await cache_get(key) == {"text": "new"}
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import routers.query
+from main import app
+from services.cache import set_explanation
+from services.rate_limit import rate_limiter
+
+
+@pytest.fixture
+def client(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    return TestClient(app)
+
+
+def test_get_query_revalidates_from_metadata(client, fake_redis):
+    asyncio.run(set_explanation("Gravity", "eli5", "fast", {"text": "Things fall."}))
+    asyncio.run(set_explanation("Gravity", "eli10", "fast", {"text": "Mass attracts mass."}))
+
+    r = client.get("/api/query", params={"topic": "Gravity", "levels": "eli5,eli10"})
+    assert r.status_code == 200
+    assert r.json()["explanations"] == {"eli5": "Things fall.", "eli10": "Mass attracts mass."}
+    assert "stale-while-revalidate=" in r.headers["cache-control"]
+    etag = r.headers["etag"]
+
+    fake_redis.calls = 0
+    r = client.get(
+        "/api/query",
+        params=[("topic", "Gravity"), ("levels", "eli5"), ("levels", "eli10")],
+        headers={"If-None-Match": f"W/{etag}"},
+    )
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag
+    assert fake_redis.calls == 1  # One MGET of the ETag metadata; bodies untouched
+
+
+def test_etag_changes_with_content(client):
+    asyncio.run(set_explanation("Tides", "eli5", "fast", {"text": "The moon pulls."}))
+    old = client.get("/api/query", params={"topic": "Tides"}).headers["etag"]
+    asyncio.run(set_explanation("Tides", "eli5", "fast", {"text": "The moon and sun pull."}))
+
+    r = client.get("/api/query", params={"topic": "Tides"}, headers={"If-None-Match": old})
+    assert r.status_code == 200
+    assert r.headers["etag"] != old
+
+
+def test_failed_generation_is_not_cacheable(client, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("model down")
+
+    monkeypatch.setattr(routers.query, "ensemble_generate", fail)
+    r = client.get("/api/query", params={"topic": "Volcanoes"})
+    assert r.status_code == 200
+    assert r.headers["cache-control"] == "no-store"
+
+
+def test_query_passes_mode_to_model(client, monkeypatch):
+    modes = []
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        modes.append(mode)
+        return f"{topic} in {mode}"
+
+    monkeypatch.setattr(routers.query, "ensemble_generate", generate)
+    r = client.post("/api/query", json={"topic": "Auroras", "levels": ["eli5"], "mode": "deep_dive"})
+    assert r.json()["explanations"] == {"eli5": "Auroras in deep_dive"}
+    assert modes == ["deep_dive"]
+
+def test_signed_in_responses_stay_private(client, monkeypatch):
+    from types import SimpleNamespace
+    from auth import verify_token_optional
+
+    monkeypatch.setattr(routers.query, "_save_history_later", lambda *args: None)
+    asyncio.run(set_explanation("Comets", "eli5", "fast", {"text": "Dirty snowballs."}))
+    r = client.get("/api/query", params={"topic": "Comets"})
+    assert r.headers["cache-control"].startswith("public, ")
+    assert "Authorization" in r.headers["vary"]
+
+    app.dependency_overrides[verify_token_optional] = lambda: {"user": SimpleNamespace(id="u1"), "token": "t"}
+    try:
+        r = client.get("/api/query", params={"topic": "Comets"})
+    finally:
+        app.dependency_overrides.clear()
+    assert r.headers["cache-control"].startswith("private, ")
+    assert "Authorization" in r.headers["vary"]
+
+def test_pinned_has_cache_headers_and_304(client):
+    r = client.get("/api/pinned")
+    assert r.status_code == 200 and len(r.json()) > 0
+    assert r.headers["cache-control"].startswith("public, max-age=")
+    r = client.get("/api/pinned", headers={"If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
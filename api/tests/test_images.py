@@ -0,0 +1,134 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import services.images
+from main import app
+from services.disk_cache import DiskCache
+from services.images import register_image
+from services.search import search_service
+
+SOURCE = "https://images.example.org/big.png"
+
+
+def png(width, height):
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch, fake_redis):
+    """Image store in tmp_path and a pooled client that hits a fake upstream."""
+    fetched = []
+
+    def handler(request):
+        fetched.append(str(request.url))
+        if request.url.path == "/big.png":
+            return httpx.Response(200, content=png(2000, 1000), headers={"content-type": "image/png"})
+        if request.url.path.startswith("/moved"):
+            return httpx.Response(302, headers={"location": request.url.params["to"]})
+        return httpx.Response(200, content=b"<html>", headers={"content-type": "text/html"})
+
+    store = DiskCache(str(tmp_path / "images.sqlite3"), max_bytes=10 * 1024 * 1024, table="images")
+    monkeypatch.setattr(services.images, "_store", store)
+    monkeypatch.setattr(services.images, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    hosts = {"images.example.org": "93.184.216.34", "intranet.example.org": "10.0.0.7"}
+
+    async def resolve(host):
+        return [hosts[host]]
+
+    monkeypatch.setattr(services.images, "_resolve", resolve)
+    yield fetched
+    store.close()
+
+
+def test_proxy_resizes_caches_and_serves_immutable(upstream):
+    meta = asyncio.run(register_image(SOURCE, "Big"))
+    client = TestClient(app)
+
+    r = client.get(f"{meta['url']}?w=300")
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/webp"
+    assert "immutable" in r.headers["cache-control"]
+    assert Image.open(io.BytesIO(r.content)).size == (320, 160)  # Snapped up to a standard width
+
+    # Other widths reuse the stored original; repeats come from the store
+    assert client.get(f"{meta['url']}?w=640").status_code == 200
+    assert client.get(f"{meta['url']}?w=320").content == r.content
+    assert upstream == [SOURCE]
+
+    assert client.get(f"{meta['url']}?w=320", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+
+def test_proxy_only_serves_registered_images(upstream):
+    client = TestClient(app)
+    assert client.get(f"/api/images/{'0' * 32}").status_code == 404
+    assert client.get("/api/images/not-an-id").status_code == 422
+
+    meta = asyncio.run(register_image("https://images.example.org/page.html"))
+    assert client.get(meta["url"]).status_code == 404
+    assert upstream == ["https://images.example.org/page.html"]
+
+
+def test_proxy_follows_only_public_http_redirects(upstream):
+    client = TestClient(app)
+    moved = asyncio.run(register_image(f"https://images.example.org/moved?to={SOURCE}"))
+    assert client.get(moved["url"]).status_code == 200
+
+    for target in (
+        "http://127.0.0.1/admin.png",
+        "http://[::1]/admin.png",
+        "http://169.254.169.254/latest/meta-data",
+        "https://intranet.example.org/big.png",
+        "file:///etc/passwd",
+    ):
+        upstream.clear()
+        meta = asyncio.run(register_image(f"https://images.example.org/moved?to={target}"))
+        assert client.get(meta["url"]).status_code == 404, target
+        assert len(upstream) == 1, target  # The redirect itself is never fetched
+
+    upstream.clear()
+    loop = "https://images.example.org/moved?to=/moved?to=/moved?to=/moved?to=/big.png"
+    meta = asyncio.run(register_image(loop))
+    assert client.get(meta["url"]).status_code == 404
+    assert len(upstream) == services.images.MAX_REDIRECTS + 1
+
+def test_registration_survives_a_redis_outage(upstream, monkeypatch):
+    async def redis_down(key, value, ttl=None):
+        return False
+
+    monkeypatch.setattr(services.images, "cache_set", redis_down)
+    meta = asyncio.run(register_image(SOURCE))
+    assert meta["url"] == f"/api/images/{meta['id']}"
+    assert TestClient(app).get(meta["url"]).status_code == 200
+
+    # With no store either, link the original rather than a proxy URL that 404s
+    monkeypatch.setattr(services.images, "_store", None)
+    monkeypatch.setattr(services.images, "_store_failed", True)
+    assert asyncio.run(register_image(SOURCE))["url"] == SOURCE
+
+def test_concurrent_requests_share_one_fetch(upstream):
+    meta = asyncio.run(register_image(SOURCE))
+
+    async def main():
+        return await asyncio.gather(*(services.images.get_thumbnail(meta["id"], 160) for _ in range(5)))
+
+    thumbs = asyncio.run(main())
+    assert len(set(thumbs)) == 1
+    assert upstream == [SOURCE]
+
+
+def test_image_search_results_are_cached_in_redis(fake_redis):
+    first = asyncio.run(search_service.get_images("volcanoes"))
+    fake_redis.calls = 0
+    second = asyncio.run(search_service.get_images("volcanoes"))
+
+    assert second == first
+    assert all(image["url"].startswith("/api/images/") for image in first)
+    assert fake_redis.calls == 1
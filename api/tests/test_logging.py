@@ -0,0 +1,16 @@
+import logging_config
+from config import get_settings
+from logging_config import logger, setup_logging, shutdown_logging
+
+
+def test_cached_logger_follows_writer_restart(capsys, monkeypatch):
+    monkeypatch.setattr(get_settings(), "log_async", True)
+    setup_logging()
+    logger.info("first_writer")
+    # A second lifespan replaces the writer; the cached logger must follow it
+    setup_logging()
+    logger.info("second_writer")
+    shutdown_logging()
+    out = capsys.readouterr().out
+    assert "first_writer" in out and "second_writer" in out
+    assert logging_config._writer is None
@@ -0,0 +1,33 @@
+import pytest
+from metrics import Counter, Histogram, timed
+
+
+def test_histogram_exposition():
+    h = Histogram("test_latency_seconds", "Test latency.", ("op",), buckets=(0.1, 1.0))
+    h.labels("get").observe(0.05)
+    h.labels("get").observe(0.5)
+    text = h.render()
+    assert '# TYPE test_latency_seconds histogram' in text
+    assert 'test_latency_seconds_bucket{op="get",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{op="get",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{op="get"} 2' in text
+
+
+def test_counter_labels_are_cached():
+    c = Counter("test_requests_total", "Test requests.", ("status",))
+    assert c.labels("200") is c.labels("200")
+    c.labels("200").inc()
+    assert 'test_requests_total{status="200"} 1' in c.render()
+
+
+@pytest.mark.asyncio
+async def test_timed_decorator_observes_failures():
+    h = Histogram("test_timed_seconds", "Test timing.", ("op",))
+
+    @timed(h, "boom")
+    async def boom():
+        raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        await boom()
+    assert h.labels("boom").count == 1
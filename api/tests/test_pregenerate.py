@@ -0,0 +1,52 @@
+import orjson
+import pytest
+
+from mocks.provider import MockProvider
+from pregenerate import load_checkpoint, pregenerate, read_topics
+from services.cache import cache_set, get_explanation
+from utils import topic_cache_key
+
+
+def _records(path):
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_generates_every_level_and_fills_cache(fake_redis, tmp_path):
+    out = tmp_path / "results.jsonl"
+    provider = MockProvider()
+    topics = read_topics(["Gravity", "# comment", "", "Tides", "Gravity", "<bad>"])
+
+    progress = await pregenerate(topics, str(out), levels=["eli5", "eli10"], generate=provider.generate)
+
+    assert progress.generated == 4 and progress.failed == 0
+    assert provider.calls == 4
+    assert {(r["topic"], r["level"]) for r in _records(out)} == {
+        ("Gravity", "eli5"), ("Gravity", "eli10"), ("Tides", "eli5"), ("Tides", "eli10"),
+    }
+    cached = await get_explanation("Tides", "eli10", "fast")
+    assert cached["text"].startswith("Tides (eli10)")
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_output_and_skips_cached(fake_redis, tmp_path):
+    out = tmp_path / "results.jsonl"
+    # A previous run finished one pair, failed one, and crashed mid-line
+    out.write_bytes(
+        orjson.dumps({"topic": "Gravity", "level": "eli5", "text": "x"}) + b"\n"
+        + orjson.dumps({"topic": "Gravity", "level": "eli10", "error": "boom"}) + b"\n"
+        + b'{"topic": "Tides", "lev'
+    )
+    await cache_set(topic_cache_key("Tides", "eli5", "fast"), {"text": "The moon pulls."})
+    provider = MockProvider()
+
+    progress = await pregenerate(
+        ["Gravity", "Tides"], str(out), levels=["eli5", "eli10"], generate=provider.generate
+    )
+
+    assert progress.total == 3
+    assert (progress.generated, progress.cached) == (2, 1)
+    assert provider.calls == 2
+    assert load_checkpoint(str(out)) == {
+        ("gravity", "eli5"), ("gravity", "eli10"), ("tides", "eli5"), ("tides", "eli10"),
+    }
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import routers.query
+from auth import verify_token_optional
+from main import app
+from services.cache import cache_set
+from services.rate_limit import rate_limiter
+from utils import topic_cache_key
+
+
+@pytest.fixture
+def client(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    app.dependency_overrides[verify_token_optional] = lambda: {"user": SimpleNamespace(id="tool"), "token": "t"}
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_batch_streams_misses_in_completion_order(client, fake_redis, monkeypatch):
+    asyncio.run(cache_set(topic_cache_key("Gravity", "eli5", "fast"), {"text": "Things fall."}))
+    delays = {"Slow topic": 0.2, "Fast topic": 0.0}
+    generated = []
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        assert mode == "fast"
+        generated.append((topic, level))
+        await asyncio.sleep(delays[topic])
+        return f"{topic} at {level}"
+
+    monkeypatch.setattr(routers.query, "ensemble_generate", generate)
+
+    r = client.post("/api/query/batch", json={"items": [
+        {"topic": "Slow topic"},
+        {"topic": "Gravity", "levels": ["eli5"]},
+        {"topic": "Fast topic", "levels": ["eli5", "eli10"]},
+        {"topic": "<script>"},
+    ]})
+
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in r.content.splitlines()]
+    assert [line["index"] for line in lines] == [3, 1, 2, 0]
+    assert "error" in lines[0]
+    assert lines[1] == {"index": 1, "topic": "Gravity", "explanations": {"eli5": "Things fall."}, "cached": True}
+    assert lines[2]["explanations"] == {"eli5": "Fast topic at eli5", "eli10": "Fast topic at eli10"}
+    assert ("Gravity", "eli5") not in generated
+
+
+def test_batch_lookup_is_one_round_trip(client, fake_redis, monkeypatch):
+    for topic in ("A", "B", "C"):
+        asyncio.run(cache_set(topic_cache_key(topic, "eli5", "fast"), {"text": topic}))
+    fake_redis.calls = 0
+
+    r = client.post("/api/query/batch", json={"items": [{"topic": t} for t in ("A", "B", "C")]})
+
+    assert len(r.content.splitlines()) == 3
+    assert fake_redis.calls == 1  # One MGET, no per-key GETs
+
+
+def test_batch_rejects_oversized_requests(client, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "batch_max_items", 2)
+    r = client.post("/api/query/batch", json={"items": [{"topic": "A"}] * 3})
+    assert r.status_code == 400
+
+
+def test_batch_charges_rate_limit_per_generation(client, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_per_user", 5)
+
+    async def generate(topic, level, premium=False, mode="ensemble"):
+        return f"{topic} at {level}"
+
+    monkeypatch.setattr(routers.query, "ensemble_generate", generate)
+    # More generations than the caller may ever make in a window
+    items = [{"topic": t} for t in ("A", "B", "C", "D", "E", "F")]
+    assert client.post("/api/query/batch", json={"items": items}).status_code == 400
+
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    items = [{"topic": t, "levels": ["eli5", "eli10"]} for t in ("One", "Two")]
+    assert client.post("/api/query/batch", json={"items": items}).status_code == 200
+    assert rate_limiter.buckets["user:tool"].pending == 4  # One token per generated explanation
+    # One token left; this batch needs two
+    items = [{"topic": "Three", "levels": ["eli5", "eli10"]}]
+    assert client.post("/api/query/batch", json={"items": items}).status_code == 429
+
+
+def test_batch_requires_authentication(fake_redis, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    r = TestClient(app).post("/api/query/batch", json={"items": [{"topic": "A"}]})
+    assert r.status_code == 401
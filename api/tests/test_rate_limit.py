@@ -1,31 +1,96 @@
 import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock, patch
 from main import app
+from services.rate_limit import HybridRateLimiter
+
+
+def _request(host="1.2.3.4"):
+    request = MagicMock()
+    request.client.host = host
+    return request
+
+
+def test_query_route_is_rate_limited(fake_redis, monkeypatch):
+    from config import get_settings
+    from services.rate_limit import rate_limiter
+    monkeypatch.setattr(get_settings(), "rate_limit_per_user", 1)
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+
+    client = TestClient(app)
+    assert client.post("/api/query", json={"topic": "Photosynthesis"}).status_code == 200
+    assert client.post("/api/query", json={"topic": "Photosynthesis"}).status_code == 429
+    # Routes outside the query router are not limited
+    assert client.get("/api/pinned").status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_local_bucket_limits_without_redis(monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_per_user", 3)
+    limiter = HybridRateLimiter()
+
+    for _ in range(3):
+        await limiter.check(_request(), None)
+    with pytest.raises(HTTPException) as excinfo:
+        await limiter.check(_request(), None)
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
+
+    # Other callers have their own bucket
+    await limiter.check(_request("5.6.7.8"), None)
 
-client = TestClient(app)
-
-def test_rate_limit_dependency_exists():
-    # Verify that the query router has the rate limiter dependency
-    # This avoids needing a running Redis instance for a meaningful unit test of the rate limiter's mechanics
-    # which is better suited for integration tests.
-    
-    # Introspect the app routes to find /api/query
-    query_route = None
-    for route in app.routes:
-        if getattr(route, "path", "") == "/api/query":
-            query_route = route
-            break
-            
-    # Depending on how it's mounted, it might be nested.
-    # But since we added dependencies at include_router, they wrap the routes.
-    # Let's check via hitting the endpoint without Redis - it should fail or error cleanly depending on startup.
-    # Since we can't easily mock the lifespan startup in TestClient without async wrappers or override_settings.
-    pass
 
 @pytest.mark.asyncio
-async def test_rate_limit_config():
-    # Check if rate limit is applied
-    with patch("api.main.FastAPILimiter") as mock_limiter:
-         # Just verify imports and configuration logic doesn't crash
-         assert True
+async def test_pro_users_get_multiplied_limit(monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "rate_limit_per_user", 2)
+    monkeypatch.setattr(get_settings(), "rate_limit_pro_multiplier", 5)
+    limiter = HybridRateLimiter()
+    with patch("services.rate_limit.check_is_pro", AsyncMock(return_value=True)):
+        await limiter._refresh_pro("u1")
+    assert limiter.limit_for("u1") == 10
+    assert limiter.limit_for(None) == 2
+
+
+def test_prune_drops_expired_pro_lookups():
+    limiter = HybridRateLimiter()
+    limiter._pro = {"gone": (True, 0.0), "fresh": (True, float("inf"))}
+    limiter.prune()
+    assert list(limiter._pro) == ["fresh"]
+
+@pytest.mark.asyncio
+async def test_sync_applies_global_usage(fake_redis, monkeypatch):
+    async def fake_eval(script, numkeys, *args):
+        keys, argv = args[:numkeys], args[numkeys:]
+        totals = []
+        for key, used in zip(keys, argv[1:]):
+            total = int(fake_redis.data.get(key, 0)) + int(used)
+            fake_redis.data[key] = total
+            totals.append(total)
+        return totals
+
+    fake_redis.eval = fake_eval
+    limiter = HybridRateLimiter()
+    assert limiter.allow("ip:a", 5)[0]
+
+    # Another worker already used four requests for this caller in this window
+    bucket = limiter.buckets["ip:a"]
+    fake_redis.data[f"rl:ip:a:{bucket.window}"] = 4
+    await limiter.sync()
+    assert bucket.pending == 0
+    assert bucket.remote_used == 5
+    assert limiter.allow("ip:a", 5)[0] is False
+
+
+@pytest.mark.asyncio
+async def test_sync_failure_keeps_pending_usage(fake_redis):
+    async def broken_eval(*args):
+        raise ConnectionError("redis down")
+
+    fake_redis.eval = broken_eval
+    limiter = HybridRateLimiter()
+    limiter.allow("ip:a", 5)
+    await limiter.sync()
+    assert limiter.buckets["ip:a"].pending == 1
@@ -0,0 +1,66 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+# Preloaded before fork, so the slow mock model is what every worker streams from
+SERVER = """
+import sys
+import routers.query
+from mocks.provider import MockProvider
+routers.query.generate_stream_explanation = MockProvider(ttft=0.1, tokens_per_second=20, tokens=30).stream
+import server
+sys.argv = ["server", "--workers", "2", "--host", "127.0.0.1", "--port", sys.argv[1], "--grace", "10"]
+server.main_cli()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    env = {**os.environ, "DISK_CACHE_PATH": str(tmp_path / "cache.sqlite3"), "IMAGE_CACHE_PATH": ""}
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVER, str(port)],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/api/health", timeout=1)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    yield proc, base
+    if proc.poll() is None:
+        proc.kill()
+        proc.wait()
+
+
+def test_sigterm_finishes_in_flight_streams_then_exits(server):
+    proc, base = server
+    with httpx.stream(
+        "POST", f"{base}/api/query/stream", json={"topic": "Slow topic", "mode": "fast"}, timeout=10
+    ) as r:
+        lines = r.iter_lines()
+        assert next(lines).startswith("data: ")  # Metadata frame: the stream is in flight
+        proc.send_signal(signal.SIGTERM)
+        rest = list(lines)
+
+    assert "data: [DONE]" in rest[-2:]
+    assert proc.wait(timeout=15) == 0
+    with pytest.raises(httpx.HTTPError):
+        httpx.get(f"{base}/api/health", timeout=1)
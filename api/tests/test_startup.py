@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import orjson
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generous enough for a loaded CI box; override with STARTUP_IMPORT_BUDGET (seconds)
+IMPORT_BUDGET = float(os.environ.get("STARTUP_IMPORT_BUDGET", "1.5"))
+
+# Heavy dependencies that should only load on first use
+LAZY_MODULES = ("supabase", "fpdf", "markdown", "redis.asyncio", "google.genai", "groq", "httpx", "PIL")
+
+SCRIPT = f"""
+import sys, time, orjson
+t = time.perf_counter()
+import main
+elapsed = time.perf_counter() - t
+print(orjson.dumps({{"elapsed": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}).decode())
+"""
+
+
+def _import_main() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=API_DIR, capture_output=True, text=True, check=True
+    )
+    return orjson.loads(proc.stdout.splitlines()[-1])
+
+
+def test_import_main_within_budget():
+    # Best of three so one slow run on a busy machine doesn't fail the suite
+    elapsed = min(_import_main()["elapsed"] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f"import main took {elapsed:.2f}s (budget {IMPORT_BUDGET}s)"
+
+
+def test_heavy_dependencies_not_imported_at_startup():
+    assert _import_main()["loaded"] == []
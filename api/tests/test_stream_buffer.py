@@ -0,0 +1,132 @@
+import asyncio
+import pytest
+import metrics
+from services import stream_buffer
+from services.stream_buffer import parse_event_id, replay, start_stream, stream_exists
+
+
+async def _tokens(n, delay=0.0):
+    for i in range(n):
+        await asyncio.sleep(delay)
+        yield f"t{i} "
+
+
+def test_parse_event_id():
+    sid = "a" * 32
+    assert parse_event_id(f"{sid}:7") == (sid, 7)
+    assert parse_event_id("garbage") is None
+    assert parse_event_id(None) is None
+
+
+@pytest.mark.asyncio
+async def test_resume_from_last_event_id(fake_redis):
+    completed = []
+
+    async def on_complete(content):
+        completed.append(content)
+
+    buf = await start_stream(_tokens(5, 0.01), on_complete, cache_key="explanation:x:eli5")
+
+    # First connection reads two events, then drops
+    first = []
+    async for seq, event in replay(buf.stream_id):
+        first.append(seq)
+        if seq == 2:
+            break
+
+    resumed = [(seq, event) async for seq, event in replay(buf.stream_id, after=2)]
+    assert [seq for seq, _ in resumed] == [3, 4, 5, 6]
+    assert resumed[-1][1] == {"done": True}
+
+    await asyncio.sleep(0)
+    assert completed == ["t0 t1 t2 t3 t4 "]
+
+
+@pytest.mark.asyncio
+async def test_partial_generation_fills_cache_without_consumers(fake_redis):
+    completed = []
+
+    async def on_complete(content):
+        completed.append(content)
+
+    await start_stream(_tokens(3), on_complete)
+    await asyncio.gather(*stream_buffer._tasks)
+    assert completed == ["t0 t1 t2 "]
+
+
+@pytest.mark.asyncio
+async def test_replay_from_redis_on_another_worker(fake_redis):
+    async def on_complete(content):
+        pass
+
+    buf = await start_stream(_tokens(3), on_complete)
+    await asyncio.gather(*stream_buffer._tasks)
+
+    # Simulate a reconnect that lands on a worker without the local buffer
+    stream_buffer._buffers.pop(buf.stream_id)
+    assert await stream_exists(buf.stream_id)
+    events = [event async for _, event in replay(buf.stream_id, after=1)]
+    assert events == [{"chunk": "t1 "}, {"chunk": "t2 "}, {"done": True}]
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_cancelled(fake_redis, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "stream_disconnect_grace", 0.0)
+    closed = []
+    completed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield "t "
+        finally:
+            closed.append(True)
+
+    async def on_complete(content):
+        completed.append(content)
+
+    buf = await start_stream(endless(), on_complete, cache_key="explanation:y:eli5")
+    events = replay(buf.stream_id)
+    await events.__anext__()
+    await events.aclose()
+
+    await asyncio.wait([buf.task], timeout=1)
+    assert buf.task.cancelled()
+    assert closed == [True]
+    assert completed == []
+    assert not await stream_exists(buf.stream_id)
+    assert metrics.streams_cancelled.labels().value >= 1
+
+
+@pytest.mark.asyncio
+async def test_fill_cache_policy_keeps_generating(fake_redis, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "stream_disconnect_grace", 0.0)
+    monkeypatch.setattr(get_settings(), "stream_fill_cache_on_disconnect", True)
+    completed = []
+
+    async def on_complete(content):
+        completed.append(content)
+
+    buf = await start_stream(_tokens(3, 0.01), on_complete)
+    events = replay(buf.stream_id)
+    await events.__anext__()
+    await events.aclose()
+
+    await buf.task
+    assert completed == ["t0 t1 t2 "]
+
+
+def test_resume_header_passes_cors_preflight():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    r = TestClient(app).options("/api/query/stream", headers={
+        "Origin": "https://app.example.com",
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type, last-event-id",
+    })
+    assert r.status_code == 200
+    assert "last-event-id" in r.headers["access-control-allow-headers"].lower()
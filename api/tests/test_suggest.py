@@ -0,0 +1,99 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from services.cache import cache_set
+from services.suggest import POPULARITY_KEY, TOP_K, TopicIndex, topic_index
+from utils import sanitize_topic, topic_cache_key
+
+
+def test_prefix_ranking_follows_popularity():
+    index = TopicIndex()
+    for topic in ("Photosynthesis", "Photons", "Photography", "Physics"):
+        index.add(topic, 1.0)
+    index.record("photons")
+    index.record("Photons")
+    index.record("photography")
+
+    assert index.suggest("pho") == ["photons", "photography", "photosynthesis"]
+    assert index.suggest("PH")[0] == "photons"
+    assert index.suggest("xyz") == []
+
+
+def test_top_lists_stay_bounded_and_correct():
+    index = TopicIndex()
+    for i in range(50):
+        index.add(f"topic {i:02d}", float(i))
+    index.record("topic 00", 100)
+
+    top = index.suggest("topic", limit=TOP_K)
+    assert len(top) == TOP_K
+    assert top[0] == "topic 00"
+    assert top[1:] == [f"topic {i:02d}" for i in range(49, 40, -1)]
+
+
+def test_one_off_queries_are_not_offered(monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "suggest_min_popularity", 3.0)
+    index = TopicIndex()
+    index.record("my landlord's unpaid deposit")
+    index.record("tides")
+    assert index.suggest("my") == [] and index.suggest("tid") == []
+
+    index.record("tides")
+    index.record("tides")
+    assert index.suggest("tid") == ["tides"]
+
+
+@pytest.mark.asyncio
+async def test_sync_keeps_unpopular_topics_out_and_evicts_past_cap(fake_redis, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "suggest_min_popularity", 2.0)
+    monkeypatch.setattr(get_settings(), "suggest_max_topics", 20)
+    await fake_redis.zincrby(POPULARITY_KEY, 1, "rarely asked")
+    index = TopicIndex()
+    index.load_pinned()
+    for i in range(30):
+        index.add(f"topic {i:02d}", float(i + 2))
+
+    await index.sync()
+
+    assert index.suggest("rarely") == []
+    assert len(index) <= 20
+    assert "Photosynthesis" in index.suggest("photo")  # Pinned topics are never evicted
+    assert index.suggest("topic 29") == ["topic 29"]
+    assert index.suggest("topic 00") == []
+
+@pytest.mark.asyncio
+async def test_build_loads_pinned_cached_and_global_popularity(fake_redis, monkeypatch):
+    from config import get_settings
+    monkeypatch.setattr(get_settings(), "suggest_min_popularity", 3.0)
+    monkeypatch.setattr("services.suggest.SYNC_TOP_N", 1)  # Only the keyspace scan can find the rest
+    rust = sanitize_topic("Rust's borrow checker")
+    await cache_set(topic_cache_key(rust, "eli5", "fast"), {"text": "x"})
+    await cache_set(topic_cache_key("my one-off question", "eli5", "fast"), {"text": "x"})
+    await fake_redis.zincrby(POPULARITY_KEY, 3, rust.lower())
+    await fake_redis.zincrby(POPULARITY_KEY, 1, "my one-off question")
+    await fake_redis.zincrby(POPULARITY_KEY, 5, "plate tectonics")
+    index = TopicIndex()
+
+    await index.build()
+
+    assert "Photosynthesis" in index.suggest("photo")  # Pinned, original casing
+    assert index.suggest("rust") == ["rust's borrow checker"]
+    assert index.suggest("my") == []  # Cached, but asked too rarely to offer to others
+    assert index.suggest("plate") == ["plate tectonics"]
+
+    index.record("gravity")
+    await index.sync()
+    assert await fake_redis.zrevrange(POPULARITY_KEY, 0, 0) == [b"plate tectonics"]
+    assert dict(await fake_redis.zrevrange(POPULARITY_KEY, 0, -1, withscores=True))[b"gravity"] == 1
+
+
+def test_suggest_endpoint(fake_redis):
+    from main import app
+
+    topic_index.load_pinned()
+    r = TestClient(app).get("/api/topics/suggest", params={"q": "black", "limit": 3})
+    assert r.status_code == 200
+    assert r.json() == {"query": "black", "suggestions": ["Black Holes"]}
+    assert r.headers["cache-control"].startswith("public")
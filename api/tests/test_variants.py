@@ -0,0 +1,108 @@
+import asyncio
+import itertools
+
+import pytest
+
+import services.variants
+from services.cache import cache_set
+from services.variants import take_variant
+from utils import topic_cache_key
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    """Each generation returns a new, distinct answer."""
+    counter = itertools.count(1)
+    calls = []
+
+    async def generate(topic, level, mode, temperature):
+        calls.append(topic)
+        return f"{topic} take #{next(counter)}"
+
+    monkeypatch.setattr(services.variants, "_generate", generate)
+    return calls
+
+
+async def _drain_fills():
+    while services.variants._tasks:
+        await asyncio.gather(*list(services.variants._tasks))
+
+
+@pytest.mark.asyncio
+async def test_empty_pool_misses_then_fills_in_background(fake_redis, fake_model):
+    assert await take_variant("Gravity", "eli5", "fast", "user:1") is None
+    await _drain_fills()
+    assert len(fake_model) == 3
+
+    served = [await take_variant("Gravity", "eli5", "fast", "user:1") for _ in range(3)]
+    assert len(set(served)) == 3
+    assert len(fake_model) == 3  # Rotation is served from the pool
+    assert await take_variant("Gravity", "eli5", "fast", "user:1") is None
+
+
+@pytest.mark.asyncio
+async def test_viewers_rotate_independently_and_skip_primary(fake_redis, fake_model):
+    await take_variant("Tides", "eli10", "fast", "user:1")
+    await _drain_fills()
+    # The explanation already on screen is not offered as a "new" variant
+    await cache_set(topic_cache_key("Tides", "eli10", "fast"), {"text": "Tides take #1"})
+
+    assert await take_variant("Tides", "eli10", "fast", "user:2") == "Tides take #2"
+    assert await take_variant("Tides", "eli10", "fast", "user:3") == "Tides take #2"
+
+
+@pytest.mark.asyncio
+async def test_fill_outlives_request_deadline(fake_redis, monkeypatch):
+    import deadline
+    calls = []
+
+    async def slow_generate(topic, level, mode, temperature):
+        calls.append(topic)
+        await asyncio.sleep(0.03)
+        return f"{topic} take #{len(calls)}"
+
+    monkeypatch.setattr(services.variants, "_generate", slow_generate)
+    token = deadline.start(0.02)
+    try:
+        assert await take_variant("Comets", "eli5", "fast", "user:1") is None
+    finally:
+        deadline.reset(token)
+    await _drain_fills()
+
+    # The request budget ran out after the first generation; the fill must not care
+    assert len(calls) == 3
+    pool = await services.variants._load_pool(services.variants._pool_key("Comets", "eli5", "fast"))
+    assert len(pool) == 3
+
+
+def test_regenerate_stream_skips_primary_answer(fake_redis, fake_model, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import routers.query
+    from main import app
+    from services.cache import set_explanation
+    from services.rate_limit import rate_limiter
+
+    monkeypatch.setattr(rate_limiter, "buckets", {})
+    asyncio.run(set_explanation("Gravity", "eli5", "fast", {"text": "Primary answer"}))
+
+    async def stream(topic, level, mode, temperature, regenerate):
+        assert regenerate
+        yield "Fresh answer"
+
+    started = []
+    real_start = routers.query.start_stream
+
+    async def start_stream(source, on_complete, cache_key=None):
+        started.append(cache_key)
+        return await real_start(source, on_complete, cache_key=cache_key)
+
+    monkeypatch.setattr(routers.query, "generate_stream_explanation", stream)
+    monkeypatch.setattr(routers.query, "start_stream", start_stream)
+    r = TestClient(app).post(
+        "/api/query/stream", json={"topic": "Gravity", "levels": ["eli5"], "mode": "fast", "regenerate": True}
+    )
+
+    assert "Fresh answer" in r.text and "Primary answer" not in r.text
+    # Not registered as the primary generation, so normal requests can't join it
+    assert started == [None]
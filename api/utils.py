@@ -3,6 +3,8 @@
 import re
 import html
 
+from prompts import PROMPT_VERSION
+
 MAX_TOPIC_LENGTH = 200
 ALLOWED_PATTERN = re.compile(r"^[\w\s\-.,!?'\"()]+$", re.UNICODE)
 
@@ -19,3 +21,19 @@ def sanitize_topic(topic: str) -> str:
     return html.escape(topic)
 
 
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a sanitized topic for use in cache keys."""
+    return " ".join(topic.lower().split())
+
+
+def topic_cache_key(topic: str, level: str, mode: str) -> str:
+    """
+    Cache key for a topic explanation at a given level and mode.
+
+    Carries the prompt version like the disk store's content key, so a
+    prompt change misses instead of serving stale answers. The level is
+    the last field, so sibling levels share everything before it.
+    """
+    return f"explanation:v{PROMPT_VERSION}:{mode}:{normalize_topic(topic)}:{level}"
@@ -45,6 +45,25 @@ export async function getPinnedTopics(): Promise<PinnedTopic[]> {
     return fetchAPI('/api/pinned')
 }
 
+export async function suggestTopics(q: string, signal?: AbortSignal): Promise<string[]> {
+    // Unauthenticated and cacheable, so skip fetchAPI's session lookup
+    const res = await fetch(`${API_URL}/api/topics/suggest?q=${encodeURIComponent(q)}`, { signal })
+    if (!res.ok) return []
+    const data: { suggestions: string[] } = await res.json()
+    return data.suggestions
+}
+
+// Widths the image proxy renders; keep in sync with IMAGE_WIDTHS in api/services/images.py
+export const IMAGE_WIDTHS = [160, 320, 640, 1024, 1600]
+
+export function isProxiedImage(src: string): boolean {
+    return src.startsWith('/api/images/')
+}
+
+export function imageUrl(src: string, width: number): string {
+    return `${API_URL}${src}?w=${width}`
+}
+
 export async function queryTopic(req: QueryRequest): Promise<QueryResponse> {
     return fetchAPI('/api/query', {
         method: 'POST',
@@ -52,67 +71,91 @@ export async function queryTopic(req: QueryRequest): Promise<QueryResponse> {
     })
 }
 
+const STREAM_MAX_RESUMES = 3
+
 export async function queryTopicStream(
     req: QueryRequest,
     onChunk: (chunk: string) => void,
     onDone: (data: any) => void,
     onError: (err: any) => void,
-    signal?: AbortSignal
+    signal?: AbortSignal,
+    onReset?: () => void
 ) {
     const { data: { session } } = await supabase.auth.getSession()
-    const headers: HeadersInit = {
+    const headers: Record<string, string> = {
         'Content-Type': 'application/json',
     }
     if (session?.access_token) {
         headers['Authorization'] = `Bearer ${session.access_token}`
     }
 
-    try {
-        const response = await fetch(`${API_URL}/api/query/stream`, {
-            method: 'POST',
-            headers,
-            body: JSON.stringify(req),
-            signal,
-        })
-
-        if (!response.ok) throw new Error(`API error: ${response.status}`)
-
-        const reader = response.body?.getReader()
-        const decoder = new TextDecoder()
-
-        if (!reader) throw new Error('ReadableStream not supported')
-
-        let buffer = ''
-        while (true) {
-            const { done, value } = await reader.read()
-            if (done) break
-
-            buffer += decoder.decode(value, { stream: true })
-            const lines = buffer.split('\n')
-            buffer = lines.pop() || ''
-
-            for (const line of lines) {
-                if (line.startsWith('data: ')) {
-                    const data = line.slice(6)
-                    if (data === '[DONE]') {
-                        onDone({})
-                        continue
-                    }
-                    try {
-                        const parsed = JSON.parse(data)
-                        if (parsed.chunk) {
-                            onChunk(parsed.chunk)
-                        } else if (parsed.error) {
-                            onError(new Error(parsed.error))
+    // Last SSE event id seen; sent back on reconnect so the server resumes its buffer
+    let lastEventId: string | null = null
+    let finished = false
+
+    for (let attempt = 0; ; attempt++) {
+        try {
+            const response = await fetch(`${API_URL}/api/query/stream`, {
+                method: 'POST',
+                headers: lastEventId ? { ...headers, 'Last-Event-ID': lastEventId } : headers,
+                body: JSON.stringify(req),
+                signal,
+            })
+
+            if (!response.ok) throw new Error(`API error: ${response.status}`)
+
+            const reader = response.body?.getReader()
+            const decoder = new TextDecoder()
+
+            if (!reader) throw new Error('ReadableStream not supported')
+
+            let buffer = ''
+            while (true) {
+                const { done, value } = await reader.read()
+                if (done) break
+
+                buffer += decoder.decode(value, { stream: true })
+                const lines = buffer.split('\n')
+                buffer = lines.pop() || ''
+
+                for (const line of lines) {
+                    if (line.startsWith('id: ')) {
+                        lastEventId = line.slice(4)
+                    } else if (line.startsWith('data: ')) {
+                        const data = line.slice(6)
+                        if (data === '[DONE]') {
+                            finished = true
+                            onDone({})
+                            continue
+                        }
+                        try {
+                            const parsed = JSON.parse(data)
+                            if (parsed.chunk) {
+                                onChunk(parsed.chunk)
+                            } else if (parsed.reset) {
+                                lastEventId = null
+                                onReset?.()
+                            } else if (parsed.error) {
+                                finished = true
+                                onError(new Error(parsed.error))
+                            }
+                        } catch (e) {
+                            console.error('Failed to parse stream chunk', e)
                         }
-                    } catch (e) {
-                        console.error('Failed to parse stream chunk', e)
                     }
                 }
             }
+            if (finished) return
+            throw new Error('Stream ended unexpectedly')
+        } catch (err: any) {
+            if (finished) return
+            if (err?.name === 'AbortError' || attempt >= STREAM_MAX_RESUMES) {
+                onError(err)
+                return
+            }
+            // Without an event id there is nothing to resume from; start over
+            if (!lastEventId) onReset?.()
         }
-    } catch (err) {
-        onError(err)
     }
 }
 
@@ -1,4 +1,5 @@
 import { useState } from 'react'
+import { IMAGE_WIDTHS, imageUrl, isProxiedImage } from '../api'
 
 interface SafeImageProps {
     src: string
@@ -16,14 +17,20 @@ export default function SafeImage({ src, alt }: SafeImageProps) {
         )
     }
 
+    // Proxied images come resized from our server; let the browser pick a width
+    const proxied = isProxiedImage(src)
+
     return (
         <div className="my-6 flex flex-col items-center gap-2">
             <img
-                src={src}
+                src={proxied ? imageUrl(src, 640) : src}
+                srcSet={proxied ? IMAGE_WIDTHS.map((w) => `${imageUrl(src, w)} ${w}w`).join(', ') : undefined}
+                sizes={proxied ? '(max-width: 768px) 100vw, 768px' : undefined}
                 alt={alt}
                 onError={() => setError(true)}
                 className="rounded-xl border border-white/10 max-w-full h-auto shadow-2xl transition-transform hover:scale-[1.02]"
                 loading="lazy"
+                decoding="async"
             />
             {alt && alt !== 'Image' && (
                 <span className="text-xs text-gray-500 italic">{alt}</span>
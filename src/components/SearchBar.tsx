@@ -2,6 +2,9 @@ import { useState, useRef, useEffect } from 'react'
 import { Search, Loader2, Sparkles } from 'lucide-react'
 import type { Mode } from '../types'
 import ModeDropdown from './ModeDropdown'
+import { suggestTopics } from '../api'
+
+const SUGGEST_DEBOUNCE_MS = 120
 
 interface SearchBarProps {
     onSearch: (topic: string) => void
@@ -15,6 +18,7 @@ export default function SearchBar({ onSearch, loading, mode, onModeChange, value
     const [topic, setTopic] = useState(value)
     const [isFocused, setIsFocused] = useState(false)
     const [placeholder, setPlaceholder] = useState("What passes for knowledge...?")
+    const [suggestions, setSuggestions] = useState<string[]>([])
 
     useEffect(() => {
         setTopic(value)
@@ -35,6 +39,25 @@ export default function SearchBar({ onSearch, loading, mode, onModeChange, value
     }, [])
     const inputRef = useRef<HTMLInputElement>(null)
 
+    // Offer topics we already have cached while the user types
+    useEffect(() => {
+        const q = topic.trim()
+        if (!isFocused || q.length < 2) {
+            setSuggestions([])
+            return
+        }
+        const controller = new AbortController()
+        const timer = setTimeout(() => {
+            suggestTopics(q, controller.signal)
+                .then((items) => setSuggestions(items.filter((s) => s.toLowerCase() !== q.toLowerCase())))
+                .catch(() => { })
+        }, SUGGEST_DEBOUNCE_MS)
+        return () => {
+            clearTimeout(timer)
+            controller.abort()
+        }
+    }, [topic, isFocused])
+
     useEffect(() => {
         const handleKeyDown = (e: KeyboardEvent) => {
             if (e.key === '/' && !isFocused) {
@@ -94,6 +117,27 @@ export default function SearchBar({ onSearch, loading, mode, onModeChange, value
                         )}
                     </button>
                 </div>
+                {suggestions.length > 0 && !loading && (
+                    <ul className="absolute left-0 right-0 mt-2 bg-dark-800 border border-dark-600 rounded-xl shadow-xl overflow-hidden">
+                        {suggestions.map((s) => (
+                            <li key={s}>
+                                <button
+                                    type="button"
+                                    // mousedown fires before the input's blur hides the list
+                                    onMouseDown={(e) => {
+                                        e.preventDefault()
+                                        setTopic(s)
+                                        setSuggestions([])
+                                        onSearch(s)
+                                    }}
+                                    className="w-full text-left px-4 py-2 text-gray-300 hover:bg-dark-700 hover:text-white transition-colors"
+                                >
+                                    {s}
+                                </button>
+                            </li>
+                        ))}
+                    </ul>
+                )}
             </form>
 
             {/* Mobile Mode Selection (visible only on small screens, outside search bar for better space) */}
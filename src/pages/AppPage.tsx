@@ -97,7 +97,11 @@ export default function AppPage() {
                         return next
                     })
                 },
-                abortControllerRef.current?.signal
+                abortControllerRef.current?.signal,
+                () => {
+                    // Server could not resume the stream; it restarts from the beginning
+                    accumulatedContent = ''
+                }
             )
         } catch (err: any) {
             if (err.name === 'AbortError') return